@@ -1,6 +1,9 @@
 import cv2
 import os
 from src.biometrics.image_quality import is_image_quality_sufficient
+from src.biometrics.frame_context import FrameContext
+from src.biometrics.detectors import get_detector
+from src.biometrics.frame_source import FrameSource
  # from src.biometrics.liveness_detection import detect_liveness_blink_haar, analyze_texture_lbp
 import os
 import time
@@ -16,23 +19,21 @@ class CaptureSession:
         automático das imagens organizadas por usuário e variação.
         """
         self.config = config
-        self.cap: Optional[cv2.VideoCapture] = None
+        # FrameSource: thread de captura própria; read() igual ao do VideoCapture,
+        # e o preview da janela lê da mesma fonte sem disputar a câmera
+        self.cap: Optional[FrameSource] = None
         self.current_variation_index: int = 0
         self.current_image_count: int = 0
         self.is_capturing: bool = False
         self.ultimo_tempo_captura: float = 0
         self.display_callback = display_callback
+        # contexto (gray + detecção) do último frame processado no preview,
+        # reaproveitado pela verificação de qualidade antes de salvar
+        self.frame_context: Optional[FrameContext] = None
         
-        # Carrega o classificador Haar Cascade para detecção facial
-        cascade_path_default = cv2.data.haarcascades + 'haarcascade_frontalface_default.xml'
-        cascade_path_fallback = r'C:/haarcascades/haarcascade_frontalface_default.xml'
-        self.face_cascade = cv2.CascadeClassifier(cascade_path_default)
-        if self.face_cascade.empty():
-            if os.path.exists(cascade_path_fallback):
-                self.face_cascade = cv2.CascadeClassifier(cascade_path_fallback)
-                print("[INFO] Haar Cascade padrão não encontrado. Usando fallback em C:/haarcascades.")
-            else:
-                print("[WARN] Nenhum arquivo haarcascade_frontalface_default.xml encontrado. Detecção de rosto desativada.")
+        # Detector de rosto do registro compartilhado (carregado no primeiro uso,
+        # uma instância por thread; None se o XML não for encontrado)
+        self.face_cascade = None
     
     def enviar_status(self, mensagem: str):
         if self.status_callback:
@@ -45,18 +46,13 @@ class CaptureSession:
             if hasattr(self, 'cap') and self.cap:
                 self.cap.release()
             
-            # Inicializar com backend DSHOW (Windows)
-            self.cap = cv2.VideoCapture(camera_index, cv2.CAP_DSHOW) # OU CAP_MSMF SE TIVER USANDO DROIDCAM
+            # Inicializar com backend DSHOW (Windows) e configurações otimizadas
+            self.cap = FrameSource(camera_index, cv2.CAP_DSHOW, resolution=(640, 480), fps=30) # OU CAP_MSMF SE TIVER USANDO DROIDCAM
             
-            if not self.cap.isOpened():
+            if not self.cap.open():
                 print("❌ Câmera não acessível. Verifique as permissões.")
                 return False
             
-            # Configurações otimizadas
-            self.cap.set(cv2.CAP_PROP_FRAME_WIDTH, 640)
-            self.cap.set(cv2.CAP_PROP_FRAME_HEIGHT, 480)
-            self.cap.set(cv2.CAP_PROP_FPS, 30)
-            
             # Testar com múltiplas tentativas
             for tentativa in range(8):
                 ret, frame = self.cap.read()
@@ -106,10 +102,12 @@ class CaptureSession:
                        cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 200, 255), 2)
         
         self.rosto_detectado = False
+        self.face_cascade = get_detector('face')
+        self.frame_context = FrameContext(frame, self.face_cascade)
 
         # Detecção facial sutil
         if self.config.require_face_detection:
-            if self.face_cascade.empty():
+            if self.face_cascade is None:
                 # Se o cascade não carregou, permite captura sem detecção
                 self.rosto_detectado = True
                 status_text = "⚠️ Detecção desativada (cascade não carregado)"
@@ -117,8 +115,7 @@ class CaptureSession:
                            cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 165, 255), 2)
             else:
                 try:
-                    gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-                    faces = self.face_cascade.detectMultiScale(gray, 1.1, 5, minSize=(100, 100))
+                    faces = self.frame_context.faces_at_least((100, 100))
                     if len(faces) > 0:
                         self.rosto_detectado = True
                         for (x, y, w, h) in faces:
@@ -183,7 +180,7 @@ class CaptureSession:
             if (tempo_decorrido >= self.config.capture_interval or self.current_image_count == 0):
                 if self.rosto_detectado:
                     # Verificar qualidade da imagem antes de salvar
-                    quality_ok, quality_message = is_image_quality_sufficient(frame)
+                    quality_ok, quality_message = is_image_quality_sufficient(frame, self.frame_context)
                     if quality_ok:
                         if self._salvar_imagem(frame, variacao_nome):
                             self.current_image_count += 1
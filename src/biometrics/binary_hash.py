@@ -0,0 +1,172 @@
+import os
+
+import numpy as np
+
+from src.biometrics.gallery import Gallery, _as_matrix
+
+# binary_hash.py
+# Pré-filtro binário para galerias muito grandes.
+# - cada template (já normalizado L2 pelo _align_and_preprocess) vira um código de
+#   'bits' bits: o sinal da projeção em hiperplanos aleatórios (sign random projection)
+# - os bits ficam empacotados em palavras uint64 (bits/64 palavras por amostra),
+#   32x a 128x menor que a matriz float32 da galeria
+# - a distância de Hamming é XOR + popcount vetorizado sobre a matriz inteira
+# - só as amostras mais próximas em Hamming viram shortlist para o matcher
+#   re-pontuar em cosseno (matcher.decide_match_indexed)
+# A probabilidade de um bit diferir é ângulo/pi, então Hamming ordena por cosseno.
+
+DEFAULT_BITS = 256
+DEFAULT_CANDIDATES = 128  # amostras mais próximas em Hamming que entram na shortlist
+HASH_SUFFIX = '.hash.npz'
+
+# popcount por byte, usado quando np.bitwise_count não existe (NumPy < 2.0)
+_POPCOUNT_LUT = np.array([bin(i).count('1') for i in range(256)], dtype=np.uint8)
+
+
+def hash_path_for(db_path: str) -> str:
+    """Arquivo do índice binário ao lado do banco SQLite."""
+    return db_path + HASH_SUFFIX
+
+
+def _popcount(words: np.ndarray) -> np.ndarray:
+    """Quantidade de bits 1 por linha de uma matriz uint64 (N x W)."""
+    if hasattr(np, 'bitwise_count'):
+        return np.bitwise_count(words).sum(axis=1, dtype=np.int32)
+    as_bytes = words.view(np.uint8).reshape(words.shape[0], -1)
+    return _POPCOUNT_LUT[as_bytes].sum(axis=1, dtype=np.int32)
+
+
+class BinaryHashIndex:
+    """
+    Códigos binários das amostras da galeria.
+    - planes: float32 (bits x D), hiperplanos gaussianos (recriados a partir da seed)
+    - codes: uint64 (N x bits/64), um código por amostra
+    - ids: int64 (N,), id do usuário de cada código
+    """
+    def __init__(self, dim: int, bits: int = DEFAULT_BITS, seed: int = 0,
+                 codes: np.ndarray = None, ids: np.ndarray = None,
+                 candidates: int = DEFAULT_CANDIDATES):
+        if bits <= 0 or bits % 64:
+            raise ValueError('bits deve ser múltiplo de 64 (ex.: 256, 512, 1024).')
+        self.dim = dim
+        self.bits = bits
+        self.seed = seed
+        self.candidates = candidates
+        self.planes = np.random.default_rng(seed).standard_normal((bits, dim)).astype(np.float32)
+        self.codes = codes if codes is not None else np.zeros((0, bits // 64), dtype=np.uint64)
+        self.ids = ids if ids is not None else np.zeros(0, dtype=np.int64)
+        # carimbo do banco (DatabaseManager) com que o índice foi salvo; None = desconhecido
+        self.stamp = None
+
+    def __len__(self):
+        return int(self.ids.size)
+
+    @property
+    def nbytes(self) -> int:
+        """Memória ocupada pelos códigos (sem contar os ids)."""
+        return int(self.codes.nbytes)
+
+    @classmethod
+    def from_gallery(cls, gallery: Gallery, bits: int = DEFAULT_BITS, seed: int = 0,
+                     candidates: int = DEFAULT_CANDIDATES):
+        index = cls(gallery.dim, bits=bits, seed=seed, candidates=candidates)
+        index.codes = index.encode(gallery.dense())
+        index.ids = gallery.user_ids()
+        return index
+
+    def encode(self, x: np.ndarray) -> np.ndarray:
+        """Códigos empacotados (N x bits/64 uint64) de uma matriz de vetores (N x D)."""
+        x = np.asarray(x, dtype=np.float32).reshape(-1, self.dim)
+        bits = (x @ self.planes.T) > 0
+        packed = np.packbits(bits, axis=1, bitorder='little')
+        return np.ascontiguousarray(packed).view(np.uint64)
+
+    def hamming(self, query_feat) -> np.ndarray:
+        """Distância de Hamming entre a query e todos os códigos (N,)."""
+        code = self.encode(query_feat)
+        return _popcount(np.bitwise_xor(self.codes, code))
+
+    def add_user(self, user_id: int, features):
+        block = _as_matrix(features)
+        if block.shape[0] == 0 or block.shape[1] != self.dim:
+            return
+        self.codes = np.concatenate([self.codes, self.encode(block)])
+        self.ids = np.concatenate([self.ids, np.full(block.shape[0], user_id, dtype=np.int64)])
+
+    def remove_user(self, user_id: int):
+        keep = self.ids != user_id
+        if not keep.all():
+            self.codes = self.codes[keep]
+            self.ids = self.ids[keep]
+
+    def replace_user(self, user_id: int, features):
+        self.remove_user(user_id)
+        self.add_user(user_id, features)
+
+    def shortlist(self, query_feat, candidates: int = None) -> np.ndarray:
+        """Ids dos usuários donos das 'candidates' amostras mais próximas em Hamming."""
+        candidates = candidates or self.candidates
+        query = np.asarray(query_feat, dtype=np.float32).ravel()
+        if query.size != self.dim or self.ids.size == 0:
+            return np.zeros(0, dtype=np.int64)
+        dist = self.hamming(query)
+        if candidates < dist.size:
+            rows = np.argpartition(dist, candidates - 1)[:candidates]
+        else:
+            rows = np.arange(dist.size)
+        return np.unique(self.ids[rows])
+
+    def save(self, path: str):
+        """Grava os códigos num .npz; os hiperplanos são recriados pela seed."""
+        tmp = path + '.tmp.npz'
+        np.savez(tmp, codes=self.codes, ids=self.ids,
+                 meta=np.array([self.dim, self.bits, self.seed, self.candidates], dtype=np.int64),
+                 stamp=np.str_(self.stamp or ''))
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path: str):
+        """Lê um índice salvo com save(); devolve None se o arquivo não existir."""
+        if not os.path.exists(path):
+            return None
+        with np.load(path) as data:
+            dim, bits, seed, candidates = (int(v) for v in data['meta'])
+            index = cls(dim, bits=bits, seed=seed, codes=data['codes'], ids=data['ids'],
+                        candidates=candidates)
+            # arquivos antigos não têm carimbo: o DatabaseManager reconstrói o índice
+            if 'stamp' in data.files:
+                index.stamp = str(data['stamp']) or None
+            return index
+
+
+def main(argv=None):
+    """Gera o índice binário de um banco e mostra recall e tamanho contra a galeria.
+
+    Uso: python -m src.biometrics.binary_hash [caminho_do_banco] [bits]
+    """
+    import sys
+    from src.database.database_manager import DatabaseManager
+    from src.biometrics.ivf_index import recall_report
+
+    argv = sys.argv[1:] if argv is None else argv
+    db_path = argv[0] if argv else 'biometric_database.db'
+    bits = int(argv[1]) if len(argv) > 1 else DEFAULT_BITS
+    db = DatabaseManager(db_path)
+    try:
+        index = db.build_hash_index(bits=bits)
+        if index is None:
+            return
+        gallery = db.get_gallery()
+        rng = np.random.default_rng(0)
+        rows = rng.choice(gallery.matrix.shape[0], size=min(500, gallery.matrix.shape[0]), replace=False)
+        print(f"Hash binário: {bits} bits, {len(index)} amostras, {index.nbytes / 1024:.1f} KiB "
+              f"({gallery.nbytes / max(index.nbytes, 1):.0f}x menor que a galeria) -> {db.hash_path}")
+        for r in recall_report(index, gallery, gallery.dense()[rows], nprobe_values=(16, 32, 64, 128, 256)):
+            print(f"candidatos={r['nprobe']:4d}  recall@1={r['recall']:.3f}  "
+                  f"re-pontuados={r['candidates'] * 100:.1f}% dos usuários")
+    finally:
+        db.close_connection()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,194 @@
+import time
+
+import numpy as np
+
+from src.biometrics.gallery import Gallery, _as_matrix, split_probes
+
+# compaction.py
+# Compactação dos templates no cadastro.
+# - cada imagem gera 6 vetores (original, flip, ±6°, ±10% de brilho) e os
+#   frames capturados são quase iguais entre si: muitos templates redundantes
+#   que são varridos em todo login
+# - os templates de um usuário são agrupados por k-medoids (distância
+#   cosseno) e só os medoids ficam; k é o número de grupos "distintos"
+#   (similaridade < DEFAULT_DEDUP_SIMILARITY), limitado a max_templates
+# - nunca fica abaixo de matcher.DEFAULT_MIN_SAMPLES amostras (se o usuário
+#   tiver pelo menos isso), senão decide_match negaria o usuário
+# - compaction_report() mede a queda de templates e da latência de login,
+#   quantas decisões mudam e as falsas rejeições antes/depois nas mesmas
+#   consultas genuínas
+# - no cadastro é opcional (DatabaseManager(..., compaction=True)); ligue só
+#   se o relatório do banco não mostrar aumento de falsas rejeições
+
+DEFAULT_MAX_TEMPLATES = 24
+DEFAULT_DEDUP_SIMILARITY = 0.995  # acima disso dois templates contam como o mesmo
+DEFAULT_KMEDOIDS_ITERS = 10
+
+
+def _normalized(x: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(x, axis=1, keepdims=True)
+    return np.divide(x, norms, out=np.zeros_like(x), where=norms > 0)
+
+
+def _distinct_count(sims: np.ndarray, threshold: float) -> int:
+    # líderes gulosos: um template novo só conta se não for quase igual a um líder
+    leaders = []
+    for i in range(sims.shape[0]):
+        if not leaders or sims[i, leaders].max() < threshold:
+            leaders.append(i)
+    return len(leaders)
+
+
+def _kmedoids(sims: np.ndarray, k: int, iters: int) -> np.ndarray:
+    """k-medoids (alternado) sobre a matriz de similaridades; retorna os índices dos medoids."""
+    n = sims.shape[0]
+    # inicialização determinística: o mais central, depois o mais distante dos já escolhidos
+    medoids = [int(np.argmax(sims.sum(axis=1)))]
+    closest = sims[medoids[0]].copy()
+    while len(medoids) < k:
+        nxt = int(np.argmin(closest))
+        medoids.append(nxt)
+        np.maximum(closest, sims[nxt], out=closest)
+    medoids = np.asarray(medoids)
+    for _ in range(iters):
+        labels = np.argmax(sims[:, medoids], axis=1)
+        updated = medoids.copy()
+        for c in range(k):
+            members = np.flatnonzero(labels == c)
+            if members.size:
+                updated[c] = members[np.argmax(sims[np.ix_(members, members)].sum(axis=1))]
+        if np.array_equal(updated, medoids) or np.unique(updated).size < k:
+            break
+        medoids = updated
+    return np.sort(medoids)
+
+
+def select_templates(features, max_templates: int = DEFAULT_MAX_TEMPLATES,
+                     min_templates: int = None,
+                     dedup_similarity: float = DEFAULT_DEDUP_SIMILARITY,
+                     iters: int = DEFAULT_KMEDOIDS_ITERS) -> np.ndarray:
+    """Índices (em ordem crescente) dos templates representativos de um usuário.
+
+    max_templates: teto de templates mantidos (None = só remove duplicatas)
+    min_templates: piso (padrão matcher.DEFAULT_MIN_SAMPLES); nunca passa do total
+    """
+    from src.biometrics import matcher
+
+    x = _as_matrix(features)
+    n = x.shape[0]
+    if min_templates is None:
+        min_templates = matcher.DEFAULT_MIN_SAMPLES
+    if n <= min_templates:
+        return np.arange(n)
+    unit = _normalized(x)
+    sims = unit @ unit.T
+    k = _distinct_count(sims, dedup_similarity)
+    if max_templates is not None:
+        k = min(k, max_templates)
+    k = min(n, max(k, min_templates))
+    if k == n:
+        return np.arange(n)
+    return _kmedoids(sims, k, iters)
+
+
+def compact_templates(features, qualities=None, **kwargs):
+    """Aplica select_templates. Retorna (features, qualities) só com os medoids,
+    no mesmo formato recebido (lista de listas ou matriz)."""
+    if features is None or len(features) == 0:
+        return features, qualities
+    keep = select_templates(features, **kwargs)
+    if isinstance(features, np.ndarray):
+        kept = features[keep]
+    else:
+        kept = [features[i] for i in keep]
+    if qualities is not None:
+        qualities = [qualities[i] for i in keep]
+    return kept, qualities
+
+
+def _login_latency(gallery: Gallery, queries, repeats: int) -> float:
+    from src.biometrics import matcher
+
+    if not queries:
+        return 0.0
+    best = float('inf')
+    for _ in range(repeats):
+        t0 = time.perf_counter()
+        for q in queries:
+            matcher.decide_match(q, gallery)
+        best = min(best, time.perf_counter() - t0)
+    return best / len(queries)
+
+
+def compaction_report(users_data, max_templates: int = DEFAULT_MAX_TEMPLATES,
+                      probes_per_user: int = 1, repeats: int = 3, **kwargs):
+    """Compacta os usuários do banco e compara com a galeria original.
+
+    As últimas probes_per_user amostras de cada usuário viram consultas
+    (split_probes) contra as demais, antes e depois da compactação. Reporta
+    templates antes/depois, latência média por login (decide_match), decisões
+    alteradas, falsas rejeições (probe genuína negada ou dada a outro usuário)
+    e usuários com menos de DEFAULT_MIN_SAMPLES amostras.
+    """
+    from src.biometrics import matcher
+
+    enrolled, probes = split_probes(users_data, probes_per_user)
+    compacted = [{**u, 'features': compact_templates(_as_matrix(u.get('features')),
+                                                     max_templates=max_templates, **kwargs)[0]}
+                 for u in enrolled]
+    full = Gallery.from_users(enrolled)
+    small = Gallery.from_users(compacted)
+    feats = [f for _, f in probes]
+
+    changed = rejects_before = rejects_after = 0
+    for user_id, q in probes:
+        a = matcher.decide_match(q, full)
+        b = matcher.decide_match(q, small)
+        changed += int((a[0], a[1] and a[1].get('id')) != (b[0], b[1] and b[1].get('id')))
+        rejects_before += int(not (a[0] and a[1].get('id') == user_id))
+        rejects_after += int(not (b[0] and b[1].get('id') == user_id))
+    return {
+        'users': len(enrolled),
+        'probes': len(probes),
+        'templates_before': int(full.matrix.shape[0]),
+        'templates_after': int(small.matrix.shape[0]),
+        'latency_before_ms': _login_latency(full, feats, repeats) * 1000,
+        'latency_after_ms': _login_latency(small, feats, repeats) * 1000,
+        'changed_decisions': changed,
+        'false_rejects_before': rejects_before,
+        'false_rejects_after': rejects_after,
+        'below_min_samples': int(np.sum(small.counts < matcher.DEFAULT_MIN_SAMPLES)),
+    }
+
+
+def print_report(report):
+    before, after = report['templates_before'], report['templates_after']
+    print(f"Usuários: {report['users']}  consultas: {report['probes']}")
+    print(f"Templates: {before} -> {after} ({before / max(after, 1):.1f}x menos)")
+    print(f"Latência por login: {report['latency_before_ms']:.2f} ms -> {report['latency_after_ms']:.2f} ms")
+    print(f"Decisões alteradas: {report['changed_decisions']}  "
+          f"usuários abaixo do mínimo de amostras: {report['below_min_samples']}")
+    print(f"Falsas rejeições: {report['false_rejects_before']} -> {report['false_rejects_after']}")
+    if report['false_rejects_after'] > report['false_rejects_before']:
+        print("[WARN] A compactação aumenta as falsas rejeições neste banco; mantenha compaction=False.")
+
+
+def main(argv=None):
+    """Relatório de compactação para um banco.
+
+    Uso: python -m src.biometrics.compaction [caminho_do_banco] [max_templates]
+    """
+    import sys
+    from src.database.database_manager import DatabaseManager
+
+    argv = sys.argv[1:] if argv is None else argv
+    db = DatabaseManager(argv[0] if argv else 'biometric_database.db')
+    try:
+        max_templates = int(argv[1]) if len(argv) > 1 else DEFAULT_MAX_TEMPLATES
+        print_report(compaction_report(db.get_all_users_with_features(), max_templates))
+    finally:
+        db.close_connection()
+
+
+if __name__ == '__main__':
+    main()
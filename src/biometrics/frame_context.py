@@ -0,0 +1,81 @@
+import cv2
+import numpy as np
+
+from src.biometrics.detectors import get_detector
+
+# frame_context.py
+# Contexto por frame compartilhado entre as etapas de qualidade, extração e
+# overlay de preview. Cada etapa pedia seu próprio cvtColor + detectMultiScale
+# sobre o mesmo frame; aqui isso é calculado uma vez (sob demanda) e reutilizado.
+
+# Parâmetros da única passada do detector. minSize é o menor entre os
+# consumidores (extração usa 80); quem exige rostos maiores (qualidade e
+# preview usam 100) filtra com faces_at_least().
+DETECT_SCALE_FACTOR = 1.1
+DETECT_MIN_NEIGHBORS = 5
+DETECT_MIN_SIZE = (80, 80)
+
+
+class FrameContext:
+    """
+    Dados derivados de um frame BGR, calculados uma única vez:
+    - gray: frame em tons de cinza
+    - faces: caixas (x, y, w, h) detectadas pelo Haar Cascade
+    - largest_face: maior rosto detectado (ou None)
+    - crop_box: recorte (x1, y1, x2, y2) usado pela extração de features
+    """
+    def __init__(self, image: np.ndarray, face_cascade=None):
+        # face_cascade=None usa o detector 'face' do registro (detectors.py)
+        self.image = image
+        self._face_cascade = face_cascade if face_cascade is not None else get_detector('face')
+        self._gray = None
+        self._faces = None
+        self.detections = 0  # quantas vezes o detector rodou (0 ou 1)
+
+    @property
+    def gray(self):
+        if self._gray is None:
+            self._gray = cv2.cvtColor(self.image, cv2.COLOR_BGR2GRAY)
+        return self._gray
+
+    @property
+    def has_detector(self) -> bool:
+        return self._face_cascade is not None
+
+    @property
+    def faces(self):
+        if self._faces is None:
+            faces = []
+            if self.has_detector:
+                try:
+                    faces = self._face_cascade.detectMultiScale(
+                        self.gray, scaleFactor=DETECT_SCALE_FACTOR,
+                        minNeighbors=DETECT_MIN_NEIGHBORS, minSize=DETECT_MIN_SIZE)
+                except Exception:
+                    faces = []
+                self.detections += 1
+            # maior rosto primeiro
+            self._faces = sorted([tuple(int(v) for v in f) for f in faces],
+                                 key=lambda f: f[2] * f[3], reverse=True)
+        return self._faces
+
+    def faces_at_least(self, min_size):
+        """Rostos com largura e altura mínimas (equivale a detectar com minSize maior)."""
+        min_w, min_h = min_size
+        return [f for f in self.faces if f[2] >= min_w and f[3] >= min_h]
+
+    @property
+    def largest_face(self):
+        return self.faces[0] if self.faces else None
+
+    @property
+    def crop_box(self):
+        """Recorte usado pela extração: quadrado central do frame quando há rosto."""
+        if not self.faces:
+            return None
+        h, w = self.image.shape[:2]
+        side = min(w, h)
+        cx, cy = w // 2, h // 2
+        x1 = max(0, cx - side // 2)
+        y1 = max(0, cy - side // 2)
+        return (x1, y1, x1 + side, y1 + side)
@@ -0,0 +1,171 @@
+import threading
+import time
+from collections import deque, namedtuple
+from typing import Optional
+
+import cv2
+
+# frame_source.py
+# Fonte de frames compartilhada por preview, captura e autenticação.
+# - uma thread dedicada é a única que chama VideoCapture.read(); os
+#   consumidores nunca disputam a câmera
+# - os frames vão para um ring buffer pequeno (deque com maxlen): frames
+#   antigos são descartados em vez de acumular atraso
+# - cada frame recebe número de sequência e timestamp (time.monotonic)
+# - read() tem a mesma assinatura do VideoCapture.read(): bloqueia até chegar
+#   um frame mais novo que o último entregue à thread que chamou, então cada
+#   consumidor vê os frames mais recentes sem "roubar" os dos outros
+# - stats(): fps medido, frames capturados, descartados sem leitura, falhas
+
+DEFAULT_BUFFER_SIZE = 4
+DEFAULT_READ_TIMEOUT = 1.0  # segundos esperando um frame novo em read()
+FPS_WINDOW = 30  # frames usados na média de fps
+RETRY_DELAY = 0.01  # pausa após uma leitura falha da câmera
+
+Frame = namedtuple('Frame', ['seq', 'timestamp', 'image'])
+
+
+class FrameSource:
+    """
+    Câmera com thread de captura e ring buffer.
+
+    Uso:
+        source = FrameSource(0, cv2.CAP_DSHOW, resolution=(640, 480), fps=30)
+        if source.open():
+            ret, frame = source.read()      # como VideoCapture
+            latest = source.latest()        # Frame(seq, timestamp, image) sem bloquear
+            source.release()
+    capture: um objeto já aberto com read()/isOpened()/release() (ex.: um
+        VideoCapture de arquivo) no lugar de camera_index.
+    """
+    def __init__(self, camera_index: int = 0, backend: Optional[int] = None, capture=None,
+                 buffer_size: int = DEFAULT_BUFFER_SIZE, resolution=None, fps=None):
+        self.camera_index = camera_index
+        self.backend = backend
+        self.resolution = resolution
+        self.fps = fps
+        self._cap = capture
+        self._buffer = deque(maxlen=max(1, buffer_size))
+        self._cond = threading.Condition()
+        self._local = threading.local()
+        self._thread = None
+        self._running = False
+        self._seq = 0
+        self._delivered = 0  # maior seq já entregue a algum consumidor
+        self._times = deque(maxlen=FPS_WINDOW)
+        self._dropped = 0
+        self._failures = 0
+
+    def open(self) -> bool:
+        """Abre a câmera (se preciso) e inicia a thread de captura."""
+        if self._running:
+            return True
+        if self._cap is None:
+            if self.backend is None:
+                self._cap = cv2.VideoCapture(self.camera_index)
+            else:
+                self._cap = cv2.VideoCapture(self.camera_index, self.backend)
+            if self._cap.isOpened():
+                if self.resolution:
+                    self._cap.set(cv2.CAP_PROP_FRAME_WIDTH, self.resolution[0])
+                    self._cap.set(cv2.CAP_PROP_FRAME_HEIGHT, self.resolution[1])
+                if self.fps:
+                    self._cap.set(cv2.CAP_PROP_FPS, self.fps)
+        if not self._cap.isOpened():
+            return False
+        self._running = True
+        self._thread = threading.Thread(target=self._grab_loop, name='FrameSource', daemon=True)
+        self._thread.start()
+        return True
+
+    def _grab_loop(self):
+        while self._running:
+            ret, image = self._cap.read()
+            if not ret or image is None:
+                self._failures += 1
+                time.sleep(RETRY_DELAY)
+                continue
+            now = time.monotonic()
+            with self._cond:
+                self._seq += 1
+                if len(self._buffer) == self._buffer.maxlen and self._buffer[0].seq > self._delivered:
+                    # o mais antigo sai do buffer sem ninguém ter lido
+                    self._dropped += 1
+                self._buffer.append(Frame(self._seq, now, image))
+                self._times.append(now)
+                self._cond.notify_all()
+
+    def isOpened(self) -> bool:
+        return self._running
+
+    def release(self):
+        """Para a thread de captura e libera a câmera."""
+        self._running = False
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join(timeout=2.0)
+        self._thread = None
+        if self._cap is not None:
+            self._cap.release()
+            self._cap = None
+        with self._cond:
+            self._buffer.clear()
+            self._cond.notify_all()
+
+    def latest(self) -> Optional[Frame]:
+        """Frame mais recente (ou None), sem bloquear."""
+        with self._cond:
+            if not self._buffer:
+                return None
+            frame = self._buffer[-1]
+            self._delivered = max(self._delivered, frame.seq)
+            return frame
+
+    def frames(self):
+        """Cópia do ring buffer, do mais antigo para o mais novo."""
+        with self._cond:
+            if self._buffer:
+                self._delivered = max(self._delivered, self._buffer[-1].seq)
+            return list(self._buffer)
+
+    def wait_frame(self, after_seq: int = 0, timeout: float = DEFAULT_READ_TIMEOUT) -> Optional[Frame]:
+        """Espera um frame com seq > after_seq; devolve o mais recente ou None no timeout."""
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while self._running and (not self._buffer or self._buffer[-1].seq <= after_seq):
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return None
+                self._cond.wait(remaining)
+            if not self._running or not self._buffer or self._buffer[-1].seq <= after_seq:
+                return None
+            frame = self._buffer[-1]
+            self._delivered = max(self._delivered, frame.seq)
+            return frame
+
+    def read(self, timeout: float = DEFAULT_READ_TIMEOUT):
+        """Mesmo contrato de VideoCapture.read(): (ret, frame)."""
+        frame = self.wait_frame(getattr(self._local, 'seq', 0), timeout)
+        if frame is None:
+            return False, None
+        self._local.seq = frame.seq
+        return True, frame.image
+
+    def stats(self) -> dict:
+        with self._cond:
+            times = list(self._times)
+            grabbed, dropped = self._seq, self._dropped
+        fps = (len(times) - 1) / (times[-1] - times[0]) if len(times) > 1 and times[-1] > times[0] else 0.0
+        return {
+            'fps': fps,
+            'grabbed': grabbed,
+            'dropped': dropped,
+            'drop_rate': dropped / grabbed if grabbed else 0.0,
+            'failures': self._failures,
+        }
+
+    def __enter__(self):
+        self.open()
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
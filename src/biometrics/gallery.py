@@ -0,0 +1,335 @@
+import numpy as np
+from typing import List, Dict
+
+# gallery.py
+# Motor vetorizado de comparação: empacota todas as amostras de todos os
+# usuários numa única matriz float32 contígua (N x D) e calcula as
+# similaridades com um único produto matriz-vetor do NumPy.
+# As reduções por usuário (melhor score e média top-k) são feitas por
+# segmentos, usando o vetor de offsets que marca onde começa cada usuário.
+
+
+def _as_matrix(feats) -> np.ndarray:
+    """Converte as features de um usuário para uma matriz float32 (n x D).
+
+    Aceita lista de vetores, vetor único (lista de números) ou ndarray.
+    """
+    if feats is None:
+        return np.zeros((0, 0), dtype=np.float32)
+    if isinstance(feats, np.ndarray):
+        arr = feats
+    else:
+        if len(feats) == 0:
+            return np.zeros((0, 0), dtype=np.float32)
+        try:
+            arr = np.asarray(feats, dtype=np.float32)
+        except ValueError:
+            # vetores com tamanhos diferentes: mantém apenas os do tamanho do primeiro
+            first = len(feats[0]) if not isinstance(feats[0], (int, float)) else len(feats)
+            arr = np.asarray([f for f in feats if len(f) == first], dtype=np.float32)
+    if arr.ndim == 1:
+        arr = arr.reshape(1, -1)
+    return np.ascontiguousarray(arr, dtype=np.float32)
+
+
+class Gallery:
+    """Galeria de templates pronta para comparação.
+
+    - matrix: float32 (N x D), todas as amostras em sequência
+    - offsets: int64 (U + 1), amostras do usuário i em matrix[offsets[i]:offsets[i+1]]
+    - users: lista de dicts (id, name, access_level, ...) na mesma ordem
+    - projection: PCAProjection aplicada às amostras (None = vetores brutos);
+      queries brutas são projetadas automaticamente em rank()
+    """
+
+    def __init__(self, users: List[Dict], matrix: np.ndarray, offsets: np.ndarray, projection=None):
+        self.users = users
+        self.matrix = matrix
+        self.offsets = offsets
+        self.projection = projection
+        self._refresh()
+
+    @classmethod
+    def from_users(cls, users_data: List[Dict]):
+        """Monta a galeria a partir do formato do DatabaseManager
+        ([{'id','name','access_level','features'}, ...])."""
+        users = []
+        blocks = []
+        counts = []
+        dim = 0
+        for u in users_data:
+            block = _as_matrix(u.get('features'))
+            if block.shape[0] and not dim:
+                dim = block.shape[1]
+            users.append(u)
+            blocks.append(block)
+        for i, block in enumerate(blocks):
+            # amostras com dimensão diferente da galeria não entram na matriz
+            if block.shape[0] and block.shape[1] != dim:
+                blocks[i] = np.zeros((0, dim), dtype=np.float32)
+            counts.append(blocks[i].shape[0])
+
+        offsets = np.zeros(len(users) + 1, dtype=np.int64)
+        if counts:
+            np.cumsum(counts, out=offsets[1:])
+        nonempty = [b for b in blocks if b.shape[0]]
+        if nonempty:
+            matrix = np.ascontiguousarray(np.vstack(nonempty), dtype=np.float32)
+        else:
+            matrix = np.zeros((0, dim), dtype=np.float32)
+        return cls(users, matrix, offsets)
+
+    def _refresh(self):
+        # dados derivados: id do usuário de cada linha e normas das amostras
+        self.counts = np.diff(self.offsets)
+        self.row_user = np.repeat(np.arange(len(self.users)), self.counts)
+        self.sq_norms = self._sq_norms()
+        self.norms = np.sqrt(self.sq_norms)
+
+    def _sq_norms(self) -> np.ndarray:
+        return np.einsum('ij,ij->i', self.matrix, self.matrix, dtype=np.float64)
+
+    def __len__(self):
+        return len(self.users)
+
+    @property
+    def dim(self) -> int:
+        return self.matrix.shape[1] if self.matrix.ndim == 2 else 0
+
+    def num_samples(self, position: int) -> int:
+        return int(self.counts[position])
+
+    @property
+    def nbytes(self) -> int:
+        """Memória ocupada pelas amostras."""
+        return int(self.matrix.nbytes)
+
+    def dense(self) -> np.ndarray:
+        """Amostras como float32 (N x D); na Gallery base é a própria matriz."""
+        return self.matrix
+
+    def _take(self, users: List[Dict], rows, offsets: np.ndarray) -> 'Gallery':
+        # nova galeria do mesmo tipo só com as linhas 'rows' (máscara ou índices)
+        return Gallery(users, np.ascontiguousarray(self.matrix[rows]), offsets, self.projection)
+
+    def _dots(self, query: np.ndarray) -> np.ndarray:
+        return self.matrix @ query
+
+    def _similarities(self, query: np.ndarray, metric: str) -> np.ndarray:
+        """Similaridade de query contra todas as linhas da matriz (N,)."""
+        dots = self._dots(query)
+        if metric == 'euclidean':
+            # ||a-b||² = ||a||² + ||b||² - 2 a·b, mesma escala de _euclidean_distance
+            qn = float(np.dot(query, query))
+            d2 = np.maximum(self.sq_norms + qn - 2.0 * dots, 0.0)
+            return 1.0 - np.sqrt(d2) / (np.sqrt(self.dim) * 2)
+        qn = float(np.linalg.norm(query))
+        denom = self.norms * qn
+        sims = np.zeros(dots.shape[0], dtype=np.float64)
+        np.divide(dots, denom, out=sims, where=denom > 0)
+        return sims
+
+    def _dots_batch(self, queries: np.ndarray) -> np.ndarray:
+        # (P x D) @ (D x N): um único produto matriz-matriz para todas as queries
+        return queries @ self.matrix.T
+
+    def _similarities_batch(self, queries: np.ndarray, metric: str) -> np.ndarray:
+        """Similaridades de P queries contra todas as linhas (P x N), mesma
+        escala de _similarities."""
+        dots = self._dots_batch(queries)
+        if metric == 'euclidean':
+            qn = np.einsum('ij,ij->i', queries, queries, dtype=np.float64)
+            d2 = np.maximum(self.sq_norms[None, :] + qn[:, None] - 2.0 * dots, 0.0)
+            return 1.0 - np.sqrt(d2) / (np.sqrt(self.dim) * 2)
+        qn = np.linalg.norm(queries, axis=1).astype(np.float64)
+        denom = qn[:, None] * self.norms[None, :]
+        sims = np.zeros(dots.shape, dtype=np.float64)
+        np.divide(dots, denom, out=sims, where=denom > 0)
+        return sims
+
+    def _reduce(self, sims: np.ndarray, top_k: int):
+        """Reduções por segmento: melhor score e média das top_k amostras."""
+        n_users = len(self.users)
+        best = np.zeros(n_users, dtype=np.float64)
+        mean_top = np.zeros(n_users, dtype=np.float64)
+        if sims.size == 0:
+            return best, mean_top
+        nonempty = self.counts > 0
+        starts = self.offsets[:-1]
+        best[nonempty] = np.maximum.reduceat(sims, starts[nonempty])
+        # ordena dentro de cada segmento (decrescente) e soma as k primeiras
+        order = np.lexsort((-sims, self.row_user))
+        ranked = sims[order]
+        rank = np.arange(sims.size) - starts[self.row_user]
+        keep = rank < top_k
+        sums = np.bincount(self.row_user[keep], weights=ranked[keep], minlength=n_users)
+        k = np.minimum(self.counts, top_k)
+        np.divide(sums, k, out=mean_top, where=k > 0)
+        return best, mean_top
+
+    def projected(self, projection) -> 'Gallery':
+        """Nova galeria com as amostras projetadas (ex.: PCA 4096 -> 256)."""
+        return Gallery(self.users, projection.transform(self.matrix), self.offsets, projection)
+
+    def prepare_query(self, query_feat) -> np.ndarray:
+        """Query como vetor float32 no espaço da galeria (projeta se vier bruta)."""
+        query = np.asarray(query_feat, dtype=np.float32).ravel()
+        if (self.projection is not None and query.size == self.projection.in_dim
+                and query.size != self.dim):
+            query = self.projection.transform(query)[0]
+        return query
+
+    def prepare_queries(self, query_feats) -> np.ndarray:
+        """Queries (lista ou matriz P x D) no espaço da galeria.
+        Retorna (queries float32 P x D, valid): valid marca as queries com o
+        tamanho certo; as demais ficam zeradas, como a query vazia de rank()."""
+        rows = list(query_feats)
+        queries = np.zeros((len(rows), self.dim), dtype=np.float32)
+        valid = np.zeros(len(rows), dtype=bool)
+        for i, q in enumerate(rows):
+            q = self.prepare_query(q)
+            if q.size and q.size == self.dim:
+                queries[i] = q
+                valid[i] = True
+        return queries, valid
+
+    def rank_batch(self, query_feats, top_k: int = 3, metric: str = 'cosine'):
+        """rank() para várias queries com um único produto matriz-matriz.
+
+        Retorna (orders, best, mean_top), cada um (P x U); a linha p é o que
+        rank(query_feats[p]) devolveria, a menos de ~1e-6 nos scores (o BLAS soma
+        em outra ordem no produto matriz-matriz) e da ordem de usuários empatados
+        dentro dessa diferença.
+        """
+        queries, valid = self.prepare_queries(query_feats)
+        n_users = len(self.users)
+        best = np.zeros((queries.shape[0], n_users), dtype=np.float64)
+        mean_top = np.zeros((queries.shape[0], n_users), dtype=np.float64)
+        if valid.any() and self.matrix.shape[0]:
+            sims = self._similarities_batch(queries[valid], metric)
+            for row, p in enumerate(np.flatnonzero(valid)):
+                best[p], mean_top[p] = self._reduce(sims[row], top_k)
+        orders = np.argsort(-best, axis=1, kind='stable')
+        return orders, best, mean_top
+
+    def rank(self, query_feat, top_k: int = 3, metric: str = 'cosine'):
+        """Calcula (order, best, mean_top): order são as posições dos usuários
+        ordenadas pelo best_score (estável, como o sort do Python)."""
+        query = self.prepare_query(query_feat)
+        n_users = len(self.users)
+        if query.size == 0 or query.size != self.dim:
+            best, mean_top = np.zeros(n_users), np.zeros(n_users)
+        else:
+            best, mean_top = self._reduce(self._similarities(query, metric), top_k)
+        order = np.argsort(-best, kind='stable')
+        return order, best, mean_top
+
+    def runner_up(self, query_feat, exclude_position: int, top_k: int = 3, metric: str = 'cosine'):
+        """(posição, best, mean_top) do melhor usuário diferente de exclude_position.
+
+        Um único produto matriz-vetor sobre a galeria inteira, sem as reduções de
+        todos os usuários (usado para a margem quando o top-1 veio de uma shortlist).
+        None se não houver outro usuário com amostras.
+        """
+        query = self.prepare_query(query_feat)
+        if query.size == 0 or query.size != self.dim or self.matrix.shape[0] == 0:
+            return None
+        sims = self._similarities(query, metric)
+        sims[self.offsets[exclude_position]:self.offsets[exclude_position + 1]] = -np.inf
+        row = int(np.argmax(sims))
+        if not np.isfinite(sims[row]):
+            return None
+        position = int(self.row_user[row])
+        own = np.sort(sims[self.offsets[position]:self.offsets[position + 1]])[::-1][:top_k]
+        return position, float(own[0]), float(own.mean())
+
+    def score(self, query_feat, top_k: int = 3, metric: str = 'cosine'):
+        """Retorna [(user, best_score, mean_top_k), ...] ordenado pelo best_score,
+        no mesmo formato de matcher.score_users."""
+        order, best, mean_top = self.rank(query_feat, top_k, metric)
+        return [(self.users[i], float(best[i]), float(mean_top[i])) for i in order]
+
+    def with_user(self, user: Dict, feats) -> 'Gallery':
+        """Nova galeria com um usuário acrescentado ao final, sem recarregar
+        as demais amostras (usado pelo cache quando um cadastro é feito).
+        A galeria atual não é alterada, então leitores em andamento não veem
+        estado intermediário."""
+        block = _as_matrix(feats)
+        if self.projection is not None and block.shape[0] and block.shape[1] == self.projection.in_dim:
+            block = self.projection.transform(block)
+        if block.shape[0] and self.matrix.shape[0] and block.shape[1] != self.dim:
+            block = np.zeros((0, self.dim), dtype=np.float32)
+        return self._append(user, block)
+
+    def _append(self, user: Dict, block: np.ndarray) -> 'Gallery':
+        # acrescenta um bloco float32 já validado (projetado e com a dimensão certa)
+        if block.shape[0] and self.matrix.shape[0]:
+            matrix = np.ascontiguousarray(np.concatenate([self.matrix, block]))
+        elif block.shape[0]:
+            matrix = block
+        else:
+            matrix = self.matrix
+        offsets = np.append(self.offsets, self.offsets[-1] + block.shape[0])
+        return Gallery(self.users + [user], matrix, offsets, self.projection)
+
+    def without_user(self, user_id) -> 'Gallery':
+        """Nova galeria sem as amostras do usuário (pelo id).
+        Retorna a própria galeria se o id não existir."""
+        positions = [i for i, u in enumerate(self.users) if u.get('id') == user_id]
+        if not positions:
+            return self
+        keep = np.ones(self.matrix.shape[0], dtype=bool)
+        for pos in positions:
+            keep[self.offsets[pos]:self.offsets[pos + 1]] = False
+        counts = np.delete(self.counts, positions)
+        users = [u for i, u in enumerate(self.users) if i not in positions]
+        offsets = np.zeros(len(users) + 1, dtype=np.int64)
+        np.cumsum(counts, out=offsets[1:])
+        return self._take(users, keep, offsets)
+
+    def position_by_id(self) -> Dict:
+        """Mapa id do usuário -> posição na galeria (calculado uma vez)."""
+        mapping = getattr(self, '_id_positions', None)
+        if mapping is None:
+            mapping = {u.get('id'): i for i, u in enumerate(self.users)}
+            self._id_positions = mapping
+        return mapping
+
+    def subset(self, user_ids) -> 'Gallery':
+        """Galeria só com os usuários informados (ids), na ordem original da galeria.
+
+        Usada para re-pontuar exatamente uma shortlist vinda de um índice
+        aproximado; manter a ordem original preserva o desempate do score_users.
+        """
+        mapping = self.position_by_id()
+        positions = sorted({mapping[i] for i in user_ids if i in mapping})
+        if not positions:
+            return self._take([], np.zeros(0, dtype=np.int64), np.zeros(1, dtype=np.int64))
+        rows = np.concatenate([np.arange(self.offsets[p], self.offsets[p + 1]) for p in positions])
+        counts = self.counts[positions]
+        offsets = np.zeros(len(positions) + 1, dtype=np.int64)
+        np.cumsum(counts, out=offsets[1:])
+        return self._take([self.users[p] for p in positions], rows, offsets)
+
+    def user_ids(self) -> np.ndarray:
+        """Id do usuário de cada linha da matriz (N,)."""
+        ids = np.asarray([u.get('id') for u in self.users], dtype=np.int64)
+        return ids[self.row_user] if ids.size else np.zeros(0, dtype=np.int64)
+
+
+def split_probes(users_data: List[Dict], probes_per_user: int = 1):
+    """Separa as últimas probes_per_user amostras de cada usuário como consultas.
+
+    Retorna (enrolled, probes): enrolled no formato do DatabaseManager com as
+    amostras restantes e probes = [(user_id, vetor), ...]. Usado pelos
+    relatórios de comparação (projeção, quantização).
+    """
+    enrolled, probes = [], []
+    for u in users_data:
+        feats = _as_matrix(u.get('features'))
+        if feats.shape[0] <= probes_per_user:
+            enrolled.append(u)
+            continue
+        enrolled.append({**u, 'features': feats[:-probes_per_user]})
+        probes.extend((u.get('id'), f) for f in feats[-probes_per_user:])
+    return enrolled, probes
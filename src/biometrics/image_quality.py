@@ -1,25 +1,20 @@
 """Módulo para verificação da qualidade da imagem para reconhecimento facial."""
 
 import cv2
-import os
 import numpy as np
 
-# Carrega o classificador Haar Cascade para detecção facial
-cascade_path_default = cv2.data.haarcascades + 'haarcascade_frontalface_default.xml'
-cascade_path_fallback = r'C:/haarcascades/haarcascade_frontalface_default.xml'
-face_cascade = cv2.CascadeClassifier(cascade_path_default)
-if face_cascade.empty():
-    if os.path.exists(cascade_path_fallback):
-        face_cascade = cv2.CascadeClassifier(cascade_path_fallback)
-        print('[INFO] Haar Cascade padrão não encontrado. Usando fallback em C:/haarcascades.')
-    else:
-        print('[WARN] Nenhum arquivo haarcascade_frontalface_default.xml encontrado. Detecção de rosto desativada.')
+from src.biometrics.frame_context import FrameContext
 
-def is_image_quality_sufficient(image_np: np.ndarray) -> tuple[bool, str]:
+# O detector de rosto vem do registro compartilhado (carregado no primeiro uso)
+# via FrameContext; nada é carregado ao importar este módulo.
+
+def is_image_quality_sufficient(image_np: np.ndarray, ctx: FrameContext = None) -> tuple[bool, str]:
     """Verifica a qualidade da imagem para reconhecimento facial.
 
     Args:
         image_np: A imagem como um array NumPy (BGR).
+        ctx: FrameContext do frame; se informado, reaproveita o gray e a
+            detecção já feitos (a extração e o preview usam o mesmo contexto).
 
     Returns:
         Uma tupla (bool, str) indicando se a qualidade é suficiente e uma mensagem.
@@ -27,16 +22,18 @@ def is_image_quality_sufficient(image_np: np.ndarray) -> tuple[bool, str]:
     if image_np is None or image_np.size == 0:
         return False, "Imagem vazia ou inválida."
 
-    gray_image = cv2.cvtColor(image_np, cv2.COLOR_BGR2GRAY)
+    if ctx is None:
+        ctx = FrameContext(image_np)
+    gray_image = ctx.gray
 
     # 1. Detecção de Rosto
-    faces = face_cascade.detectMultiScale(gray_image, scaleFactor=1.1, minNeighbors=5, minSize=(100, 100))
+    # (rostos menores que 100px são descartados; a detecção é a do contexto)
+    faces = ctx.faces_at_least((100, 100))
     if len(faces) == 0:
         return False, "Nenhum rosto detectado na imagem."
     
     # Considerando apenas o maior rosto para análise de qualidade
-    # (x, y, w, h)
-    faces = sorted(faces, key=lambda f: f[2] * f[3], reverse=True)
+    # (x, y, w, h) -- o contexto já devolve os rostos do maior para o menor
     x, y, w, h = faces[0]
 
     # 2. Verificação do Tamanho do Rosto
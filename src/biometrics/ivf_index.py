@@ -0,0 +1,226 @@
+import os
+
+import numpy as np
+
+from src.biometrics.gallery import Gallery, _as_matrix
+
+# ivf_index.py
+# Índice aproximado (IVF: inverted file) para identificação 1:N em galerias grandes.
+# - k-means esférico sobre as amostras normalizadas gera nlist centróides
+# - cada amostra entra na lista do centróide mais próximo (guardamos o id do usuário)
+# - na busca, só as nprobe listas mais próximas da query são visitadas; os usuários
+#   encontrados formam a shortlist, que é re-pontuada exatamente pela Gallery
+#   (ver matcher.decide_match_indexed)
+# O índice é opcional: sem ele o matcher continua fazendo a varredura completa.
+
+DEFAULT_NPROBE = 8
+DEFAULT_KMEANS_ITERS = 20
+DEFAULT_TRAIN_PER_LIST = 256  # amostras de treino por centróide (limita o custo do k-means)
+INDEX_SUFFIX = '.ivf.npz'
+
+
+def default_nlist(num_rows: int) -> int:
+    """Regra usual de IVF: ~4*sqrt(N) listas, pelo menos 1."""
+    return max(1, min(num_rows, int(4 * np.sqrt(max(num_rows, 1)))))
+
+
+def index_path_for(db_path: str) -> str:
+    """Arquivo do índice ao lado do banco SQLite (ex.: biometric_database.db.ivf.npz)."""
+    return db_path + INDEX_SUFFIX
+
+
+def _normalize_rows(x: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(x, axis=1, keepdims=True)
+    return np.divide(x, norms, out=np.zeros_like(x), where=norms > 0)
+
+
+def _kmeans(x: np.ndarray, k: int, iters: int, seed: int) -> np.ndarray:
+    """k-means esférico (similaridade cosseno). Devolve centróides normalizados (k x D)."""
+    rng = np.random.default_rng(seed)
+    centroids = x[rng.choice(x.shape[0], size=k, replace=False)].copy()
+    for _ in range(iters):
+        assign = np.argmax(x @ centroids.T, axis=1)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assign, x)
+        counts = np.bincount(assign, minlength=k)
+        empty = counts == 0
+        if empty.any():
+            # lista vazia: recomeça num ponto aleatório
+            sums[empty] = x[rng.choice(x.shape[0], size=int(empty.sum()))]
+        new = _normalize_rows(sums)
+        if np.allclose(new, centroids, atol=1e-6):
+            centroids = new
+            break
+        centroids = new
+    return centroids
+
+
+class IVFIndex:
+    """
+    Listas invertidas sobre as amostras da galeria.
+    - centroids: float32 (nlist x D), normalizados
+    - lists: uma lista de arrays int64 com o id do usuário de cada amostra da lista
+    """
+    def __init__(self, centroids: np.ndarray, lists=None, nprobe: int = DEFAULT_NPROBE):
+        self.centroids = np.ascontiguousarray(centroids, dtype=np.float32)
+        self.lists = lists if lists is not None else [np.zeros(0, dtype=np.int64) for _ in range(self.nlist)]
+        self.nprobe = nprobe
+        # carimbo do banco (DatabaseManager) com que o índice foi salvo; None = desconhecido
+        self.stamp = None
+
+    @property
+    def nlist(self) -> int:
+        return self.centroids.shape[0]
+
+    @property
+    def dim(self) -> int:
+        return self.centroids.shape[1]
+
+    def __len__(self):
+        return int(sum(lst.size for lst in self.lists))
+
+    @classmethod
+    def train(cls, gallery: Gallery, nlist: int = None, nprobe: int = DEFAULT_NPROBE,
+              iters: int = DEFAULT_KMEANS_ITERS, seed: int = 0):
+        """Treina os centróides com as amostras da galeria e indexa todas elas."""
+        x = _normalize_rows(gallery.dense())
+        if x.shape[0] == 0:
+            raise ValueError('Galeria vazia: não há amostras para treinar o índice.')
+        nlist = min(nlist or default_nlist(x.shape[0]), x.shape[0])
+        rng = np.random.default_rng(seed)
+        train = x
+        max_train = nlist * DEFAULT_TRAIN_PER_LIST
+        if x.shape[0] > max_train:
+            train = x[rng.choice(x.shape[0], size=max_train, replace=False)]
+        index = cls(_kmeans(train, nlist, iters, seed), nprobe=nprobe)
+        index._add_rows(x, gallery.user_ids())
+        return index
+
+    def _assign(self, x: np.ndarray) -> np.ndarray:
+        return np.argmax(_normalize_rows(x) @ self.centroids.T, axis=1)
+
+    def _add_rows(self, x: np.ndarray, ids: np.ndarray):
+        if x.shape[0] == 0:
+            return
+        assign = self._assign(x)
+        for list_no in np.unique(assign):
+            self.lists[list_no] = np.concatenate([self.lists[list_no], ids[assign == list_no]])
+
+    def add_user(self, user_id: int, features):
+        """Indexa as amostras de um usuário novo (os centróides não mudam)."""
+        block = _as_matrix(features)
+        if block.shape[0] == 0 or block.shape[1] != self.dim:
+            return
+        self._add_rows(block, np.full(block.shape[0], user_id, dtype=np.int64))
+
+    def remove_user(self, user_id: int):
+        for i, lst in enumerate(self.lists):
+            if lst.size and (lst == user_id).any():
+                self.lists[i] = lst[lst != user_id]
+
+    def replace_user(self, user_id: int, features):
+        self.remove_user(user_id)
+        self.add_user(user_id, features)
+
+    def shortlist(self, query_feat, nprobe: int = None) -> np.ndarray:
+        """Ids dos usuários com alguma amostra nas nprobe listas mais próximas da query."""
+        nprobe = min(nprobe or self.nprobe, self.nlist)
+        query = np.asarray(query_feat, dtype=np.float32).ravel()
+        if query.size != self.dim:
+            return np.zeros(0, dtype=np.int64)
+        sims = self.centroids @ query
+        if nprobe < self.nlist:
+            probe = np.argpartition(-sims, nprobe - 1)[:nprobe]
+        else:
+            probe = np.arange(self.nlist)
+        found = [self.lists[i] for i in probe if self.lists[i].size]
+        if not found:
+            return np.zeros(0, dtype=np.int64)
+        return np.unique(np.concatenate(found))
+
+    def save(self, path: str):
+        """Grava centróides e listas num .npz (escrita atômica via arquivo temporário)."""
+        sizes = np.array([lst.size for lst in self.lists], dtype=np.int64)
+        ids = np.concatenate(self.lists) if self.lists else np.zeros(0, dtype=np.int64)
+        tmp = path + '.tmp.npz'
+        np.savez(tmp, centroids=self.centroids, sizes=sizes, ids=ids, nprobe=np.int64(self.nprobe),
+                 stamp=np.str_(self.stamp or ''))
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path: str):
+        """Lê um índice salvo com save(); devolve None se o arquivo não existir."""
+        if not os.path.exists(path):
+            return None
+        with np.load(path) as data:
+            centroids = data['centroids']
+            bounds = np.concatenate([[0], np.cumsum(data['sizes'])])
+            ids = data['ids']
+            lists = [ids[bounds[i]:bounds[i + 1]].copy() for i in range(len(bounds) - 1)]
+            index = cls(centroids, lists, nprobe=int(data['nprobe']))
+            # arquivos antigos não têm carimbo: o DatabaseManager reconstrói o índice
+            if 'stamp' in data.files:
+                index.stamp = str(data['stamp']) or None
+            return index
+
+
+def recall_report(index: IVFIndex, gallery: Gallery, queries, nprobe_values=(1, 2, 4, 8, 16),
+                  top_k: int = 3, metric: str = 'cosine'):
+    """Compara o índice com a varredura completa.
+
+    Serve para qualquer índice com shortlist(query, parâmetro) (IVF ou hash
+    binário); nprobe_values são os valores do parâmetro testados. Para cada um: recall@1 (o melhor usuário da força bruta está na shortlist)
+    e a fração média da galeria que precisou ser re-pontuada.
+    Retorna lista de dicts {'nprobe', 'recall', 'candidates'}.
+    """
+    queries = list(queries)
+    truth = []
+    for q in queries:
+        order, _, _ = gallery.rank(q, top_k=top_k, metric=metric)
+        truth.append(gallery.users[int(order[0])].get('id') if len(order) else None)
+    report = []
+    for nprobe in nprobe_values:
+        hits = 0
+        sizes = []
+        for q, expected in zip(queries, truth):
+            cand = index.shortlist(q, nprobe)
+            sizes.append(cand.size)
+            hits += int(expected is not None and expected in cand)
+        n = max(len(truth), 1)
+        report.append({
+            'nprobe': nprobe,
+            'recall': hits / n,
+            'candidates': float(np.mean(sizes)) / max(len(gallery), 1) if sizes else 0.0,
+        })
+    return report
+
+
+def main(argv=None):
+    """Treina o índice de um banco e mostra o recall contra a força bruta.
+
+    Uso: python -m src.biometrics.ivf_index [caminho_do_banco] [nlist]
+    As consultas são amostras da própria galeria (até 500, sorteadas).
+    """
+    import sys
+    from src.database.database_manager import DatabaseManager
+
+    argv = sys.argv[1:] if argv is None else argv
+    db_path = argv[0] if argv else 'biometric_database.db'
+    nlist = int(argv[1]) if len(argv) > 1 else None
+    db = DatabaseManager(db_path)
+    try:
+        index = db.build_index(nlist=nlist)
+        if index is None:
+            return
+        gallery = db.get_gallery()
+        rng = np.random.default_rng(0)
+        rows = rng.choice(gallery.matrix.shape[0], size=min(500, gallery.matrix.shape[0]), replace=False)
+        print(f"Índice IVF: {index.nlist} listas, {len(index)} amostras, {len(gallery)} usuários -> {db.index_path}")
+        for r in recall_report(index, gallery, gallery.dense()[rows]):
+            print(f"nprobe={r['nprobe']:3d}  recall@1={r['recall']:.3f}  candidatos={r['candidates'] * 100:.1f}% da galeria")
+    finally:
+        db.close_connection()
+
+
+if __name__ == '__main__':
+    main()
@@ -1,6 +1,8 @@
 import math
 from typing import List, Dict, Optional
 
+from src.biometrics.gallery import Gallery
+
 # matcher.py
 # Utilitários de comparação e a política de decisão (best/mean/margin).
 # Comentários rápidos e diretos: este módulo responde pela lógica que decide
@@ -16,6 +18,11 @@ DEFAULT_MARGIN = 0.04
 DEFAULT_MIN_SAMPLES = 3
 
 DEFAULT_METRIC = 'cosine'  # Nova opção de métrica
+DEFAULT_BATCH_SIZE = 64  # queries por produto matriz-matriz nas APIs em lote
+# diferença máxima esperada entre os scores em lote (GEMM) e os de uma query só
+# (GEMV): a ordem das somas em float32 muda com o kernel do BLAS (~1e-6)
+BATCH_TOLERANCE = 1e-5
+DEFAULT_COHORT_SIZE = 16  # impostores usados na regra de margem da verificação 1:1
 def _euclidean_distance(a: List[float], b: List[float]) -> float:
     if not a or not b or len(a) != len(b):
         return 0.0
@@ -41,11 +48,11 @@ def normalize_features(feats):
     Exemplos: [] -> [] ; [v1,v2,...] onde v1 é número -> [[v1,...]] ;
     já [[...],[...]] permanece igual.
     """
-    if not feats:
+    if feats is None or len(feats) == 0:
         return []
     # Se é lista e o primeiro elemento é número, trata como vetor único
     first = feats[0]
-    if isinstance(first, (int, float)):
+    if isinstance(first, (int, float)) or getattr(feats, 'ndim', 2) == 1:
         return [feats]
     # Se é lista de listas (cada elemento iterável), assume que está no formato correto
     return feats
@@ -56,6 +63,13 @@ def cosine_similarity(a: List[float], b: List[float]) -> float:
     return _cosine_similarity(a, b)
 
 
+def as_gallery(users_data) -> Gallery:
+    """Aceita a lista de usuários do DatabaseManager ou uma Gallery já montada."""
+    if isinstance(users_data, Gallery):
+        return users_data
+    return Gallery.from_users(users_data or [])
+
+
 def score_users(query_feat: List[float], users_data: List[Dict], top_k: int = 3, metric: str = DEFAULT_METRIC):
     """Para cada usuário calcula:
     - best_score: a maior similaridade entre query e amostras do usuário
@@ -63,83 +77,38 @@ def score_users(query_feat: List[float], users_data: List[Dict], top_k: int = 3,
 
     Retorna lista (user, best_score, mean_top_k) ordenada pelo best_score.
     Essa combinação diminui falsos positivos causados por 1 amostra isolada.
+
+    users_data pode ser a lista de dicts do banco ou uma Gallery; o cálculo é
+    feito pela Gallery (um único produto matriz-vetor em float32).
     """
-    results = []
-    for u in users_data:
-        feats = normalize_features(u.get('features') or [])
-        scores = []
-        for f in feats:
-            try:
-                if metric == 'cosine':
-                    s = _cosine_similarity(query_feat, f)
-                elif metric == 'euclidean':
-                    s = _euclidean_distance(query_feat, f)
-                else:
-                    s = _cosine_similarity(query_feat, f)
-            except Exception:
-                s = 0.0
-            scores.append(s)
-
-        if not scores:
-            best = 0.0
-            mean_top = 0.0
-        else:
-            scores.sort(reverse=True)
-            best = scores[0]
-            k = min(top_k, len(scores))
-            mean_top = sum(scores[:k]) / k if k > 0 else 0.0
-
-        results.append((u, best, mean_top))
-
-    results.sort(key=lambda x: x[1], reverse=True)
-    return results
+    return as_gallery(users_data).score(query_feat, top_k=top_k, metric=metric)
 
 
 def find_best_match(query_feat: List[float], users_data: List[Dict], metric: str = DEFAULT_METRIC) -> Optional[Dict]:
     """Encontra o usuário com maior pontuação (máximo entre as amostras).
 
-    Entrada: users_data = [{'id','name','access_level','features'}, ...]
+    Entrada: users_data = [{'id','name','access_level','features'}, ...] ou Gallery
     Retorna {'user':..., 'score':...} ou None.
     """
-    best = None
-    best_score = -1.0
-    for u in users_data:
-        feats = u.get('features') or []
-        scores = []
-        for f in feats:
-            if metric == 'cosine':
-                s = _cosine_similarity(query_feat, f)
-            elif metric == 'euclidean':
-                s = _euclidean_distance(query_feat, f)
-            else:
-                s = _cosine_similarity(query_feat, f)
-            scores.append(s)
-
-        # Use a maior pontuação entre as amostras do usuário (menos sensível à média)
-        user_score = max(scores) if scores else 0.0
-        if user_score > best_score:
-            best_score = user_score
-            best = u
-
-    if best is None:
+    gallery = as_gallery(users_data)
+    if len(gallery) == 0:
         return None
+    order, best, _ = gallery.rank(query_feat, metric=metric)
+    pos = int(order[0])
+    return {'user': gallery.users[pos], 'score': float(best[pos])}
 
-    return {'user': best, 'score': best_score}
 
+def decide_from_scores(scored, num_samples: int, top_k: int = DEFAULT_TOP_K,
+                       best_threshold: float = DEFAULT_BEST_THRESHOLD,
+                       mean_threshold: float = DEFAULT_MEAN_THRESHOLD,
+                       margin: float = DEFAULT_MARGIN,
+                       min_samples: int = DEFAULT_MIN_SAMPLES):
+    """Aplica as regras best/mean/margin sobre uma lista já pontuada
+    [(user, best, mean_top), ...] ordenada pelo best_score.
 
-def decide_match(query_feat: List[float], users_data: List[Dict], top_k: int = DEFAULT_TOP_K,
-                best_threshold: float = DEFAULT_BEST_THRESHOLD,
-                mean_threshold: float = DEFAULT_MEAN_THRESHOLD,
-                margin: float = DEFAULT_MARGIN,
-                min_samples: int = DEFAULT_MIN_SAMPLES,
-                metric: str = DEFAULT_METRIC):
-    """Aplica a política de decisão combinada e devolve um resultado legível.
-
-    Retorna: (granted, best_user, best_score, mean_top, reason, scored_list)
-    - reason: texto curto em pt explicando negação (None se acesso concedido)
-    - scored_list: útil para debug/print
+    num_samples: quantidade de amostras do primeiro candidato.
+    Retorna no mesmo formato de decide_match.
     """
-    scored = score_users(query_feat, users_data, top_k=top_k, metric=metric)
     if not scored:
         return False, None, 0.0, 0.0, 'Nenhum candidato encontrado.', scored
 
@@ -149,9 +118,6 @@ def decide_match(query_feat: List[float], users_data: List[Dict], top_k: int = D
     best_user, best_score, mean_top = best_entry
     _, second_best_score, _ = second_entry
 
-    candidate_feats = best_user.get('features') if best_user else []
-    num_samples = len(candidate_feats) if candidate_feats else 0
-
     # Regras de decisão
     if not best_user:
         return False, None, 0.0, 0.0, 'Nenhum candidato encontrado.', scored
@@ -166,3 +132,161 @@ def decide_match(query_feat: List[float], users_data: List[Dict], top_k: int = D
 
     # se passou por todos os testes, conceder acesso
     return True, best_user, best_score, mean_top, None, scored
+
+
+def decide_match(query_feat: List[float], users_data: List[Dict], top_k: int = DEFAULT_TOP_K,
+                best_threshold: float = DEFAULT_BEST_THRESHOLD,
+                mean_threshold: float = DEFAULT_MEAN_THRESHOLD,
+                margin: float = DEFAULT_MARGIN,
+                min_samples: int = DEFAULT_MIN_SAMPLES,
+                metric: str = DEFAULT_METRIC):
+    """Aplica a política de decisão combinada e devolve um resultado legível.
+
+    Retorna: (granted, best_user, best_score, mean_top, reason, scored_list)
+    - reason: texto curto em pt explicando negação (None se acesso concedido)
+    - scored_list: útil para debug/print
+    """
+    gallery = as_gallery(users_data)
+    order, best, mean_top = gallery.rank(query_feat, top_k=top_k, metric=metric)
+    scored = [(gallery.users[i], float(best[i]), float(mean_top[i])) for i in order]
+    num_samples = gallery.num_samples(int(order[0])) if len(order) else 0
+    return decide_from_scores(scored, num_samples, top_k=top_k,
+                              best_threshold=best_threshold,
+                              mean_threshold=mean_threshold,
+                              margin=margin, min_samples=min_samples)
+
+
+def _batches(query_feats, batch_size: int):
+    # divide as queries em blocos para limitar a matriz de similaridades (P x N)
+    query_feats = list(query_feats)
+    for start in range(0, len(query_feats), batch_size):
+        yield query_feats[start:start + batch_size]
+
+
+def score_users_batch(query_feats, users_data, top_k: int = DEFAULT_TOP_K, metric: str = DEFAULT_METRIC,
+                      batch_size: int = DEFAULT_BATCH_SIZE):
+    """score_users para várias queries (lista de vetores ou matriz P x D).
+
+    As similaridades de cada bloco de até batch_size queries saem de um único
+    produto matriz-matriz com a galeria. Retorna uma lista pontuada por query,
+    no mesmo formato de score_users. Os scores podem diferir dos de score_users
+    em até BATCH_TOLERANCE, e usuários empatados dentro dessa tolerância podem
+    trocar de posição.
+    """
+    gallery = as_gallery(users_data)
+    results = []
+    for chunk in _batches(query_feats, batch_size):
+        orders, best, mean_top = gallery.rank_batch(chunk, top_k=top_k, metric=metric)
+        for order, b, m in zip(orders, best, mean_top):
+            results.append([(gallery.users[i], float(b[i]), float(m[i])) for i in order])
+    return results
+
+
+def decide_match_batch(query_feats, users_data, top_k: int = DEFAULT_TOP_K,
+                       best_threshold: float = DEFAULT_BEST_THRESHOLD,
+                       mean_threshold: float = DEFAULT_MEAN_THRESHOLD,
+                       margin: float = DEFAULT_MARGIN,
+                       min_samples: int = DEFAULT_MIN_SAMPLES,
+                       metric: str = DEFAULT_METRIC,
+                       batch_size: int = DEFAULT_BATCH_SIZE):
+    """decide_match para várias queries (rajada de vídeo, pasta de probes, várias câmeras).
+
+    Retorna uma lista com o resultado de decide_match de cada query, na ordem de entrada.
+    As decisões (concedido, usuário, motivo) são as de decide_match: a query cujos
+    scores em lote ficam a menos de BATCH_TOLERANCE de um limiar, da margem ou de
+    um empate entre top1 e top2 é re-pontuada pelo caminho de uma query só.
+    Nas demais, os scores devolvidos podem diferir em até BATCH_TOLERANCE.
+    """
+    gallery = as_gallery(users_data)
+    rules = dict(top_k=top_k, best_threshold=best_threshold, mean_threshold=mean_threshold,
+                 margin=margin, min_samples=min_samples)
+    results = []
+    for chunk in _batches(query_feats, batch_size):
+        orders, best, mean_top = gallery.rank_batch(chunk, top_k=top_k, metric=metric)
+        for query, order, b, m in zip(chunk, orders, best, mean_top):
+            second = b[order[1]] if len(order) > 1 else 0.0
+            if len(order) and near_boundary(b[order[0]], second, m[order[0]], best_threshold, mean_threshold, margin):
+                results.append(decide_match(query, gallery, metric=metric, **rules))
+                continue
+            scored = [(gallery.users[i], float(b[i]), float(m[i])) for i in order]
+            num_samples = gallery.num_samples(int(order[0])) if len(order) else 0
+            results.append(decide_from_scores(scored, num_samples, **rules))
+    return results
+
+
+def near_boundary(best: float, second: float, mean_top: float,
+                  best_threshold: float = DEFAULT_BEST_THRESHOLD,
+                  mean_threshold: float = DEFAULT_MEAN_THRESHOLD,
+                  margin: float = DEFAULT_MARGIN) -> bool:
+    """True se scores calculados em outra ordem de soma (lote, shards) podem mudar
+    a decisão: top-1 a menos de BATCH_TOLERANCE de um limiar, da margem ou do top-2."""
+    gap = best - second
+    return (abs(best - best_threshold) < BATCH_TOLERANCE
+            or abs(mean_top - mean_threshold) < BATCH_TOLERANCE
+            or abs(gap - margin) < BATCH_TOLERANCE
+            or gap < BATCH_TOLERANCE)
+
+
+def decide_match_indexed(query_feat: List[float], users_data, index=None, nprobe: Optional[int] = None, **kwargs):
+    """decide_match sobre a shortlist de um índice aproximado (IVFIndex ou BinaryHashIndex).
+
+    O índice só escolhe os candidatos; os usuários da shortlist são re-pontuados
+    exatamente pela Gallery e passam pelas mesmas regras de decide_match.
+    nprobe é o parâmetro de busca do índice (listas visitadas no IVF, amostras
+    candidatas no hash); None usa o padrão do índice.
+    Sem índice (index=None) faz a varredura completa.
+    Quando a shortlist concede o acesso, a margem é refeita contra o segundo
+    colocado da galeria inteira (um produto matriz-vetor): um usuário parecido
+    fora da shortlist não pode ser ignorado pela regra de margem.
+    """
+    gallery = as_gallery(users_data)
+    if index is None:
+        return decide_match(query_feat, gallery, **kwargs)
+    query = gallery.prepare_query(query_feat)
+    candidates = index.shortlist(query, nprobe)
+    result = decide_match(query, gallery.subset(candidates), **kwargs)
+    if not result[0]:
+        return result
+    top_k = kwargs.pop('top_k', DEFAULT_TOP_K)
+    metric = kwargs.pop('metric', DEFAULT_METRIC)
+    scored = result[5]
+    position = gallery.position_by_id()[result[1].get('id')]
+    runner = gallery.runner_up(query, position, top_k=top_k, metric=metric)
+    shortlist_second = scored[1][1] if len(scored) > 1 else 0.0
+    if runner is None or runner[1] <= shortlist_second:
+        return result
+    runner_user = gallery.users[runner[0]]
+    scored = [scored[0], (runner_user, runner[1], runner[2])] + \
+        [entry for entry in scored[1:] if entry[0].get('id') != runner_user.get('id')]
+    return decide_from_scores(scored, gallery.num_samples(position), top_k=top_k, **kwargs)
+
+
+def verify_match(query_feat: List[float], claimed, cohort=None, top_k: int = DEFAULT_TOP_K,
+                 best_threshold: float = DEFAULT_BEST_THRESHOLD,
+                 mean_threshold: float = DEFAULT_MEAN_THRESHOLD,
+                 margin: float = DEFAULT_MARGIN,
+                 min_samples: int = DEFAULT_MIN_SAMPLES,
+                 metric: str = DEFAULT_METRIC):
+    """Verificação 1:1: a captura pertence ao usuário declarado (crachá, ID digitado)?
+
+    claimed: dict do usuário (com 'features') ou Gallery só com ele.
+    cohort: Gallery pequena de impostores (ex.: DatabaseManager.gallery_cache.cohort);
+        o melhor impostor faz o papel do top-2 na regra de margem.
+    O custo depende só do tamanho do usuário e do cohort, não da galeria.
+    Retorna no mesmo formato de decide_match; scored_list traz o declarado
+    primeiro e depois os impostores ordenados.
+    """
+    claimed_gallery = as_gallery([claimed] if isinstance(claimed, dict) else claimed)
+    if len(claimed_gallery) == 0:
+        return False, None, 0.0, 0.0, 'Usuário declarado não encontrado.', []
+    order, best, mean_top = claimed_gallery.rank(query_feat, top_k=top_k, metric=metric)
+    scored = [(claimed_gallery.users[0], float(best[0]), float(mean_top[0]))]
+    if cohort is not None and len(cohort):
+        claimed_id = claimed_gallery.users[0].get('id')
+        impostors = [entry for entry in cohort.score(query_feat, top_k=top_k, metric=metric)
+                     if entry[0].get('id') != claimed_id]
+        scored.extend(impostors)
+    return decide_from_scores(scored, claimed_gallery.num_samples(0), top_k=top_k,
+                              best_threshold=best_threshold,
+                              mean_threshold=mean_threshold,
+                              margin=margin, min_samples=min_samples)
@@ -0,0 +1,122 @@
+import time
+
+import cv2
+import numpy as np
+
+from src.biometrics.detectors import get_detector
+from src.biometrics.frame_context import DETECT_MIN_NEIGHBORS, DETECT_MIN_SIZE, DETECT_SCALE_FACTOR
+
+# motion_gate.py
+# Agendador da autenticação por eventos (substitui o timer fixo de 1 s).
+# - todo frame passa por um teste barato: cinza reduzido para MOTION_SIZE e
+#   diferença média absoluta contra o frame anterior
+# - sem movimento há mais de PRESENCE_HOLD segundos: ninguém na frente do
+#   quiosque, nenhuma extração roda
+# - com movimento recente, um Haar rápido numa versão reduzida do frame
+#   (FACE_CHECK_WIDTH) diz se há um rosto provável; só então o pipeline
+#   completo (qualidade, Haar, CLAHE, extração e matching) é disparado
+# - o teste de rosto só roda quando o worker está livre (ready=True), então
+#   as tentativas se repetem na taxa que o processamento permite
+# - cena parada com um rosto visto no último teste (usuário parado, bem
+#   enquadrado): o teste de rosto e a tentativa continuam a cada
+#   STILL_RETRY_INTERVAL segundos, até o rosto sumir
+
+MOTION_SIZE = (80, 60)  # (largura, altura) do frame usado na diferença
+MOTION_THRESHOLD = 2.0  # diferença média (0-255) que conta como movimento
+PRESENCE_HOLD = 2.0  # segundos que a cena continua "ativa" após o último movimento
+FACE_CHECK_WIDTH = 160  # largura do frame no teste rápido de rosto
+STILL_RETRY_INTERVAL = 1.0  # segundos entre tentativas com a cena parada e rosto presente
+
+
+class MotionGate:
+    """
+    Decide, frame a frame, se vale rodar a autenticação completa.
+
+    Uso (a cada frame novo):
+        gate = MotionGate()
+        if gate.should_attempt(frame, ready=not pipeline.busy):
+            pipeline.submit(frame, ...)
+    """
+    def __init__(self, motion_threshold: float = MOTION_THRESHOLD, presence_hold: float = PRESENCE_HOLD,
+                 face_check_width: int = FACE_CHECK_WIDTH, require_face: bool = True,
+                 still_retry_interval: float = STILL_RETRY_INTERVAL, clock=time.monotonic):
+        self.motion_threshold = motion_threshold
+        self.presence_hold = presence_hold
+        self.still_retry_interval = still_retry_interval
+        self.face_check_width = face_check_width
+        self.require_face = require_face
+        self.clock = clock
+        self._previous = None
+        self._last_motion = None
+        self._now = None
+        self._last_check = None  # instante do último teste de rosto / tentativa
+        self._face_seen = False  # resultado do último teste de rosto
+        self.counters = {'frames': 0, 'motion': 0, 'face_checks': 0, 'attempts': 0, 'still_retries': 0}
+
+    def reset(self):
+        self._previous = None
+        self._last_motion = None
+        self._last_check = None
+        self._face_seen = False
+
+    def motion_score(self, frame: np.ndarray) -> float:
+        """Diferença média absoluta contra o frame anterior (0 no primeiro frame)."""
+        gray = frame if frame.ndim == 2 else cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        small = cv2.resize(gray, MOTION_SIZE, interpolation=cv2.INTER_AREA)
+        previous, self._previous = self._previous, small
+        if previous is None:
+            return 0.0
+        return float(cv2.absdiff(small, previous).mean())
+
+    def face_likely(self, frame: np.ndarray) -> bool:
+        """Haar numa cópia reduzida do frame; sem detector, assume que sim."""
+        detector = get_detector('face')
+        if detector is None:
+            return True
+        gray = frame if frame.ndim == 2 else cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        scale = min(1.0, self.face_check_width / gray.shape[1])
+        if scale < 1.0:
+            gray = cv2.resize(gray, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+        min_size = tuple(max(1, int(v * scale)) for v in DETECT_MIN_SIZE)
+        try:
+            faces = detector.detectMultiScale(gray, scaleFactor=DETECT_SCALE_FACTOR,
+                                              minNeighbors=DETECT_MIN_NEIGHBORS, minSize=min_size)
+        except Exception:
+            return True
+        return len(faces) > 0
+
+    def observe(self, frame: np.ndarray) -> bool:
+        """Atualiza o estado com um frame novo. Retorna True se a cena está ativa."""
+        now = self._now = self.clock()
+        self.counters['frames'] += 1
+        if self.motion_score(frame) >= self.motion_threshold or self._last_motion is None:
+            # o primeiro frame também conta: alguém pode já estar na frente da câmera
+            self._last_motion = now
+            self.counters['motion'] += 1
+        return now - self._last_motion <= self.presence_hold
+
+    def should_attempt(self, frame: np.ndarray, ready: bool = True) -> bool:
+        """observe() + teste rápido de rosto: True quando vale rodar o pipeline completo.
+
+        ready=False (worker ocupado) só acompanha o movimento, sem o teste de rosto.
+        Com a cena parada só tenta de novo se o último teste viu um rosto, no
+        máximo uma vez por still_retry_interval.
+        """
+        active = self.observe(frame)
+        if not ready:
+            return False
+        now = self._now
+        if not active:
+            if not self._face_seen or now - self._last_check < self.still_retry_interval:
+                return False
+            self.counters['still_retries'] += 1
+        self._last_check = now
+        if self.require_face:
+            self.counters['face_checks'] += 1
+            self._face_seen = self.face_likely(frame)
+            if not self._face_seen:
+                return False
+        else:
+            self._face_seen = True
+        self.counters['attempts'] += 1
+        return True
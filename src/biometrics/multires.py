@@ -0,0 +1,75 @@
+import numpy as np
+
+from src.biometrics.gallery import Gallery, _as_matrix
+
+# multires.py
+# Cascata grosso -> fino para identificação 1:N, sem treino.
+# - cada template 64x64 tem um descritor companheiro 16x16 (média de blocos 4x4
+#   da mesma imagem CLAHE, normalizado L2): 16x menos dados por amostra
+# - a galeria inteira é pontuada primeiro nos vetores pequenos; só os top_n
+#   usuários vão para a re-pontuação completa (matcher.decide_match_indexed)
+# - como a decisão final usa os vetores 64x64, o resultado é o mesmo da
+#   varredura completa sempre que o top-1/top-2 estão entre os top_n
+
+TEMPLATE_SIZE = (64, 64)
+LOWRES_SIZE = (16, 16)
+DEFAULT_TOP_N = 32
+
+
+def lowres_descriptor(features, size=TEMPLATE_SIZE, low_size=LOWRES_SIZE) -> np.ndarray:
+    """Descritor de baixa resolução de um ou mais templates (n x h*w, normalizado L2).
+
+    Equivale a reduzir a imagem pré-processada com média por blocos
+    (cv2.INTER_AREA), direto sobre o vetor já extraído.
+    """
+    x = _as_matrix(features)
+    h, w = size
+    lh, lw = low_size
+    if x.shape[0] == 0:
+        return np.zeros((0, lh * lw), dtype=np.float32)
+    if x.shape[1] != h * w or h % lh or w % lw:
+        raise ValueError(f"Template com {x.shape[1]} valores não é uma imagem {h}x{w} divisível em {lh}x{lw}.")
+    low = x.reshape(-1, lh, h // lh, lw, w // lw).mean(axis=(2, 4)).reshape(-1, lh * lw)
+    norms = np.linalg.norm(low, axis=1, keepdims=True)
+    return np.divide(low, norms, out=np.zeros_like(low), where=norms > 0).astype(np.float32)
+
+
+class LowResIndex:
+    """
+    Primeiro estágio da cascata: uma Gallery paralela só com os descritores 16x16.
+    Mesma interface dos outros índices (shortlist / add_user / remove_user).
+    """
+    def __init__(self, gallery: Gallery, top_n: int = DEFAULT_TOP_N):
+        self.gallery = gallery
+        self.top_n = top_n
+
+    @classmethod
+    def from_gallery(cls, gallery: Gallery, top_n: int = DEFAULT_TOP_N):
+        if gallery.projection is not None:
+            raise ValueError('A cascata multi-resolução precisa dos templates 64x64 (sem projeção PCA).')
+        low = lowres_descriptor(gallery.dense()) if gallery.matrix.shape[0] else \
+            np.zeros((0, LOWRES_SIZE[0] * LOWRES_SIZE[1]), dtype=np.float32)
+        return cls(Gallery(gallery.users, low, gallery.offsets), top_n)
+
+    def __len__(self):
+        return self.gallery.matrix.shape[0]
+
+    def add_user(self, user_id: int, features):
+        self.gallery = self.gallery.with_user({'id': user_id}, lowres_descriptor(features))
+
+    def remove_user(self, user_id: int):
+        self.gallery = self.gallery.without_user(user_id)
+
+    def replace_user(self, user_id: int, features):
+        self.remove_user(user_id)
+        self.add_user(user_id, features)
+
+    def shortlist(self, query_feat, top_n: int = None) -> np.ndarray:
+        """Ids dos top_n usuários pelo best_score nos descritores 16x16."""
+        query = np.asarray(query_feat, dtype=np.float32).ravel()
+        if query.size != TEMPLATE_SIZE[0] * TEMPLATE_SIZE[1] or len(self.gallery) == 0:
+            return np.zeros(0, dtype=np.int64)
+        gallery = self.gallery
+        order, _, _ = gallery.rank(lowres_descriptor(query)[0])
+        top = order[:top_n or self.top_n]
+        return np.asarray([gallery.users[i].get('id') for i in top], dtype=np.int64)
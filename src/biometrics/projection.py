@@ -0,0 +1,198 @@
+import os
+import time
+
+import numpy as np
+
+from src.biometrics.gallery import Gallery, _as_matrix, split_probes
+
+# projection.py
+# Projeção linear aprendida (PCA / eigenfaces) para encolher os templates.
+# - os templates brutos (64x64 CLAHE = 4096 floats) continuam no banco
+# - a projeção é ajustada offline com as amostras cadastradas e gravada ao lado
+#   do banco (<db>.pca.npz); a galeria em memória e a query passam a ter 128-512 dims
+# - por padrão a PCA não é centrada (eigenfaces sobre a matriz de segundo momento):
+#   o cosseno no subespaço fica próximo do cosseno bruto e os limiares do matcher
+#   continuam valendo; com whiten=True cada componente é reescalado (compare antes)
+# Refit / re-projeção: python -m src.biometrics.projection [banco] [dims] [--whiten]
+
+DEFAULT_DIMS = 256
+DEFAULT_MAX_TRAIN_ROWS = 20000
+PROJECTION_SUFFIX = '.pca.npz'
+
+
+def projection_path_for(db_path: str) -> str:
+    """Arquivo da projeção ao lado do banco SQLite."""
+    return db_path + PROJECTION_SUFFIX
+
+
+class PCAProjection:
+    """
+    y = normalize(((x - mean) @ components.T) * scale)
+    - components: float32 (k x D), eixos principais
+    - mean: float32 (D,), zeros quando a PCA não é centrada
+    - scale: float32 (k,), 1/sqrt(autovalor) com whitening, senão 1
+    - explained: fração da energia explicada por cada componente
+    """
+    def __init__(self, components, mean=None, scale=None, explained=None):
+        self.components = np.ascontiguousarray(components, dtype=np.float32)
+        k, d = self.components.shape
+        self.mean = np.zeros(d, dtype=np.float32) if mean is None else np.asarray(mean, dtype=np.float32)
+        self.scale = np.ones(k, dtype=np.float32) if scale is None else np.asarray(scale, dtype=np.float32)
+        self.explained = np.zeros(k) if explained is None else np.asarray(explained, dtype=np.float64)
+        # componentes já multiplicados pela escala: uma única multiplicação por vetor
+        self._weights = np.ascontiguousarray((self.components * self.scale[:, None]).T)
+        self._offset = self.mean @ self._weights
+
+    @property
+    def in_dim(self) -> int:
+        return self.components.shape[1]
+
+    @property
+    def out_dim(self) -> int:
+        return self.components.shape[0]
+
+    @property
+    def whiten(self) -> bool:
+        return not np.all(self.scale == 1)
+
+    @classmethod
+    def fit(cls, matrix: np.ndarray, dims: int = DEFAULT_DIMS, whiten: bool = False,
+            center: bool = False, max_rows: int = DEFAULT_MAX_TRAIN_ROWS, seed: int = 0):
+        """Ajusta a projeção nas linhas de matrix (N x D)."""
+        x = np.asarray(matrix, dtype=np.float32)
+        if x.ndim != 2 or x.shape[0] < 2:
+            raise ValueError('São necessárias pelo menos 2 amostras para ajustar a PCA.')
+        if x.shape[0] > max_rows:
+            x = x[np.random.default_rng(seed).choice(x.shape[0], size=max_rows, replace=False)]
+        dims = min(dims, x.shape[0], x.shape[1])
+        mean = x.mean(axis=0) if center else np.zeros(x.shape[1], dtype=np.float32)
+        xc = (x - mean).astype(np.float64)
+        if xc.shape[0] <= xc.shape[1]:
+            # poucas amostras: SVD da própria matriz (N x D)
+            _, s, vt = np.linalg.svd(xc, full_matrices=False)
+            eigvals = s ** 2 / xc.shape[0]
+        else:
+            # muitas amostras: autovetores da matriz D x D
+            eigvals, vecs = np.linalg.eigh(xc.T @ xc / xc.shape[0])
+            eigvals, vt = eigvals[::-1], vecs[:, ::-1].T
+        eigvals = np.maximum(eigvals, 0.0)
+        total = eigvals.sum() or 1.0
+        scale = 1.0 / np.sqrt(eigvals[:dims] + 1e-12) if whiten else None
+        return cls(vt[:dims], mean=mean if center else None, scale=scale,
+                   explained=eigvals[:dims] / total)
+
+    def transform(self, features) -> np.ndarray:
+        """Projeta amostras (n x D ou vetor D) e normaliza L2 cada linha (n x k)."""
+        x = _as_matrix(features)
+        if x.shape[0] == 0:
+            return np.zeros((0, self.out_dim), dtype=np.float32)
+        y = x @ self._weights
+        y -= self._offset
+        norms = np.linalg.norm(y, axis=1, keepdims=True)
+        return np.divide(y, norms, out=np.zeros_like(y), where=norms > 0)
+
+    def save(self, path: str):
+        tmp = path + '.tmp.npz'
+        np.savez(tmp, components=self.components, mean=self.mean, scale=self.scale,
+                 explained=self.explained)
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path: str):
+        """Lê uma projeção salva com save(); devolve None se o arquivo não existir."""
+        if not os.path.exists(path):
+            return None
+        with np.load(path) as data:
+            return cls(data['components'], data['mean'], data['scale'], data['explained'])
+
+
+def compare_accuracy(users_data, projection: PCAProjection, probes_per_user: int = 1, min_samples: int = 1):
+    """Compara vetores brutos e projetados num protocolo simples de identificação.
+
+    De cada usuário com amostras suficientes, as últimas probes_per_user amostras
+    viram consultas contra as demais. Para bruto e projetado mede: acerto rank-1,
+    acessos concedidos ao usuário certo / errado pelo decide_match, tempo médio
+    por consulta e memória da galeria. Também conta quantas decisões mudaram.
+    """
+    from src.biometrics import matcher
+
+    enrolled, probes = split_probes(users_data, probes_per_user)
+    raw = Gallery.from_users(enrolled)
+    variants = {'bruto': raw, 'projetado': raw.projected(projection)}
+    decisions = {}
+    report = {'probes': len(probes)}
+    for name, gallery in variants.items():
+        rank1 = granted_ok = granted_wrong = 0
+        outcome = []
+        start = time.perf_counter()
+        results = matcher.decide_match_batch([f for _, f in probes], gallery, min_samples=min_samples)
+        for (user_id, _), (granted, best_user, _, _, _, scored) in zip(probes, results):
+            top = scored[0][0].get('id') if scored else None
+            rank1 += int(top == user_id)
+            granted_ok += int(granted and best_user.get('id') == user_id)
+            granted_wrong += int(granted and best_user.get('id') != user_id)
+            outcome.append((granted, top))
+        elapsed = time.perf_counter() - start
+        decisions[name] = outcome
+        n = max(len(probes), 1)
+        report[name] = {
+            'dim': gallery.dim,
+            'rank1': rank1 / n,
+            'granted_ok': granted_ok / n,
+            'granted_wrong': granted_wrong / n,
+            'ms_per_query': elapsed * 1000 / n,
+            'gallery_bytes': gallery.nbytes,
+        }
+    report['changed_decisions'] = sum(a != b for a, b in zip(decisions['bruto'], decisions['projetado']))
+    report['explained'] = float(projection.explained.sum())
+    return report
+
+
+def print_report(report):
+    print(f"Consultas: {report['probes']}  energia explicada: {report['explained'] * 100:.1f}%")
+    for name in ('bruto', 'projetado'):
+        r = report[name]
+        print(f"{name:10s} dim={r['dim']:5d}  rank1={r['rank1']:.3f}  concedido_certo={r['granted_ok']:.3f}  "
+              f"concedido_errado={r['granted_wrong']:.3f}  {r['ms_per_query']:.3f} ms/consulta  "
+              f"galeria={r['gallery_bytes'] / 1024:.0f} KiB")
+    print(f"Decisões diferentes entre bruto e projetado: {report['changed_decisions']}")
+
+
+def main(argv=None):
+    """Refit da projeção de um banco, comparação com os vetores brutos e re-projeção.
+
+    Uso: python -m src.biometrics.projection [banco] [dims] [--whiten] [--center] [--remove]
+    --remove apaga a projeção e volta aos vetores brutos.
+    """
+    import sys
+    from src.database.database_manager import DatabaseManager
+
+    argv = sys.argv[1:] if argv is None else argv
+    flags = {a for a in argv if a.startswith('--')}
+    args = [a for a in argv if not a.startswith('--')]
+    db_path = args[0] if args else 'biometric_database.db'
+    dims = int(args[1]) if len(args) > 1 else DEFAULT_DIMS
+    db = DatabaseManager(db_path)
+    try:
+        if '--remove' in flags:
+            db.set_projection(None)
+            print('Projeção removida; a galeria volta a usar os vetores brutos.')
+            return
+        users = db.get_all_users_with_features()
+        raw = Gallery.from_users(users)
+        if raw.matrix.shape[0] < 2:
+            print('Amostras insuficientes para ajustar a projeção.')
+            return
+        projection = PCAProjection.fit(raw.matrix, dims=dims, whiten='--whiten' in flags,
+                                       center='--center' in flags)
+        print(f"Projeção ajustada: {projection.in_dim} -> {projection.out_dim} dims "
+              f"({'com' if projection.whiten else 'sem'} whitening)")
+        print_report(compare_accuracy(users, projection))
+        db.set_projection(projection)
+        print(f"Projeção gravada em {db.projection_path}; galeria e índices re-projetados.")
+    finally:
+        db.close_connection()
+
+
+if __name__ == '__main__':
+    main()
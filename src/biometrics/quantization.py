@@ -0,0 +1,218 @@
+from functools import lru_cache
+
+import numpy as np
+
+from src.biometrics.gallery import Gallery, split_probes
+
+# quantization.py
+# Galeria quantizada: mesma interface da Gallery, amostras guardadas em
+# float16 (2x menor) ou int8 com uma escala por vetor (4x menor).
+# - int8: q = round(x / s), s = max|x| / 127 por amostra; x ≈ q * s
+# - o produto escalar é feito em blocos pequenos de linhas convertidos para
+#   float32 num buffer reaproveitado (o NumPy não tem BLAS para int8/float16)
+#   e a escala de cada amostra é aplicada depois; a matriz inteira continua
+#   quantizada na memória. float16 -> float32 usa cv2.convertFp16 quando o
+#   OpenCV está disponível (a conversão do NumPy é bem mais lenta)
+# - calibrate() mede quanto best/mean_top mudam em relação ao float32 e
+#   quantas decisões de decide_match viram com os limiares atuais
+
+QUANTIZATION_MODES = ('float32', 'float16', 'int8')
+DOT_BLOCK_ROWS = 128  # linhas convertidas por vez (bloco cabe no cache)
+
+
+@lru_cache(maxsize=1)
+def _fp16_converter():
+    # conversor rápido float16 -> float32 (None = usa o NumPy); importado só
+    # no primeiro uso para não exigir OpenCV ao importar o banco/CLI
+    try:
+        import cv2
+    except ImportError:
+        return None
+    return getattr(cv2, 'convertFp16', None)
+
+
+
+def quantize_rows(x: np.ndarray, mode: str):
+    """Quantiza uma matriz float32 (N x D). Retorna (matriz, escalas ou None)."""
+    x = np.asarray(x, dtype=np.float32)
+    if mode == 'float16':
+        return x.astype(np.float16), None
+    if mode == 'int8':
+        scales = np.abs(x).max(axis=1) / 127.0 if x.shape[0] else np.zeros(0, dtype=np.float32)
+        scales = np.where(scales > 0, scales, 1.0).astype(np.float32)
+        q = np.clip(np.rint(x / scales[:, None]), -127, 127).astype(np.int8)
+        return q, scales
+    raise ValueError(f"Modo de quantização desconhecido: {mode}")
+
+
+class QuantizedGallery(Gallery):
+    """
+    Gallery com as amostras quantizadas.
+    - matrix: int8 ou float16 (N x D)
+    - scales: float32 (N,) no modo int8 (None em float16)
+    """
+    def __init__(self, users, matrix, offsets, projection=None, scales=None, mode='int8'):
+        self.mode = mode
+        self.scales = scales
+        super().__init__(users, matrix, offsets, projection)
+
+    @classmethod
+    def from_gallery(cls, gallery: Gallery, mode: str = 'int8') -> 'QuantizedGallery':
+        matrix, scales = quantize_rows(gallery.dense(), mode)
+        return cls(gallery.users, matrix, gallery.offsets, gallery.projection, scales, mode)
+
+    def _sq_norms(self) -> np.ndarray:
+        sq = np.einsum('ij,ij->i', self.matrix, self.matrix, dtype=np.float64)
+        if self.scales is not None:
+            sq *= self.scales.astype(np.float64) ** 2
+        return sq
+
+    @property
+    def nbytes(self) -> int:
+        return int(self.matrix.nbytes + (self.scales.nbytes if self.scales is not None else 0))
+
+    def dense(self) -> np.ndarray:
+        x = self.matrix.astype(np.float32)
+        if self.scales is not None:
+            x *= self.scales[:, None]
+        return x
+
+    def _dots(self, query: np.ndarray) -> np.ndarray:
+        n = self.matrix.shape[0]
+        dots = np.empty(n, dtype=np.float32)
+        buf = np.empty((min(n, DOT_BLOCK_ROWS), self.dim), dtype=np.float32)
+        convert = _fp16_converter() if self.matrix.dtype == np.float16 else None
+        for start in range(0, n, DOT_BLOCK_ROWS):
+            rows = self.matrix[start:start + DOT_BLOCK_ROWS]
+            if convert is not None:
+                block = convert(rows.view(np.int16))
+            else:
+                block = buf[:rows.shape[0]]
+                block[...] = rows
+            dots[start:start + rows.shape[0]] = block @ query
+        if self.scales is not None:
+            dots *= self.scales
+        return dots
+
+    def _dots_batch(self, queries: np.ndarray) -> np.ndarray:
+        n = self.matrix.shape[0]
+        dots = np.empty((queries.shape[0], n), dtype=np.float32)
+        buf = np.empty((min(n, DOT_BLOCK_ROWS), self.dim), dtype=np.float32)
+        convert = _fp16_converter() if self.matrix.dtype == np.float16 else None
+        for start in range(0, n, DOT_BLOCK_ROWS):
+            rows = self.matrix[start:start + DOT_BLOCK_ROWS]
+            if convert is not None:
+                block = convert(rows.view(np.int16))
+            else:
+                block = buf[:rows.shape[0]]
+                block[...] = rows
+            dots[:, start:start + rows.shape[0]] = queries @ block.T
+        if self.scales is not None:
+            dots *= self.scales[None, :]
+        return dots
+
+    def _take(self, users, rows, offsets) -> 'QuantizedGallery':
+        scales = self.scales[rows] if self.scales is not None else None
+        return QuantizedGallery(users, np.ascontiguousarray(self.matrix[rows]), offsets,
+                                self.projection, scales, self.mode)
+
+    def _append(self, user, block) -> 'QuantizedGallery':
+        q, scales = quantize_rows(block, self.mode)
+        matrix = np.concatenate([self.matrix, q]) if self.matrix.shape[0] else q
+        if self.scales is not None:
+            scales = np.concatenate([self.scales, scales])
+        offsets = np.append(self.offsets, self.offsets[-1] + q.shape[0])
+        return QuantizedGallery(self.users + [user], matrix, offsets, self.projection, scales, self.mode)
+
+    def projected(self, projection) -> 'QuantizedGallery':
+        dense = Gallery(self.users, self.dense(), self.offsets).projected(projection)
+        return QuantizedGallery.from_gallery(dense, self.mode)
+
+
+def quantize_gallery(gallery: Gallery, mode: str) -> Gallery:
+    """Gallery no modo pedido ('float32' devolve a própria galeria)."""
+    if mode == 'float32' or mode is None:
+        return gallery
+    return QuantizedGallery.from_gallery(gallery, mode)
+
+
+def calibrate(users_data, modes=('float16', 'int8'), probes_per_user: int = 1,
+              projection=None, min_samples: int = 1):
+    """Compara cada modo quantizado com o float32 nas mesmas consultas.
+
+    As últimas probes_per_user amostras de cada usuário viram consultas contra
+    as demais (split_probes). Para cada modo reporta: memória, desvio máximo e
+    médio de best/mean_top do candidato top-1, quantas consultas cruzaram
+    DEFAULT_BEST_THRESHOLD / DEFAULT_MEAN_THRESHOLD, quantas decisões de
+    decide_match mudaram e limiares sugeridos (atual + desvio médio).
+    """
+    from src.biometrics import matcher
+
+    enrolled, probes = split_probes(users_data, probes_per_user)
+    base = Gallery.from_users(enrolled)
+    if projection is not None:
+        base = base.projected(projection)
+    feats = [f for _, f in probes]
+    reference = [(granted, user and user.get('id'), best, mean) for granted, user, best, mean, _, _
+                 in matcher.decide_match_batch(feats, base, min_samples=min_samples)]
+
+    report = {'probes': len(probes), 'float32_bytes': base.nbytes, 'modes': {}}
+    for mode in modes:
+        gallery = quantize_gallery(base, mode)
+        d_best, d_mean = [], []
+        changed = best_flips = mean_flips = 0
+        results = matcher.decide_match_batch(feats, gallery, min_samples=min_samples)
+        for result, (ref_granted, ref_id, ref_best, ref_mean) in zip(results, reference):
+            granted, user, best, mean, _, _ = result
+            d_best.append(best - ref_best)
+            d_mean.append(mean - ref_mean)
+            changed += int((granted, user and user.get('id')) != (ref_granted, ref_id))
+            best_flips += int((best >= matcher.DEFAULT_BEST_THRESHOLD) != (ref_best >= matcher.DEFAULT_BEST_THRESHOLD))
+            mean_flips += int((mean >= matcher.DEFAULT_MEAN_THRESHOLD) != (ref_mean >= matcher.DEFAULT_MEAN_THRESHOLD))
+        d_best = np.asarray(d_best) if d_best else np.zeros(1)
+        d_mean = np.asarray(d_mean) if d_mean else np.zeros(1)
+        report['modes'][mode] = {
+            'bytes': gallery.nbytes,
+            'ratio': base.nbytes / max(gallery.nbytes, 1),
+            'max_best_shift': float(np.abs(d_best).max()),
+            'mean_best_shift': float(d_best.mean()),
+            'max_mean_shift': float(np.abs(d_mean).max()),
+            'mean_mean_shift': float(d_mean.mean()),
+            'best_threshold_flips': best_flips,
+            'mean_threshold_flips': mean_flips,
+            'changed_decisions': changed,
+            'suggested_best_threshold': matcher.DEFAULT_BEST_THRESHOLD + float(d_best.mean()),
+            'suggested_mean_threshold': matcher.DEFAULT_MEAN_THRESHOLD + float(d_mean.mean()),
+        }
+    return report
+
+
+def print_calibration(report):
+    print(f"Consultas: {report['probes']}  galeria float32: {report['float32_bytes'] / 1024:.0f} KiB")
+    for mode, r in report['modes'].items():
+        print(f"{mode:8s} {r['bytes'] / 1024:.0f} KiB ({r['ratio']:.1f}x menor)  "
+              f"Δbest max={r['max_best_shift']:.2e} média={r['mean_best_shift']:+.2e}  "
+              f"Δmean max={r['max_mean_shift']:.2e} média={r['mean_mean_shift']:+.2e}")
+        print(f"         cruzaram best={r['best_threshold_flips']} mean={r['mean_threshold_flips']}  "
+              f"decisões alteradas={r['changed_decisions']}  "
+              f"limiares sugeridos best={r['suggested_best_threshold']:.4f} mean={r['suggested_mean_threshold']:.4f}")
+
+
+def main(argv=None):
+    """Relatório de calibração da quantização para um banco.
+
+    Uso: python -m src.biometrics.quantization [caminho_do_banco]
+    """
+    import sys
+    from src.database.database_manager import DatabaseManager
+
+    argv = sys.argv[1:] if argv is None else argv
+    db = DatabaseManager(argv[0] if argv else 'biometric_database.db')
+    try:
+        print_calibration(calibrate(db.get_all_users_with_features(), projection=db.projection))
+    finally:
+        db.close_connection()
+
+
+if __name__ == '__main__':
+    main()
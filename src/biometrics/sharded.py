@@ -0,0 +1,193 @@
+import heapq
+import itertools
+import multiprocessing as mp
+import os
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from src.biometrics.gallery import Gallery
+from src.biometrics.quantization import QuantizedGallery
+
+# sharded.py
+# Backend multi-core para galerias grandes em servidores com muitos núcleos.
+# - a matriz de templates é copiada uma única vez para um bloco de
+#   multiprocessing.shared_memory; os workers só mapeiam esse bloco (sem cópia).
+#   Uma QuantizedGallery vai na própria representação (int8 + escalas ou
+#   float16), pontuada pelo mesmo _dots em blocos do processo único
+# - a galeria é dividida em shards de usuários inteiros (cada usuário fica num
+#   shard só), então best/mean_top saem completos de cada worker
+# - um Pool persistente pontua os shards em paralelo e o processo principal
+#   junta os resultados com heapq.merge pela chave (-best, posição), a mesma
+#   ordem do argsort estável da Gallery
+# - cada shard faz o próprio produto matriz x query, então os scores podem diferir
+#   dos de score_users na última casa (ordem de soma do BLAS), dentro de
+#   matcher.BATCH_TOLERANCE; perto de um limiar decide_match refaz a decisão
+#   com a galeria inteira no processo principal, como decide_match_batch
+
+DEFAULT_START_METHOD = None  # None = padrão da plataforma (fork no Linux, spawn no Windows)
+
+_worker = {}
+
+
+def _share(array: np.ndarray):
+    """Copia 'array' para um bloco novo de memória compartilhada."""
+    shm = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+    np.ndarray(array.shape, dtype=array.dtype, buffer=shm.buf)[...] = array
+    return shm
+
+
+def _attach(name: str, shape, dtype) -> np.ndarray:
+    shm = shared_memory.SharedMemory(name=name)
+    _worker.setdefault('shm', []).append(shm)
+    return np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+
+
+def _init_worker(matrix_spec, scales_spec, mode, offsets, bounds):
+    # spec = (nome do bloco, shape, dtype); scales_spec None fora do modo int8
+    _worker['matrix'] = _attach(*matrix_spec)
+    _worker['scales'] = _attach(*scales_spec) if scales_spec else None
+    _worker['mode'] = mode
+    _worker['offsets'] = offsets
+    _worker['bounds'] = bounds
+    _worker['shards'] = {}
+
+
+def _shard(index: int) -> Gallery:
+    # cada worker monta a Gallery do shard na primeira vez que o recebe
+    gallery = _worker['shards'].get(index)
+    if gallery is None:
+        u0, u1 = _worker['bounds'][index]
+        offsets = _worker['offsets']
+        r0, r1 = int(offsets[u0]), int(offsets[u1])
+        users = [{}] * (u1 - u0)
+        rows = _worker['matrix'][r0:r1]
+        if _worker['mode'] is None:
+            gallery = Gallery(users, rows, offsets[u0:u1 + 1] - r0)
+        else:
+            scales = _worker['scales'][r0:r1] if _worker['scales'] is not None else None
+            gallery = QuantizedGallery(users, rows, offsets[u0:u1 + 1] - r0,
+                                       scales=scales, mode=_worker['mode'])
+        _worker['shards'][index] = gallery
+    return gallery
+
+
+def _score_shard(args):
+    index, query, top_k, metric, limit = args
+    u0 = _worker['bounds'][index][0]
+    gallery = _shard(index)
+    best, mean_top = gallery._reduce(gallery._similarities(query, metric), top_k)
+    order = np.argsort(-best, kind='stable')[:limit]
+    return u0 + order, best[order], mean_top[order]
+
+
+def _split_users(counts: np.ndarray, shards: int):
+    """Divide os usuários em até 'shards' faixas contíguas com ~o mesmo número de linhas."""
+    n_users = len(counts)
+    if n_users == 0:
+        return []
+    shards = max(1, min(shards, n_users))
+    rows = np.concatenate([[0], np.cumsum(counts)])
+    targets = rows[-1] * np.arange(1, shards) / shards
+    cuts = np.unique(np.searchsorted(rows, targets, side='left'))
+    cuts = [int(c) for c in cuts if 0 < c < n_users]
+    edges = [0] + cuts + [n_users]
+    return [(edges[i], edges[i + 1]) for i in range(len(edges) - 1)]
+
+
+class ShardedMatcher:
+    """
+    Matcher com a galeria em memória compartilhada e um pool de processos.
+
+    Uso:
+        with ShardedMatcher(db.get_gallery(), workers=8) as sm:
+            scored = sm.score_users(query_feat)
+            granted, user, best, mean, reason, scored = sm.decide_match(query_feat)
+
+    Aceita Gallery (float32) e QuantizedGallery (int8/float16, pontuada na
+    própria representação). A galeria é um retrato do momento da criação; depois de cadastros ou
+    remoções crie um novo ShardedMatcher (ou chame rebuild).
+    """
+    def __init__(self, gallery: Gallery, workers: int = None, shards: int = None,
+                 start_method: str = DEFAULT_START_METHOD):
+        self.workers = workers or os.cpu_count() or 1
+        self.shards = shards or self.workers
+        self._ctx = mp.get_context(start_method)
+        self._pool = None
+        self._shm = []
+        self.rebuild(gallery)
+
+    def rebuild(self, gallery: Gallery):
+        """Troca a galeria: nova memória compartilhada e novo pool."""
+        if type(gallery) not in (Gallery, QuantizedGallery):
+            raise ValueError(f"ShardedMatcher aceita Gallery ou QuantizedGallery, não {type(gallery).__name__}")
+        self.close()
+        self.gallery = gallery
+        quantized = isinstance(gallery, QuantizedGallery)
+        specs = []
+        for array in (gallery.matrix, gallery.scales if quantized else None):
+            if array is None:
+                specs.append(None)
+                continue
+            array = np.ascontiguousarray(array)
+            self._shm.append(_share(array))
+            specs.append((self._shm[-1].name, array.shape, array.dtype))
+        self._bounds = _split_users(gallery.counts, self.shards)
+        mode = gallery.mode if quantized else None
+        self._pool = self._ctx.Pool(self.workers, initializer=_init_worker,
+                                    initargs=(specs[0], specs[1], mode, gallery.offsets, self._bounds))
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.close()
+            self._pool.join()
+            self._pool = None
+        for shm in self._shm:
+            shm.close()
+            shm.unlink()
+        self._shm = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _ranked(self, query_feat, top_k: int, metric: str, limit: int = None):
+        # [(posição, best, mean_top), ...] na ordem de Gallery.rank
+        query = self.gallery.prepare_query(query_feat)
+        if query.size == 0 or query.size != self.gallery.dim or not self._bounds:
+            order, best, mean_top = self.gallery.rank(query_feat, top_k=top_k, metric=metric)
+            ranked = ((int(i), float(best[i]), float(mean_top[i])) for i in order)
+            return list(itertools.islice(ranked, limit))
+        tasks = [(i, query, top_k, metric, limit) for i in range(len(self._bounds))]
+        parts = self._pool.map(_score_shard, tasks)
+        streams = [zip((-b for b in best), positions.tolist(), mean_top.tolist())
+                   for positions, best, mean_top in parts]
+        merged = heapq.merge(*streams)
+        return [(pos, float(-neg_best), mean) for neg_best, pos, mean in itertools.islice(merged, limit)]
+
+    def score_users(self, query_feat, top_k: int = 3, metric: str = 'cosine', limit: int = None):
+        """Mesma ordem e scores de matcher.score_users, a menos de matcher.BATCH_TOLERANCE
+        (limit corta a lista nos primeiros)."""
+        users = self.gallery.users
+        return [(users[pos], best, mean) for pos, best, mean in self._ranked(query_feat, top_k, metric, limit)]
+
+    def decide_match(self, query_feat, limit: int = None, **kwargs):
+        """Mesma decisão de matcher.decide_match (scores a menos de BATCH_TOLERANCE);
+        kwargs são os limiares/top_k/metric. limit=2 basta para a decisão e evita
+        trazer a lista inteira dos workers."""
+        from src.biometrics import matcher
+
+        top_k = kwargs.pop('top_k', matcher.DEFAULT_TOP_K)
+        metric = kwargs.pop('metric', matcher.DEFAULT_METRIC)
+        ranked = self._ranked(query_feat, top_k, metric, limit)
+        if ranked:
+            second = ranked[1][1] if len(ranked) > 1 else 0.0
+            thresholds = {k: kwargs[k] for k in ('best_threshold', 'mean_threshold', 'margin') if k in kwargs}
+            if matcher.near_boundary(ranked[0][1], second, ranked[0][2], **thresholds):
+                # soma em outra ordem pode virar a decisão: refaz na galeria inteira
+                return matcher.decide_match(query_feat, self.gallery, top_k=top_k, metric=metric, **kwargs)
+        scored = [(self.gallery.users[pos], best, mean) for pos, best, mean in ranked]
+        num_samples = self.gallery.num_samples(ranked[0][0]) if ranked else 0
+        return matcher.decide_from_scores(scored, num_samples, top_k=top_k, **kwargs)
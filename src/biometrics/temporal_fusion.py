@@ -0,0 +1,135 @@
+from collections import deque
+
+from src.biometrics import matcher
+
+# temporal_fusion.py
+# Decisão de login sobre vários frames seguidos (fusão temporal).
+# - decide_match julga cada frame sozinho: um usuário legítimo logo abaixo de
+#   DEFAULT_BEST_THRESHOLD espera o próximo frame "bom", e um frame com sorte
+#   pode passar a margem para um impostor
+# - StreamingDecider guarda uma janela deslizante com os scores (best,
+#   mean_top) dos primeiros candidatos de cada frame e decide sobre a média
+#   da janela: as regras best/mean/margin de decide_from_scores são aplicadas
+#   aos scores fundidos
+# - os limiares são os mesmos de um frame (relax=0 por padrão): a janela só
+#   tira o pico de um frame isolado; relax > 0 baixa best/mean e aumenta a
+#   taxa de falsos aceites, só use depois de medir
+# - a média de cada candidato usa só os frames em que ele apareceu entre os
+#   guardados; um frame sem o candidato não entra com score inventado (nem o
+#   menor guardado do frame, que inflava o top-1 e o runner-up)
+# - aceite antecipado: assim que houver min_frames frames, o mesmo candidato
+#   for o top-1 em min_votes deles e os scores fundidos passarem nas regras
+# - rejeição antecipada: best fundido abaixo de reject_best (ninguém parecido
+#   com a galeria na frente da câmera); a janela é zerada
+
+DEFAULT_WINDOW = 5  # frames na janela deslizante
+DEFAULT_MIN_FRAMES = 2  # frames mínimos antes de aceitar
+DEFAULT_MIN_VOTES = 2  # frames em que o aceito precisa ter sido o top-1
+DEFAULT_RELAX = 0.0  # quanto best/mean fundidos podem ficar abaixo dos limiares de um frame
+DEFAULT_REJECT_BEST = 0.80  # best fundido abaixo disso rejeita sem esperar a janela
+DEFAULT_MAX_GAP = 1.5  # segundos sem frames que zeram a janela (outra pessoa)
+DEFAULT_KEEP = 8  # candidatos guardados por frame
+
+PENDING, ACCEPT, REJECT = 'pending', 'accept', 'reject'
+
+
+class StreamingDecider:
+    """
+    Decisão incremental sobre a sequência de frames de uma tentativa de login.
+
+    Uso:
+        decider = StreamingDecider()
+        for frame ...:
+            result = matcher.decide_match(query, gallery)
+            fused = decider.update(result[5], num_samples_do_top1, timestamp)
+            if decider.state == ACCEPT: ...   # fused[0] é True
+    update() devolve uma tupla no formato de decide_match, com os scores fundidos.
+    Com window=1, min_frames=1, min_votes=1 e relax=0 reproduz decide_match.
+    """
+    def __init__(self, window: int = DEFAULT_WINDOW, min_frames: int = DEFAULT_MIN_FRAMES,
+                 min_votes: int = DEFAULT_MIN_VOTES, relax: float = DEFAULT_RELAX,
+                 reject_best: float = DEFAULT_REJECT_BEST, max_gap: float = DEFAULT_MAX_GAP,
+                 top_k: int = matcher.DEFAULT_TOP_K,
+                 best_threshold: float = matcher.DEFAULT_BEST_THRESHOLD,
+                 mean_threshold: float = matcher.DEFAULT_MEAN_THRESHOLD,
+                 margin: float = matcher.DEFAULT_MARGIN,
+                 min_samples: int = matcher.DEFAULT_MIN_SAMPLES):
+        self.window = window
+        self.min_frames = min(min_frames, window)
+        self.min_votes = min_votes
+        self.relax = relax
+        self.reject_best = reject_best
+        self.max_gap = max_gap
+        self.top_k = top_k
+        self.best_threshold = best_threshold
+        self.mean_threshold = mean_threshold
+        self.margin = margin
+        self.min_samples = min_samples
+        self.reset()
+
+    def reset(self):
+        # cada frame: (timestamp, {id: (best, mean_top)}, id do top-1)
+        self._frames = deque(maxlen=self.window)
+        self._users = {}
+        self._samples = {}
+        self.state = PENDING
+
+    def __len__(self):
+        return len(self._frames)
+
+    def _push(self, scored, num_samples: int, timestamp):
+        if timestamp is not None and self._frames and self._frames[-1][0] is not None \
+                and timestamp - self._frames[-1][0] > self.max_gap:
+            self.reset()
+        kept = scored[:DEFAULT_KEEP]
+        scores = {}
+        for user, best, mean in kept:
+            scores[user.get('id')] = (best, mean)
+            self._users[user.get('id')] = user
+        top_id = kept[0][0].get('id') if kept else None
+        if top_id is not None:
+            self._samples[top_id] = num_samples
+        self._frames.append((timestamp, scores, top_id))
+
+    def fused_scores(self):
+        """[(user, best, mean_top), ...] com a média da janela, ordenada pelo best fundido.
+        A média de cada candidato é feita só sobre os frames em que ele foi guardado."""
+        sums = {}
+        for _, scores, _ in self._frames:
+            for uid, (b, m) in scores.items():
+                best, mean, count = sums.get(uid, (0.0, 0.0, 0))
+                sums[uid] = (best + b, mean + m, count + 1)
+        fused = [(self._users[uid], best / count, mean / count) for uid, (best, mean, count) in sums.items()]
+        fused.sort(key=lambda entry: (-entry[1], entry[0].get('id')))
+        return fused
+
+    def votes(self, user_id) -> int:
+        return sum(1 for _, _, top_id in self._frames if top_id == user_id)
+
+    def update(self, scored, num_samples: int, timestamp=None):
+        """Acrescenta o resultado de um frame (scored de decide_match + amostras do top-1)."""
+        if self.state != PENDING:
+            self.reset()
+        self._push(scored, num_samples, timestamp)
+        fused = self.fused_scores()
+        if not fused:
+            return False, None, 0.0, 0.0, 'Nenhum candidato encontrado.', fused
+        top_user, best, mean = fused[0]
+        n = len(self._frames)
+        if n < self.min_frames:
+            return False, top_user, best, mean, f"Aguardando mais frames ({n}/{self.min_frames}).", fused
+
+        result = matcher.decide_from_scores(fused, self._samples.get(top_user.get('id'), 0), top_k=self.top_k,
+                                            best_threshold=self.best_threshold - self.relax,
+                                            mean_threshold=self.mean_threshold - self.relax,
+                                            margin=self.margin, min_samples=self.min_samples)
+        votes = self.votes(top_user.get('id'))
+        if result[0] and votes >= self.min_votes:
+            self.state = ACCEPT
+            return result
+        if best < self.reject_best:
+            self.state = REJECT
+            return False, top_user, best, mean, f"Nenhum candidato próximo em {n} frame(s) (best={best:.3f}).", fused
+        if result[0]:
+            return False, top_user, best, mean, f"Top-1 em só {votes} de {n} frame(s); mínimo = {self.min_votes}.", fused
+        return result
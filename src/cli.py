@@ -126,14 +126,15 @@ class TerminalController:
             print(f"Erro durante cadastro: {e}")
 
     def list_all_users(self):
-        users = self.db.get_all_users_with_features()
+        # só metadados: a listagem não precisa decodificar templates
+        users = self.db.list_users()
         if not users:
             print("Nenhum usuário cadastrado.")
             return
 
         print("\n--- Usuários Cadastrados ---")
         for u in users:
-            print(f"ID: {u['id']} | Nome: {u['name']} | Nível: {u['access_level']} | Features: {len(u.get('features', []))} items")
+            print(f"ID: {u['id']} | Nome: {u['name']} | Nível: {u['access_level']} | Features: {u['template_count']} items")
 
     def show_user_details(self):
         id_input = input("Digite o ID do usuário: ").strip()
@@ -145,7 +146,8 @@ class TerminalController:
         # pedir ao DatabaseManager o registro já desserializado
         user = self.db.get_user_by_id(user_id)
         if user:
-            print(json.dumps(user, indent=2, ensure_ascii=False))
+            # features vêm como matriz NumPy; converte só aqui, para exibição
+            print(json.dumps(user, indent=2, ensure_ascii=False, default=lambda o: o.tolist()))
         else:
             print("Usuário não encontrado.")
 
@@ -249,24 +251,25 @@ class TerminalController:
             return
 
         # se chegamos até aqui, temos query_feat extraído com sucesso
-        users = self.db.get_all_users_with_features()
-        if not users:
+        # galeria em cache do DatabaseManager (só lê o banco na primeira vez)
+        gallery = self.db.get_gallery()
+        if len(gallery) == 0:
             print('Nenhum usuário cadastrado no sistema.')
             return
 
-        # Também mostramos os top matches para debug/explicabilidade.
-        scored = matcher.score_users(query_feat, users)
+        # Delegar a política de decisão para matcher.decide_match
+        # (via índice IVF ou hash binário quando o banco tiver um; senão varredura completa).
+        granted, best_user, best_score_val, mean_top_val, reason, scored_full = matcher.decide_match_indexed(
+            query_feat,
+            gallery,
+            self.db.search_index,
+        )
 
+        # Também mostramos os top matches para debug/explicabilidade.
         print('\nTop matches:')
-        for i, (u, best_s, mean_k) in enumerate(scored[:3]):
+        for i, (u, best_s, mean_k) in enumerate(scored_full[:3]):
             print(f"{i+1}. {u['name']} (ID {u['id']}): best={best_s:.4f} mean_top={mean_k:.4f}")
 
-        # Delegar a política de decisão para matcher.decide_match.
-        granted, best_user, best_score_val, mean_top_val, reason, scored_full = matcher.decide_match(
-            query_feat,
-            users,
-        )
-
         if granted:
             print(f"Acesso concedido: {best_user['name']} (ID {best_user['id']}) - best={best_score_val:.3f} mean_top={mean_top_val:.3f}")
         else:
@@ -1,5 +1,37 @@
+import os
 import sqlite3
 import json
+import threading
+import itertools
+import time
+from contextlib import contextmanager, nullcontext
+
+from src.database.gallery_cache import GalleryCache
+from src.biometrics.gallery import _as_matrix
+from src.biometrics.ivf_index import IVFIndex, DEFAULT_NPROBE, index_path_for
+from src.biometrics.binary_hash import BinaryHashIndex, DEFAULT_BITS, hash_path_for
+from src.biometrics.projection import PCAProjection, projection_path_for
+from src.biometrics.multires import LowResIndex, DEFAULT_TOP_N
+from src.database.template_codec import encode_templates, decode_templates, decode_stack, is_encoded
+
+# Versão do esquema gravada em PRAGMA user_version.
+# 0 = features em JSON (texto) na coluna users.biometric_features
+# 1 = features em BLOB binário (template_codec) na mesma coluna
+# 2 = uma linha por template na tabela 'templates' (users sem biometric_features)
+SCHEMA_VERSION = 2
+
+# limite de parâmetros por consulta no SQLite (SQLITE_MAX_VARIABLE_NUMBER antigo)
+_MAX_SQL_PARAMS = 900
+
+# espera padrão (segundos) quando outra conexão segura o lock de escrita
+DEFAULT_BUSY_TIMEOUT = 5.0
+
+# intervalo mínimo (segundos) entre consultas ao contador de alterações feitas
+# por outros processos; None desliga (um único processo escreve no banco)
+DEFAULT_CHANGE_CHECK_INTERVAL = 1.0
+
+# bancos ':memory:' viram bancos compartilhados com nome único por instância
+_memory_ids = itertools.count(1)
 
 class DatabaseManager:
     """
@@ -7,21 +39,145 @@ class DatabaseManager:
     """
     """
     DatabaseManager: pequeno wrapper sobre sqlite3 para guardar/recuperar usuários.
-    - guarda features como JSON para simplicidade
-    - oferece métodos claros: register_user, get_all_users_with_features, get_user_by_id, delete_user
+    - guarda cada template como uma linha da tabela 'templates' (BLOB float32/float16, ver template_codec)
+    - oferece métodos claros: register_user, get_all_users_with_features, get_user_by_id, delete_user,
+      get_templates, get_users_with_features, add_templates, verify_user (1:1)
+    - list_users / get_user_meta para telas de listagem (sem ler templates)
+    - build_index / drop_index: índice IVF opcional (arquivo <db>.ivf.npz) para 1:N grande
+    - build_hash_index / drop_hash_index: pré-filtro binário opcional (arquivo <db>.hash.npz)
+    - set_projection: projeção PCA opcional (arquivo <db>.pca.npz); os templates
+      continuam brutos no banco e só a galeria em memória é projetada
+    - enable_coarse_to_fine: cascata 16x16 -> 64x64 em memória (sem treino, sem arquivo)
+    - alterações feitas por outro processo (ou outra instância) no mesmo arquivo
+      são detectadas pelo contador da tabela 'gallery_changes' (triggers): a
+      galeria em cache é descartada e os índices recarregados ou reconstruídos.
+      O contador é lido no máximo uma vez por change_check_interval
     Use este objeto quando quiser isolar a lógica SQL do resto da aplicação.
+
+    Pode ser usado de várias threads: cada thread recebe a sua própria conexão
+    (self.conn / self.cursor são por thread). O banco roda em modo WAL, então
+    leituras (matching, listagem) não esperam por uma escrita de cadastro; as
+    escritas são transações curtas serializadas por um lock.
     """
-    def __init__(self, db_path):
+    def __init__(self, db_path, template_dtype='float32', busy_timeout=DEFAULT_BUSY_TIMEOUT, wal=True,
+                 gallery_dtype='float32', compaction=False,
+                 change_check_interval=DEFAULT_CHANGE_CHECK_INTERVAL):
         """
         Inicializa a conexão com o banco e cria a tabela se não existir.
+        template_dtype: 'float32' (padrão) ou 'float16' para os novos cadastros.
+        gallery_dtype: formato da galeria em memória usada no matching: 'float32',
+            'float16' ou 'int8' (2x / 4x menos RAM; ver quantization.calibrate).
+        busy_timeout: segundos de espera quando o banco está bloqueado por outra escrita.
+        wal: ativa journal_mode=WAL (leitores concorrentes com um escritor).
+        compaction: True guarda só os medoids dos templates de cada cadastro
+            (compaction.compact_templates). Desligado por padrão: antes de ligar,
+            confira no compaction_report do banco que as falsas rejeições não sobem.
+        change_check_interval: segundos entre leituras do contador de alterações
+            externas em get_gallery/verify_user (0 = toda chamada, None = nunca;
+            use None quando só esta instância escreve no banco).
         """
-        self.conn = sqlite3.connect(db_path)
-        self.cursor = self.conn.cursor()
+        self.template_dtype = template_dtype
+        self.compaction = compaction
+        self.busy_timeout = busy_timeout
+        self.change_check_interval = change_check_interval
+        self._next_change_check = 0.0
+        self.stamp_checks = 0
+        self.resyncs = 0
+        self._uri = False
+        if db_path == ':memory:':
+            # um ':memory:' por conexão seria um banco diferente por thread
+            db_path = f'file:biometric_mem_{next(_memory_ids)}?mode=memory&cache=shared'
+            self._uri = True
+        self.db_path = db_path
+        self._local = threading.local()
+        self._connections = []
+        self._pool_lock = threading.Lock()
+        self._write_lock = threading.RLock()
+        if wal and not self._uri:
+            self.conn.execute('PRAGMA journal_mode = WAL')
         self._create_table()
+        self._migrate()
+        self._create_change_counter()
+        # projeção PCA opcional, aplicada à galeria em memória e às queries
+        self.projection_path = None if self._uri else projection_path_for(db_path)
+        self.projection = PCAProjection.load(self.projection_path) if self.projection_path else None
+        # galeria em memória para o matcher; atualizada em register/delete
+        self.gallery_cache = GalleryCache(self.get_all_users_with_features, projection=self.projection,
+                                          dtype=gallery_dtype, user_loader=self.get_users_with_features)
+        # índice IVF opcional, salvo ao lado do banco (None em bancos ':memory:')
+        self.index_path = None if self._uri else index_path_for(db_path)
+        self.ivf_index = IVFIndex.load(self.index_path) if self.index_path else None
+        self.hash_path = None if self._uri else hash_path_for(db_path)
+        self.hash_index = BinaryHashIndex.load(self.hash_path) if self.hash_path else None
+        self.coarse_index = None
+        # carimbo (user_version:contador) do banco refletido no cache e nos índices
+        self._stamp = self._current_stamp()
+        self._next_change_check = time.monotonic() + (change_check_interval or 0)
+        self._validate_indexes()
+
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=self.busy_timeout, uri=self._uri,
+                               check_same_thread=False)
+        conn.execute(f'PRAGMA busy_timeout = {int(self.busy_timeout * 1000)}')
+        # ON DELETE CASCADE dos templates depende desta pragma (vale por conexão)
+        conn.execute('PRAGMA foreign_keys = ON')
+        with self._pool_lock:
+            self._connections.append(conn)
+        return conn
+
+    @property
+    def conn(self):
+        """Conexão da thread atual (criada na primeira utilização)."""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = self._connect()
+            self._local.conn = conn
+            self._local.cursor = conn.cursor()
+        return conn
+
+    @property
+    def cursor(self):
+        """Cursor da conexão da thread atual."""
+        self.conn
+        return self._local.cursor
+
+    @contextmanager
+    def _transaction(self):
+        """
+        Transação de escrita curta: BEGIN IMMEDIATE já reserva o lock de escrita,
+        commit no fim e rollback em caso de erro.
+        """
+        with self._write_lock:
+            conn = self.conn
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                yield self.cursor
+                conn.commit()
+            except BaseException:
+                conn.rollback()
+                raise
+
+    @contextmanager
+    def _read(self):
+        """
+        Leitura com várias consultas num mesmo snapshot, só com dados já commitados.
+        Em bancos ':memory:' (shared-cache, com locks por tabela que o busy_timeout
+        não espera) as leituras também passam pelo lock de escrita.
+        """
+        with self._write_lock if self._uri else nullcontext():
+            conn = self.conn
+            if conn.in_transaction:
+                yield self.cursor
+                return
+            conn.execute('BEGIN')
+            try:
+                yield self.cursor
+            finally:
+                conn.commit()
 
     def _create_table(self):
         """
-        Cria a tabela 'users' para armazenar os dados biométricos.
+        Cria as tabelas 'users' e 'templates' para armazenar os dados biométricos.
         (Privado: usado apenas na inicialização)
         """
         try:
@@ -30,86 +186,616 @@ class DatabaseManager:
                     id INTEGER PRIMARY KEY AUTOINCREMENT,
                     name TEXT NOT NULL,
                     access_level INTEGER NOT NULL,
-                    biometric_features TEXT NOT NULL,
                     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
                 )
             ''')
+            self._create_templates_table()
             self.conn.commit()
         except sqlite3.Error as e:
             print(f"Erro ao criar a tabela: {e}")
 
-    def register_user(self, name, access_level, features):
+    def _create_templates_table(self):
+        # a chave primária (user_id, idx) é o índice usado nas buscas por user_id
+        self.cursor.execute('''
+            CREATE TABLE IF NOT EXISTS templates (
+                user_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+                idx INTEGER NOT NULL,
+                vector BLOB NOT NULL,
+                quality REAL,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                PRIMARY KEY (user_id, idx)
+            )
+        ''')
+
+    def _create_change_counter(self):
         """
-        Insere um novo usuário no banco de dados.
-        As características (features) são serializadas para JSON antes de salvar.
+        Contador de alterações em users/templates, incrementado por triggers (vale
+        para qualquer processo que escreva no arquivo). Os índices salvos ao lado
+        do banco guardam o carimbo com que foram gerados.
+        (Privado: usado apenas na inicialização)
         """
-        # Serializa a lista/array de features para uma string JSON
-        features_json = json.dumps(features.tolist() if hasattr(features, 'tolist') else features)
-
         try:
             self.cursor.execute('''
-                INSERT INTO users (name, access_level, biometric_features)
-                VALUES (?, ?, ?)
-            ''', (name, access_level, features_json))
+                CREATE TABLE IF NOT EXISTS gallery_changes (
+                    id INTEGER PRIMARY KEY CHECK (id = 0),
+                    counter INTEGER NOT NULL
+                )
+            ''')
+            self.cursor.execute('INSERT OR IGNORE INTO gallery_changes (id, counter) VALUES (0, 0)')
+            for table in ('users', 'templates'):
+                for event in ('INSERT', 'UPDATE', 'DELETE'):
+                    self.cursor.execute(f'''
+                        CREATE TRIGGER IF NOT EXISTS {table}_{event.lower()}_changes
+                        AFTER {event} ON {table}
+                        BEGIN
+                            UPDATE gallery_changes SET counter = counter + 1 WHERE id = 0;
+                        END
+                    ''')
             self.conn.commit()
-            return self.cursor.lastrowid
+        except sqlite3.Error as e:
+            print(f"Erro ao criar o contador de alterações: {e}")
+
+    @staticmethod
+    def _stamp_from(cursor):
+        version = cursor.execute('PRAGMA user_version').fetchone()[0]
+        row = cursor.execute('SELECT counter FROM gallery_changes WHERE id = 0').fetchone()
+        return f"{version}:{row[0] if row else 0}"
+
+    def _current_stamp(self):
+        self.stamp_checks += 1
+        try:
+            with self._read():
+                return self._stamp_from(self.cursor)
+        except sqlite3.Error as e:
+            print(f"Erro ao ler o contador de alterações: {e}")
+            return None
+
+    def _advance(self, before, after) -> bool:
+        """
+        Chamado com o lock de escrita, depois do commit de uma escrita deste objeto.
+        True: ninguém mais alterou o banco desde o último sync, o cache e os índices
+        podem receber a alteração incremental. False: houve alteração externa antes
+        desta escrita; tudo já foi recarregado a partir do banco.
+        """
+        if before == self._stamp:
+            self._stamp = after
+            return True
+        self._resync(after)
+        return False
+
+    def _check_changes(self):
+        """Recarrega cache e índices se outro processo alterou o banco
+        (no máximo uma consulta por change_check_interval)."""
+        if self.change_check_interval is None:
+            return
+        now = time.monotonic()
+        if now < self._next_change_check:
+            return
+        self._next_change_check = now + self.change_check_interval
+        stamp = self._current_stamp()
+        if stamp is None or stamp == self._stamp:
+            return
+        with self._write_lock:
+            stamp = self._current_stamp()
+            if stamp is not None and stamp != self._stamp:
+                self._resync(stamp)
+
+    def _resync(self, stamp):
+        # banco alterado fora desta instância: recarrega galeria e índices
+        self.resyncs += 1
+        self._stamp = stamp
+        self.gallery_cache.invalidate()
+        self._validate_indexes(reload=True)
+        if self.coarse_index is not None:
+            self.enable_coarse_to_fine(top_n=self.coarse_index.top_n)
+
+    def _validate_indexes(self, reload=False):
+        """
+        Índice gerado com outro carimbo (banco migrado ou alterado depois do último
+        save) é reconstruído. reload=True relê antes o arquivo, que pode ter sido
+        regravado (ou removido) pelo processo que alterou o banco.
+        """
+        if reload and self.index_path:
+            self.ivf_index = IVFIndex.load(self.index_path)
+        if reload and self.hash_path:
+            self.hash_index = BinaryHashIndex.load(self.hash_path)
+        if self.ivf_index is not None and self.ivf_index.stamp != self._stamp:
+            print("[INFO] Índice IVF desatualizado em relação ao banco; reconstruindo.")
+            # None se o banco ficou sem amostras
+            self.ivf_index = self.build_index(nprobe=self.ivf_index.nprobe)
+        if self.hash_index is not None and self.hash_index.stamp != self._stamp:
+            print("[INFO] Índice binário desatualizado em relação ao banco; reconstruindo.")
+            self.hash_index = self.build_hash_index(bits=self.hash_index.bits)
+
+    def _user_columns(self):
+        return [row[1] for row in self.cursor.execute('PRAGMA table_info(users)').fetchall()]
+
+    def _migrate(self):
+        """
+        Atualiza bancos antigos no próprio arquivo (in-place).
+        v0/v1 -> v2: move users.biometric_features (JSON ou BLOB) para uma linha
+        por template na tabela 'templates' e recria 'users' sem essa coluna.
+        (Privado: usado apenas na inicialização)
+        """
+        try:
+            version = self.cursor.execute('PRAGMA user_version').fetchone()[0]
+            if version >= SCHEMA_VERSION:
+                return
+            if 'biometric_features' in self._user_columns():
+                self._migrate_to_templates_table()
+            self.cursor.execute(f'PRAGMA user_version = {SCHEMA_VERSION}')
+            self.conn.commit()
+        except (sqlite3.Error, ValueError) as e:
+            self.conn.rollback()
+            print(f"Erro ao migrar o banco: {e}")
+        finally:
+            self.cursor.execute('PRAGMA foreign_keys = ON')
+
+    def _migrate_to_templates_table(self):
+        # foreign_keys precisa estar desligada (fora de transação) para recriar 'users'
+        self.conn.commit()
+        self.cursor.execute('PRAGMA foreign_keys = OFF')
+        seq_row = self.cursor.execute("SELECT seq FROM sqlite_sequence WHERE name = 'users'").fetchone()
+        rows = self.cursor.execute('SELECT id, biometric_features FROM users').fetchall()
+        for user_id, value in rows:
+            self._insert_templates(user_id, self._decode_features(value))
+        self.cursor.execute('''
+            CREATE TABLE users_new (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                name TEXT NOT NULL,
+                access_level INTEGER NOT NULL,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
+        self.cursor.execute('''
+            INSERT INTO users_new (id, name, access_level, created_at)
+            SELECT id, name, access_level, created_at FROM users
+        ''')
+        self.cursor.execute('DROP TABLE users')
+        self.cursor.execute('ALTER TABLE users_new RENAME TO users')
+        if seq_row:
+            # preserva o AUTOINCREMENT: ids de usuários removidos não são reutilizados
+            self.cursor.execute("UPDATE sqlite_sequence SET seq = MAX(seq, ?) WHERE name = 'users'", (seq_row[0],))
+        if rows:
+            print(f"[INFO] {len(rows)} usuário(s) migrado(s) para a tabela de templates.")
+
+    @staticmethod
+    def _decode_features(value):
+        """
+        Converte um valor legado de users.biometric_features numa matriz float32 (n x D).
+        Aceita BLOB binário (v1) ou JSON (v0).
+        """
+        if is_encoded(value):
+            return decode_templates(value)
+        return decode_templates(encode_templates(json.loads(value)))
+
+    def _insert_templates(self, user_id, features, qualities=None, start_idx=0):
+        """Grava uma linha por template. (Privado: não faz commit)"""
+        if features is None or len(features) == 0:
+            return 0
+        if qualities is None:
+            qualities = [None] * len(features)
+        rows = [
+            (user_id, start_idx + i, encode_templates([vec], self.template_dtype), quality)
+            for i, (vec, quality) in enumerate(zip(features, qualities))
+        ]
+        self.cursor.executemany(
+            'INSERT INTO templates (user_id, idx, vector, quality) VALUES (?, ?, ?, ?)', rows
+        )
+        return len(rows)
+
+    def _fetch_templates(self, user_ids=None):
+        """
+        Lê os templates agrupados por usuário: {user_id: matriz float32 (n x D)}.
+        user_ids=None lê todos; caso contrário só as linhas dos ids pedidos (via índice).
+        """
+        if user_ids is None:
+            rows = self.cursor.execute('SELECT user_id, vector FROM templates ORDER BY user_id, idx').fetchall()
+        else:
+            ids = list(dict.fromkeys(user_ids))
+            rows = []
+            for i in range(0, len(ids), _MAX_SQL_PARAMS):
+                chunk = ids[i:i + _MAX_SQL_PARAMS]
+                placeholders = ','.join('?' * len(chunk))
+                rows.extend(self.cursor.execute(
+                    f'SELECT user_id, vector FROM templates WHERE user_id IN ({placeholders}) ORDER BY user_id, idx',
+                    chunk,
+                ).fetchall())
+        grouped = {}
+        for user_id, blob in rows:
+            grouped.setdefault(user_id, []).append(blob)
+        # um único np.frombuffer por usuário
+        return {user_id: decode_stack(blobs) for user_id, blobs in grouped.items()}
+
+    @staticmethod
+    def _empty_features():
+        return decode_templates(encode_templates([]))
+
+    def register_user(self, name, access_level, features, qualities=None):
+        """
+        Insere um novo usuário no banco de dados.
+        Cada template (features) vira uma linha da tabela 'templates', em BLOB binário.
+        qualities: lista opcional com um score de qualidade por template.
+        Com compaction=True os templates são compactados antes de gravar.
+        """
+        if self.compaction and features is not None and len(features):
+            from src.biometrics.compaction import compact_templates
+
+            total = len(features)
+            features, qualities = compact_templates(features, qualities)
+            print(f"[INFO] Templates após compactação: {len(features)} de {total}")
+        try:
+            # commit + atualização do cache sob o mesmo lock de escrita: a ordem das
+            # alterações no cache é a mesma dos commits (cadastro antes da remoção)
+            with self._write_lock:
+                with self._transaction() as cursor:
+                    before = self._stamp_from(cursor)
+                    cursor.execute('''
+                        INSERT INTO users (name, access_level)
+                        VALUES (?, ?)
+                    ''', (name, access_level))
+                    user_id = cursor.lastrowid
+                    self._insert_templates(user_id, features, qualities)
+                    after = self._stamp_from(cursor)
+                if self._advance(before, after):
+                    self.gallery_cache.add_user({'id': user_id, 'name': name, 'access_level': access_level}, features)
+                    self._update_index(lambda index: index.add_user(user_id, self._project(features)))
+            return user_id
         except sqlite3.Error as e:
             print(f"Erro ao registrar usuário: {e}")
             return None
 
+    def add_templates(self, user_id: int, features, qualities=None) -> int:
+        """
+        Acrescenta templates a um usuário existente sem reescrever os anteriores.
+        Retorna a quantidade de templates gravados (0 em caso de erro).
+        """
+        try:
+            with self._write_lock:
+                with self._transaction() as cursor:
+                    before = self._stamp_from(cursor)
+                    row = cursor.execute('SELECT COALESCE(MAX(idx) + 1, 0) FROM templates WHERE user_id = ?', (user_id,)).fetchone()
+                    added = self._insert_templates(user_id, features, qualities, start_idx=row[0])
+                    after = self._stamp_from(cursor)
+                if self._advance(before, after) and added:
+                    user = self.get_user_by_id(user_id)
+                    if user:
+                        feats = user.pop('features')
+                        self.gallery_cache.replace_user(user, feats)
+                        self._update_index(lambda index: index.replace_user(user_id, self._project(feats)))
+            return added
+        except sqlite3.Error as e:
+            print(f"Erro ao adicionar templates: {e}")
+            return 0
+
     def get_all_users_with_features(self):
         """
         Busca todos os usuários e suas características biométricas no banco.
-        As características são desserializadas de JSON para o formato original.
+        As características são lidas do BLOB direto para uma matriz float32 (n x D).
         """
         try:
-            self.cursor.execute('SELECT id, name, access_level, biometric_features FROM users')
-            rows = self.cursor.fetchall()
-            
-            users_data = []
-            for row in rows:
-                user_dict = {
-                    'id': row[0],
-                    'name': row[1],
-                    'access_level': row[2],
-                    # Desserializa a string JSON de volta para uma lista/array
-                    'features': json.loads(row[3])
+            with self._read():
+                self.cursor.execute('SELECT id, name, access_level FROM users ORDER BY id')
+                rows = self.cursor.fetchall()
+                templates = self._fetch_templates()
+
+                users_data = []
+                for row in rows:
+                    user_dict = {
+                        'id': row[0],
+                        'name': row[1],
+                        'access_level': row[2],
+                        # np.frombuffer sobre os BLOBs, sem objetos Python por elemento
+                        'features': templates.get(row[0], self._empty_features())
+                    }
+                    users_data.append(user_dict)
+                return users_data
+        except (sqlite3.Error, ValueError) as e:
+            print(f"Erro ao buscar usuários: {e}")
+            return []
+
+    def get_users_with_features(self, user_ids):
+        """
+        Como get_all_users_with_features, mas só para a lista de ids informada
+        (ex.: shortlist de candidatos ou verificação 1:1). Lê apenas as linhas
+        de templates desses usuários.
+        """
+        ids = list(dict.fromkeys(user_ids))
+        if not ids:
+            return []
+        try:
+            with self._read():
+                rows = []
+                for i in range(0, len(ids), _MAX_SQL_PARAMS):
+                    chunk = ids[i:i + _MAX_SQL_PARAMS]
+                    placeholders = ','.join('?' * len(chunk))
+                    rows.extend(self.cursor.execute(
+                        f'SELECT id, name, access_level FROM users WHERE id IN ({placeholders})', chunk
+                    ).fetchall())
+                templates = self._fetch_templates(ids)
+                by_id = {
+                    row[0]: {
+                        'id': row[0],
+                        'name': row[1],
+                        'access_level': row[2],
+                        'features': templates.get(row[0], self._empty_features())
+                    }
+                    for row in rows
                 }
-                users_data.append(user_dict)
-            return users_data
-        except sqlite3.Error as e:
+                # mantém a ordem pedida
+                return [by_id[i] for i in ids if i in by_id]
+        except (sqlite3.Error, ValueError) as e:
             print(f"Erro ao buscar usuários: {e}")
             return []
 
-    def get_user_by_id(self, user_id: int):
+    def get_templates(self, user_ids):
+        """
+        Retorna {user_id: matriz float32 (n x D)} apenas para os ids informados.
+        """
+        try:
+            with self._read():
+                return self._fetch_templates(user_ids)
+        except (sqlite3.Error, ValueError) as e:
+            print(f"Erro ao buscar templates: {e}")
+            return {}
+
+    def list_users(self):
+        """
+        Lista os usuários só com metadados (id, name, access_level, template_count, created_at),
+        sem ler nenhum template. A contagem é feita no SQL pelo índice de templates.
+        """
         try:
-            self.cursor.execute('SELECT id, name, access_level, biometric_features FROM users WHERE id = ?', (user_id,))
-            row = self.cursor.fetchone()
-            if not row:
-                return None
-            return {
-                'id': row[0],
-                'name': row[1],
-                'access_level': row[2],
-                'features': json.loads(row[3])
-            }
+            with self._read():
+                rows = self.cursor.execute('''
+                    SELECT u.id, u.name, u.access_level,
+                           (SELECT COUNT(*) FROM templates t WHERE t.user_id = u.id),
+                           u.created_at
+                    FROM users u
+                    ORDER BY u.id
+                ''').fetchall()
+                return [self._user_meta(row) for row in rows]
         except sqlite3.Error as e:
+            print(f"Erro ao listar usuários: {e}")
+            return []
+
+    def get_user_meta(self, user_id: int):
+        """
+        Metadados de um usuário (mesmo formato de list_users) ou None.
+        """
+        try:
+            with self._read():
+                row = self.cursor.execute('''
+                    SELECT u.id, u.name, u.access_level,
+                           (SELECT COUNT(*) FROM templates t WHERE t.user_id = u.id),
+                           u.created_at
+                    FROM users u
+                    WHERE u.id = ?
+                ''', (user_id,)).fetchone()
+                return self._user_meta(row) if row else None
+        except sqlite3.Error as e:
+            print(f"Erro ao buscar usuário por ID: {e}")
+            return None
+
+    @staticmethod
+    def _user_meta(row):
+        return {
+            'id': row[0],
+            'name': row[1],
+            'access_level': row[2],
+            'template_count': row[3],
+            'created_at': row[4],
+        }
+
+    def get_user_by_id(self, user_id: int):
+        try:
+            with self._read():
+                self.cursor.execute('SELECT id, name, access_level FROM users WHERE id = ?', (user_id,))
+                row = self.cursor.fetchone()
+                if not row:
+                    return None
+                templates = self._fetch_templates([user_id])
+                return {
+                    'id': row[0],
+                    'name': row[1],
+                    'access_level': row[2],
+                    'features': templates.get(row[0], self._empty_features())
+                }
+        except (sqlite3.Error, ValueError) as e:
             print(f"Erro ao buscar usuário por ID: {e}")
             return None
 
     def delete_user(self, user_id: int) -> bool:
         try:
-            self.cursor.execute('DELETE FROM users WHERE id = ?', (user_id,))
-            self.conn.commit()
-            return self.cursor.rowcount > 0
+            # os templates são removidos pelo ON DELETE CASCADE
+            with self._write_lock:
+                with self._transaction() as cursor:
+                    before = self._stamp_from(cursor)
+                    cursor.execute('DELETE FROM users WHERE id = ?', (user_id,))
+                    deleted = cursor.rowcount > 0
+                    after = self._stamp_from(cursor)
+                if self._advance(before, after) and deleted:
+                    self.gallery_cache.remove_user(user_id)
+                    self._update_index(lambda index: index.remove_user(user_id))
+            return deleted
         except sqlite3.Error as e:
             print(f"Erro ao deletar usuário: {e}")
             return False
 
-    def close_connection(self):
+    def get_gallery(self):
+        """
+        Devolve a Gallery em cache (pronta para o matcher).
+        Só lê o banco na primeira chamada; depois é mantida por register/delete.
+        A cada change_check_interval confere o contador de alterações (uma
+        consulta a uma linha): se outro processo alterou o banco, cache e índices
+        são recarregados. Entre essas conferências não toca no SQLite.
+        """
+        self._check_changes()
+        return self.gallery_cache.get()
+
+    def verify_user(self, user_id: int, query_feat, cohort_size=None, **kwargs):
+        """
+        Verificação 1:1 do usuário declarado (ex.: crachá + rosto).
+        A query é pontuada só contra os templates do usuário (da galeria em cache,
+        ou lidos sozinhos do banco com o cache frio) e um cohort pequeno de
+        impostores. O cohort é calculado contra a galeria inteira na primeira
+        verificação do usuário depois de cada alteração e fica em cache; a partir
+        daí o custo não cresce com a galeria. kwargs vão para matcher.verify_match
+        (limiares, top_k, metric). Retorna no formato de decide_match.
+        """
+        from src.biometrics import matcher
+        cohort_size = cohort_size or matcher.DEFAULT_COHORT_SIZE
+        self._check_changes()
+        claimed = self.gallery_cache.claimed(user_id)
+        cohort = self.gallery_cache.cohort(user_id, cohort_size) if len(claimed) else None
+        return matcher.verify_match(query_feat, claimed, cohort, **kwargs)
+
+    def gallery_cache_stats(self):
+        """Contadores de hit/miss/rebuild do cache da galeria, mais as consultas
+        ao contador de alterações (stamp_checks) e as recargas por alteração
+        externa (resyncs)."""
+        stats = self.gallery_cache.stats()
+        stats['stamp_checks'] = self.stamp_checks
+        stats['resyncs'] = self.resyncs
+        return stats
+
+    def _project(self, features):
+        # índices trabalham no espaço da galeria (projetado, se houver projeção)
+        if self.projection is None:
+            return features
+        block = _as_matrix(features)
+        if block.shape[0] and block.shape[1] == self.projection.in_dim:
+            return self.projection.transform(block)
+        return block
+
+    @property
+    def search_index(self):
+        """Índice usado pelo login: IVF, hash binário ou cascata 16x16, nessa
+        ordem de preferência; None = varredura completa."""
+        for index in (self.ivf_index, self.hash_index, self.coarse_index):
+            if index is not None:
+                return index
+        return None
+
+    def _update_index(self, change):
+        # aplica a alteração nos índices existentes e regrava os arquivos
+        with self._write_lock:
+            for index, path in ((self.ivf_index, self.index_path), (self.hash_index, self.hash_path),
+                                (self.coarse_index, None)):
+                if index is not None:
+                    change(index)
+                    self._save_index(index, path)
+
+    def _save_index(self, index, path):
+        if index is not None and hasattr(index, 'stamp'):
+            # carimbo do banco com que o índice foi gerado/atualizado (IVF e hash)
+            index.stamp = self._stamp
+        if path is None or index is None:
+            return
+        try:
+            index.save(path)
+        except OSError as e:
+            print(f"Erro ao salvar o índice {path}: {e}")
+
+    def build_index(self, nlist=None, nprobe=DEFAULT_NPROBE):
+        """
+        Treina o índice IVF com as amostras atuais e o grava ao lado do banco.
+        Depois disso register/add_templates/delete mantêm o índice atualizado.
+        Retorna o IVFIndex (ou None se não houver amostras).
+        """
+        gallery = self.get_gallery()
+        if gallery.matrix.shape[0] == 0:
+            print("Nenhuma amostra cadastrada: índice não criado.")
+            return None
+        with self._write_lock:
+            self.ivf_index = IVFIndex.train(gallery, nlist=nlist, nprobe=nprobe)
+            self._save_index(self.ivf_index, self.index_path)
+        return self.ivf_index
+
+    def drop_index(self):
+        """Remove o índice IVF; o matcher volta à varredura completa."""
+        with self._write_lock:
+            self.ivf_index = None
+            if self.index_path and os.path.exists(self.index_path):
+                os.remove(self.index_path)
+
+    def build_hash_index(self, bits=DEFAULT_BITS):
+        """
+        Gera os códigos binários (sign random projection) de todas as amostras e
+        grava ao lado do banco. Mantido por register/add_templates/delete.
+        """
+        gallery = self.get_gallery()
+        if gallery.matrix.shape[0] == 0:
+            print("Nenhuma amostra cadastrada: índice não criado.")
+            return None
+        with self._write_lock:
+            self.hash_index = BinaryHashIndex.from_gallery(gallery, bits=bits)
+            self._save_index(self.hash_index, self.hash_path)
+        return self.hash_index
+
+    def drop_hash_index(self):
+        """Remove o pré-filtro binário."""
+        with self._write_lock:
+            self.hash_index = None
+            if self.hash_path and os.path.exists(self.hash_path):
+                os.remove(self.hash_path)
+
+    def enable_coarse_to_fine(self, top_n=DEFAULT_TOP_N):
         """
-        Fecha a conexão com o banco de dados.
+        Liga a cascata multi-resolução: a galeria é pontuada nos descritores 16x16
+        e só os top_n usuários são re-pontuados em 64x64. Fica só em memória.
+        Não funciona com projeção PCA (precisa dos templates 64x64).
         """
-        if self.conn:
-            self.conn.close() 
+        with self._write_lock:
+            try:
+                self.coarse_index = LowResIndex.from_gallery(self.get_gallery(), top_n=top_n)
+            except ValueError as e:
+                print(f"Cascata multi-resolução não ativada: {e}")
+                self.coarse_index = None
+        return self.coarse_index
 
+    def disable_coarse_to_fine(self):
+        with self._write_lock:
+            self.coarse_index = None
+
+    def set_projection(self, projection):
+        """
+        Troca a projeção PCA (None = volta aos vetores brutos) e re-projeta:
+        grava/apaga <db>.pca.npz, remonta a galeria e re-treina os índices
+        existentes, que passam a trabalhar na nova dimensão.
+        ValueError se projection.in_dim não for a dimensão dos templates do banco.
+        """
+        with self._write_lock:
+            dim = self._template_dim()
+            if projection is not None and dim and dim != projection.in_dim:
+                raise ValueError(f"Projeção espera {projection.in_dim} dims, mas os templates têm {dim}.")
+            self.projection = projection
+            self.gallery_cache.set_projection(projection)
+            if projection is not None:
+                self._save_index(projection, self.projection_path)
+            elif self.projection_path and os.path.exists(self.projection_path):
+                os.remove(self.projection_path)
+            if self.ivf_index is not None:
+                self.build_index(nprobe=self.ivf_index.nprobe)
+            if self.hash_index is not None:
+                self.build_hash_index(bits=self.hash_index.bits)
+            if self.coarse_index is not None:
+                self.enable_coarse_to_fine(top_n=self.coarse_index.top_n)
+
+    def _template_dim(self) -> int:
+        """Dimensão dos templates gravados (0 se não houver nenhum)."""
+        with self._read():
+            row = self.cursor.execute('SELECT vector FROM templates LIMIT 1').fetchone()
+        return decode_templates(row[0]).shape[1] if row else 0
+
+    def close_connection(self):
+        """
+        Fecha as conexões com o banco de dados (de todas as threads).
+        """
+        with self._pool_lock:
+            connections, self._connections = self._connections, []
+        for conn in connections:
+            try:
+                conn.close()
+            except sqlite3.Error:
+                pass
+        self._local = threading.local()
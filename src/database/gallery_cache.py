@@ -0,0 +1,175 @@
+import threading
+
+from src.biometrics.gallery import Gallery
+from src.biometrics.quantization import quantize_gallery
+
+
+class GalleryCache:
+    """
+    Mantém em memória a Gallery pronta para comparação, ao lado do DatabaseManager.
+    - a primeira chamada a get() carrega tudo do banco (miss + rebuild)
+    - chamadas seguintes devolvem a mesma Gallery (hit), sem tocar no SQLite
+    - cadastros e remoções atualizam a galeria de forma incremental
+    Os contadores em stats() servem para confirmar que logins em regime
+    permanente não estão relendo o banco.
+    """
+    def __init__(self, loader, projection=None, dtype='float32', user_loader=None):
+        # loader: função sem argumentos que devolve a lista de usuários com features
+        # user_loader: função(ids) que lê só esses usuários (claimed() com o cache frio)
+        # projection: PCAProjection opcional aplicada às amostras ao montar a galeria
+        # dtype: 'float32', 'float16' ou 'int8' (galeria quantizada, ver quantization.py)
+        self._loader = loader
+        self._user_loader = user_loader
+        self.projection = projection
+        self.dtype = dtype
+        self._gallery = None
+        self._lock = threading.RLock()
+        self._version = 0  # muda a cada alteração; get() descarta leituras concorrentes
+        self.hits = 0
+        self.misses = 0
+        self.rebuilds = 0
+        self.adds = 0
+        self.removes = 0
+        # cohort de impostores por usuário (verificação 1:1): {(id, size): (versão, Gallery)}
+        self._cohorts = {}
+
+    @property
+    def loaded(self) -> bool:
+        return self._gallery is not None
+
+    def get(self) -> Gallery:
+        with self._lock:
+            if self._gallery is not None:
+                self.hits += 1
+                return self._gallery
+            self.misses += 1
+        while True:
+            with self._lock:
+                if self._gallery is not None:
+                    return self._gallery
+                version, projection = self._version, self.projection
+            # o banco é lido fora do lock do cache: o DatabaseManager chama add_user/
+            # remove_user segurando o lock de escrita, e a leitura pode precisar dele
+            gallery = self._build(self._loader(), projection)
+            with self._lock:
+                if self._gallery is not None:
+                    return self._gallery
+                if self._version == version:
+                    self._gallery = gallery
+                    self.rebuilds += 1
+                    return gallery
+            # houve cadastro/remoção durante a leitura: a galeria lida pode estar
+            # velha (ou já conter o usuário que add_user acrescentaria); lê de novo
+
+    def _build(self, users, projection):
+        gallery = Gallery.from_users(users)
+        if projection is not None:
+            if gallery.dim not in (0, projection.in_dim):
+                raise ValueError(f"Projeção espera {projection.in_dim} dims, mas os templates têm {gallery.dim}.")
+            gallery = gallery.projected(projection)
+        gallery = quantize_gallery(gallery, self.dtype)
+        # o cache guarda só os metadados nos dicts; as amostras ficam na matriz
+        gallery.users = [{k: v for k, v in u.items() if k != 'features'} for u in gallery.users]
+        return gallery
+
+    def _changed(self):
+        # chamado com o lock: invalida leituras em andamento e os cohorts
+        self._version += 1
+        self._cohorts.clear()
+
+    def add_user(self, user: dict, features):
+        """Acrescenta um usuário recém-cadastrado. Se o cache ainda não foi
+        carregado não há nada a fazer: o próximo get() já lê o novo usuário.
+        Idempotente: se um rebuild concorrente já leu o usuário do banco, a
+        entrada é trocada (como em replace_user) em vez de duplicada."""
+        with self._lock:
+            self._changed()
+            if self._gallery is None:
+                return
+            self._gallery = self._gallery.without_user(user['id']).with_user(user, features)
+            self.adds += 1
+
+    def remove_user(self, user_id: int):
+        with self._lock:
+            self._changed()
+            if self._gallery is None:
+                return
+            gallery = self._gallery.without_user(user_id)
+            if gallery is not self._gallery:
+                self._gallery = gallery
+                self.removes += 1
+
+    def replace_user(self, user: dict, features):
+        """Troca as amostras de um usuário (ex.: após add_templates)."""
+        with self._lock:
+            self._changed()
+            if self._gallery is None:
+                return
+            self._gallery = self._gallery.without_user(user['id']).with_user(user, features)
+            self.adds += 1
+
+    def set_projection(self, projection):
+        """Troca a projeção; a galeria é remontada no próximo get().
+        Templates com dimensão diferente de projection.in_dim fazem o get() falhar
+        (ValueError); DatabaseManager.set_projection confere isso antes."""
+        with self._lock:
+            self.projection = projection
+            self._gallery = None
+            self._changed()
+
+    def cohort(self, user_id: int, size: int):
+        """Gallery com os 'size' usuários mais parecidos com user_id (impostores).
+
+        Calculado com a média dos templates contra a galeria inteira (O(N), fora
+        do lock do cache) e guardado até a próxima alteração da galeria: só as
+        verificações seguintes desse usuário, sem cadastros/remoções no meio,
+        têm custo constante. Retorna None se o usuário não existir.
+        """
+        key = (user_id, size)
+        with self._lock:
+            entry = self._cohorts.get(key)
+            if entry is not None and entry[0] == self._version:
+                return entry[1]
+        gallery = self.get()
+        with self._lock:
+            # versão da galeria lida; outra versão = resultado não é guardado
+            version = self._version if self._gallery is gallery else None
+        claimed = gallery.subset([user_id])
+        if len(claimed) == 0 or claimed.matrix.shape[0] == 0:
+            return None
+        order, _, _ = gallery.rank(claimed.dense().mean(axis=0))
+        ids = [gallery.users[i].get('id') for i in order if gallery.users[i].get('id') != user_id][:size]
+        cohort = gallery.subset(ids)
+        with self._lock:
+            if version is not None and version == self._version:
+                self._cohorts[key] = (version, cohort)
+        return cohort
+
+    def claimed(self, user_id: int):
+        """Gallery só com o usuário user_id (vazia se não existir).
+        Com o cache carregado sai da galeria em memória; com o cache frio lê só
+        esse usuário pelo user_loader, sem montar a galeria inteira."""
+        with self._lock:
+            gallery, projection = self._gallery, self.projection
+        if gallery is not None:
+            return gallery.subset([user_id])
+        if self._user_loader is None:
+            return self.get().subset([user_id])
+        return self._build(self._user_loader([user_id]), projection)
+
+    def invalidate(self):
+        """Descarta a galeria; o próximo get() recarrega do banco."""
+        with self._lock:
+            self._gallery = None
+            self._changed()
+
+    def stats(self) -> dict:
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'rebuilds': self.rebuilds,
+            'adds': self.adds,
+            'removes': self.removes,
+            'users': len(self._gallery) if self._gallery is not None else 0,
+            'bytes': self._gallery.nbytes if self._gallery is not None else 0,
+        }
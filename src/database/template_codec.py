@@ -0,0 +1,97 @@
+import struct
+import numpy as np
+
+# template_codec.py
+# Formato binário versionado para os templates biométricos guardados no SQLite.
+#
+# Layout (little-endian):
+#   magic   4 bytes  b'BTPL'
+#   version 1 byte   (FORMAT_VERSION)
+#   dtype   1 byte   (1 = float32, 2 = float16)
+#   reserv. 2 bytes
+#   rows    uint32   quantidade de vetores
+#   dim     uint32   dimensão de cada vetor
+#   dados   rows * dim * itemsize bytes, em ordem C
+#
+# A leitura usa np.frombuffer direto sobre o BLOB, sem criar um objeto
+# Python por elemento (como acontecia com json.loads).
+
+MAGIC = b'BTPL'
+FORMAT_VERSION = 1
+_HEADER = struct.Struct('<4sBBHII')
+
+_DTYPE_CODES = {
+    'float32': 1,
+    'float16': 2,
+}
+_CODE_DTYPES = {
+    1: np.dtype('<f4'),
+    2: np.dtype('<f2'),
+}
+
+
+def encode_templates(features, dtype: str = 'float32') -> bytes:
+    """Serializa uma lista de vetores (ou ndarray n x D) para o formato binário.
+
+    dtype: 'float32' (padrão, sem perda em relação ao extrator) ou 'float16'
+    (metade do tamanho; erro relativo ~1e-3 por elemento).
+    """
+    if dtype not in _DTYPE_CODES:
+        raise ValueError(f"dtype de template não suportado: {dtype}")
+    code = _DTYPE_CODES[dtype]
+    if features is None or len(features) == 0:
+        arr = np.zeros((0, 0), dtype=_CODE_DTYPES[code])
+    else:
+        arr = np.asarray(features, dtype=_CODE_DTYPES[code])
+        if arr.ndim == 1:
+            arr = arr.reshape(1, -1)
+    rows, dim = arr.shape
+    header = _HEADER.pack(MAGIC, FORMAT_VERSION, code, 0, rows, dim)
+    return header + np.ascontiguousarray(arr).tobytes()
+
+
+def is_encoded(value) -> bool:
+    """True se o valor lido do banco já está no formato binário."""
+    return isinstance(value, (bytes, bytearray, memoryview)) and bytes(value[:4]) == MAGIC
+
+
+def decode_templates(blob) -> np.ndarray:
+    """Lê um BLOB no formato binário e devolve uma matriz float32 (n x D).
+
+    Para float32 o array é uma view somente-leitura sobre o próprio BLOB.
+    """
+    if len(blob) < _HEADER.size:
+        raise ValueError("BLOB de template truncado.")
+    magic, version, code, _, rows, dim = _HEADER.unpack_from(blob, 0)
+    if magic != MAGIC:
+        raise ValueError("BLOB não está no formato de template esperado.")
+    if version > FORMAT_VERSION:
+        raise ValueError(f"Versão de template não suportada: {version}")
+    if code not in _CODE_DTYPES:
+        raise ValueError(f"Código de dtype desconhecido: {code}")
+    arr = np.frombuffer(blob, dtype=_CODE_DTYPES[code], count=rows * dim, offset=_HEADER.size)
+    arr = arr.reshape(rows, dim)
+    if arr.dtype != np.float32:
+        arr = arr.astype(np.float32)
+    return arr
+
+
+def decode_stack(blobs) -> np.ndarray:
+    """Decodifica vários BLOBs (um vetor ou bloco cada) numa única matriz float32.
+
+    Quando todos têm o mesmo dtype e dimensão, junta os payloads e faz um
+    único np.frombuffer; caso contrário decodifica um a um.
+    """
+    if not blobs:
+        return np.zeros((0, 0), dtype=np.float32)
+    headers = [_HEADER.unpack_from(b, 0) for b in blobs]
+    codes = {h[2] for h in headers}
+    dims = {h[5] for h in headers}
+    if len(codes) == 1 and len(dims) == 1 and all(h[0] == MAGIC for h in headers):
+        code = codes.pop()
+        dim = dims.pop()
+        rows = sum(h[4] for h in headers)
+        payload = b''.join(bytes(b[_HEADER.size:]) for b in blobs)
+        arr = np.frombuffer(payload, dtype=_CODE_DTYPES[code], count=rows * dim).reshape(rows, dim)
+        return arr if arr.dtype == np.float32 else arr.astype(np.float32)
+    return np.vstack([decode_templates(b) for b in blobs])
@@ -0,0 +1,131 @@
+import time
+
+from PyQt6.QtCore import QObject, QThread, pyqtSignal, pyqtSlot
+
+from src.biometrics import matcher
+
+# auth_worker.py
+# Pipeline de autenticação fora da thread da GUI.
+# - AuthWorker vive numa QThread própria: qualidade, Haar, CLAHE, extração e
+#   decide_match rodam lá, o loop de eventos só desenha o preview
+# - AuthPipeline (na thread da GUI) envia frames por sinal e recebe o
+#   resultado de volta por sinal (conexões enfileiradas entre threads)
+# - no máximo uma tentativa em andamento: frames que chegam com o worker
+#   ocupado são descartados (sempre se processa um frame recente)
+# - cancel() troca a "geração": o worker abandona o trabalho antigo entre
+#   as etapas e resultados atrasados de gerações anteriores são ignorados
+# - com um StreamingDecider o resultado de cada frame entra na janela de
+#   fusão temporal e o sinal leva a decisão fundida (zerada a cada geração)
+
+
+class AuthWorker(QObject):
+    """Extração + matching de um frame; roda na thread do pipeline."""
+    finished = pyqtSignal(int, object)  # (geração, resultado de decide_match)
+    failed = pyqtSignal(int, str)  # (geração, mensagem para o status)
+
+    def __init__(self, db, pipeline, decider=None):
+        super().__init__()
+        self.db = db
+        self.pipeline = pipeline
+        self.decider = decider
+        self._decider_generation = None
+
+    def _cancelled(self, generation: int) -> bool:
+        return generation != self.pipeline.generation
+
+    @pyqtSlot(int, object, object)
+    def process(self, generation, frame, extract_func):
+        if self._cancelled(generation):
+            return
+        try:
+            # com projeção PCA no banco a query já sai no espaço reduzido da galeria
+            query_feat = extract_func(frame, projection=self.db.projection)
+            if not query_feat:
+                self.failed.emit(generation, "Falha ao extrair features.")
+                return
+            if self._cancelled(generation):
+                return
+            # galeria em cache: não relê o SQLite a cada tentativa
+            gallery = self.db.get_gallery()
+            if len(gallery) == 0:
+                self.failed.emit(generation, "Nenhum usuário cadastrado.")
+                return
+            result = matcher.decide_match_indexed(query_feat, gallery, self.db.search_index)
+            if self.decider is not None:
+                result = self._fuse(generation, gallery, result)
+        except Exception as e:
+            self.failed.emit(generation, f"Erro no reconhecimento: {e}")
+            return
+        self.finished.emit(generation, result)
+
+    def _fuse(self, generation, gallery, result):
+        # nova geração (câmera reiniciada) = nova tentativa: janela vazia
+        if generation != self._decider_generation:
+            self.decider.reset()
+            self._decider_generation = generation
+        scored = result[5]
+        num_samples = 0
+        if scored:
+            position = gallery.position_by_id().get(scored[0][0].get('id'))
+            num_samples = gallery.num_samples(position) if position is not None else 0
+        return self.decider.update(scored, num_samples, time.monotonic())
+
+
+class AuthPipeline(QObject):
+    """
+    Fila de uma posição entre a GUI e o AuthWorker.
+
+    Uso (na thread da GUI):
+        pipeline = AuthPipeline(db, decider=StreamingDecider())
+        pipeline.result.connect(...)   # tupla de decide_match
+        pipeline.error.connect(...)    # str
+        pipeline.submit(frame, extract_feature_from_image)
+        pipeline.cancel()              # ao parar a câmera
+        pipeline.shutdown()            # ao fechar a janela
+    """
+    result = pyqtSignal(object)
+    error = pyqtSignal(str)
+    _request = pyqtSignal(int, object, object)
+
+    def __init__(self, db, parent=None, decider=None):
+        super().__init__(parent)
+        self.generation = 0
+        self.busy = False
+        self._thread = QThread()
+        self._worker = AuthWorker(db, self, decider)
+        self._worker.moveToThread(self._thread)
+        self._request.connect(self._worker.process)
+        self._worker.finished.connect(self._on_finished)
+        self._worker.failed.connect(self._on_failed)
+        self._thread.start()
+
+    def submit(self, frame, extract_func) -> bool:
+        """Envia um frame ao worker. Retorna False se já há uma tentativa em andamento."""
+        if self.busy or frame is None:
+            return False
+        self.busy = True
+        # cópia: o frame da câmera continua sendo sobrescrito pelo preview
+        self._request.emit(self.generation, frame.copy(), extract_func)
+        return True
+
+    def cancel(self):
+        """Descarta o trabalho em andamento (o resultado, se chegar, é ignorado)."""
+        self.generation += 1
+        self.busy = False
+
+    def shutdown(self):
+        self.cancel()
+        self._thread.quit()
+        self._thread.wait()
+
+    def _on_finished(self, generation, result):
+        if generation != self.generation:
+            return
+        self.busy = False
+        self.result.emit(result)
+
+    def _on_failed(self, generation, message):
+        if generation != self.generation:
+            return
+        self.busy = False
+        self.error.emit(message)
@@ -105,7 +105,7 @@ class HomeWindow(QWidget):
     def populate_user_list(self):
         self.user_table.setRowCount(0)
         if self.user['access_level'] in [1, 2]:
-            users = self.db.get_all_users_with_features()
+            users = self.db.list_users()
             for row, u in enumerate(users):
                 self.user_table.insertRow(row)
 
@@ -1,17 +1,23 @@
 from PyQt6.QtWidgets import ( QMainWindow, QLabel, QPushButton, QVBoxLayout, QHBoxLayout, QComboBox, QListWidget, QFileDialog, QFrame, QWidget)
-from PyQt6.QtGui import  QImage, QPixmap, QGuiApplication
-from PyQt6.QtCore import QTimer, Qt
+from PyQt6.QtGui import QGuiApplication
+from PyQt6.QtCore import QTimer, Qt, pyqtSignal
 
 from src.gui.register_window import RegisterWindow
 from src.gui.home_window import HomeWindow
+from src.gui.auth_worker import AuthPipeline
+from src.gui.preview import PreviewRenderer
 
-from src.biometrics import matcher
 from src.biometrics.feature_extractor import extract_feature_from_image
+from src.biometrics.frame_source import FrameSource
+from src.biometrics.motion_gate import MotionGate
+from src.biometrics.temporal_fusion import StreamingDecider
 
 import os
 import cv2
 
 class LoginWindow(QMainWindow):
+    frame_ready = pyqtSignal(object)
+
     def __init__(self, db_manager, matcher_obj):
         super().__init__()
         self.db = db_manager
@@ -20,8 +26,18 @@ class LoginWindow(QMainWindow):
         self.cap = None
         self.timer = QTimer()
         self.timer.timeout.connect(self.update_frame)
+        self.frame_ready.connect(self.paint_frame)
         self.current_frame = None
+        self.current_seq = 0
+        # autenticação por eventos: movimento + rosto provável, sem timer fixo
+        self.auth_gate = MotionGate()
+        self.authenticating = False
         self.init_ui()
+        # extração e matching rodam numa QThread; a GUI só recebe o resultado,
+        # já fundido com os frames anteriores da mesma tentativa
+        self.auth_pipeline = AuthPipeline(self.db, self, decider=StreamingDecider())
+        self.auth_pipeline.result.connect(self.show_auth_result)
+        self.auth_pipeline.error.connect(self.status_label.setText)
 
     def init_ui(self):
         self.setWindowTitle("Login Biométrico")
@@ -78,6 +94,11 @@ class LoginWindow(QMainWindow):
             color: #aaa;
         """)
         self.camera_label.setVisible(False)
+        self.preview = PreviewRenderer(self.camera_label.width(), self.camera_label.height())
+
+        self.preview_stats_label = QLabel("")
+        self.preview_stats_label.setAlignment(Qt.AlignmentFlag.AlignRight)
+        self.preview_stats_label.setStyleSheet("color: #888; font-size: 11px;")
 
         self.capture_btn = QPushButton("Capturar / Autenticar")
         self.capture_btn.setObjectName("loginBtn")
@@ -117,6 +138,7 @@ class LoginWindow(QMainWindow):
         """)
         card_layout = QVBoxLayout()
         card_layout.addWidget(self.camera_label)
+        card_layout.addWidget(self.preview_stats_label)
         self.card_frame.setLayout(card_layout)
         self.card_frame.setVisible(False)  
 
@@ -165,17 +187,43 @@ class LoginWindow(QMainWindow):
         event.accept()
 
     def update_frame(self):
+        # só pega o frame mais novo da FrameSource; não bloqueia a GUI
         if self.cap and self.cap.isOpened():
-            ret, frame = self.cap.read()
-            if ret:
+            latest = self.cap.latest()
+            if latest is not None and latest.seq != self.current_seq:
+                self.current_seq = latest.seq
+                frame = latest.image
                 self.current_frame = frame
-                frame_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-                h, w, ch = frame_rgb.shape
-                bytes_per_line = ch * w
-                qt_img = QImage(frame_rgb.data, w, h, bytes_per_line, QImage.Format.Format_RGB888)
-                self.camera_label.setPixmap(QPixmap.fromImage(qt_img).scaled(
-                    self.camera_label.width(), self.camera_label.height(), Qt.AspectRatioMode.KeepAspectRatio
-                ))
+                # o preview é desenhado por paint_frame; aqui só o gate de autenticação
+                if self.authenticating and self.auth_gate.should_attempt(frame, ready=not self.auth_pipeline.busy):
+                    self.capture_and_authenticate(extract_feature_from_image)
+
+    def show_frame(self, frame):
+        # chamado pela thread de vídeo: a redução para o tamanho do label acontece
+        # aqui, fora da GUI, e o widget só é tocado no slot paint_frame
+        buf = self.preview.prepare(frame)
+        if buf is not None:  # None: a GUI ainda não desenhou os anteriores
+            self.frame_ready.emit(buf)
+
+    def paint_frame(self, buf):
+        self.camera_label.setPixmap(self.preview.to_pixmap(buf))
+        if self.preview.stats.fps:
+            self.preview_stats_label.setText(self.preview.stats.text())
+
+    def start_video_thread(self):
+        from threading import Thread
+
+        cap = self.cap
+
+        def loop_video():
+            # read() da FrameSource bloqueia até o próximo frame: o ritmo é o da câmera;
+            # termina quando stop_camera libera a câmera
+            while cap.isOpened():
+                ret, frame = cap.read()
+                if ret:
+                    self.show_frame(frame)
+
+        Thread(target=loop_video, daemon=True).start()
 
     def start_camera_login(self):
         self.camera_label.setVisible(True) 
@@ -187,11 +235,12 @@ class LoginWindow(QMainWindow):
 
         self.center_window()  
 
-        self.cap = cv2.VideoCapture(0, cv2.CAP_DSHOW) # OU CAP_MSMF SE TIVER USANDO DROIDCAM
-        if not self.cap.isOpened():
+        self.cap = FrameSource(0, cv2.CAP_DSHOW) # OU CAP_MSMF SE TIVER USANDO DROIDCAM
+        if not self.cap.open():
             self.status_label.setText("Não foi possível abrir a câmera.")
             return
 
+        self.start_video_thread()
         self.timer.start(30)
 
         self.status_label.setText("Inicializando câmera...")
@@ -199,40 +248,29 @@ class LoginWindow(QMainWindow):
         QTimer.singleShot(2000, self.start_authentication)
     
     def start_authentication(self):
-        for _ in range(20):
-            self.cap.read()
-
+        # a FrameSource já descarta os frames velhos do aquecimento da câmera
+        if not self.cap:
+            return
         self.status_label.setText("Autenticação iniciada...")
-        self.auth_timer = QTimer()
-        self.auth_timer.timeout.connect(lambda: self.capture_and_authenticate(extract_feature_from_image))
-        self.auth_timer.start(1000)
+        # cada frame novo passa pelo gate em update_frame
+        self.auth_gate.reset()
+        self.authenticating = True
 
     def capture_and_authenticate(self, extract_func):
         if self.current_frame is None:
             self.status_label.setText("Falha: nenhum frame disponível.")
             return
 
-        self.status_label.setText("Processando reconhecimento...")
-        query_feat = extract_func(self.current_frame)
-        if not query_feat:
-            self.status_label.setText("Falha ao extrair features.")
-            return
-
-        self.process_matching(query_feat)
-
-    def process_matching(self, query_feat):
-        users = self.db.get_all_users_with_features()
-        if not users:
-            self.status_label.setText("Nenhum usuário cadastrado.")
-            return
+        # tentativa anterior ainda em andamento: pula este tick
+        if self.auth_pipeline.submit(self.current_frame, extract_func):
+            self.status_label.setText("Processando reconhecimento...")
 
-        scored = matcher.score_users(query_feat, users)
+    def show_auth_result(self, result):
+        granted, best_user, _, _, _, scored = result
         self.result_list.clear()
         for i, (u, best_s, mean_k) in enumerate(scored[:3]):
             self.result_list.addItem(f"{i+1}. {u['name']} (ID {u['id']}): best={best_s:.4f} mean_top={mean_k:.4f}")
 
-        granted, best_user, *_ = matcher.decide_match(query_feat, users)
-
         if granted:
             self.status_label.setText(f"Acesso concedido: {best_user['name']} (ID {best_user['id']})")
             self.stop_camera()
@@ -246,7 +284,14 @@ class LoginWindow(QMainWindow):
 
     def stop_camera(self):
         self.timer.stop()
-        if hasattr(self, 'auth_timer'):
-            self.auth_timer.stop()
+        self.authenticating = False
+        self.auth_pipeline.cancel()
         if self.cap:
-            self.cap.release()
\ No newline at end of file
+            self.cap.release()
+            self.cap = None
+        self.current_frame = None
+
+    def closeEvent(self, event):
+        self.stop_camera()
+        self.auth_pipeline.shutdown()
+        super().closeEvent(event)
\ No newline at end of file
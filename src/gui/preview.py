@@ -0,0 +1,128 @@
+import threading
+import time
+
+import cv2
+import numpy as np
+from PyQt6.QtGui import QImage, QPixmap
+
+# preview.py
+# Caminho de renderização do preview da câmera.
+# - antes, cada frame passava por cvtColor(BGR2RGB), QImage, QPixmap do
+#   tamanho cheio e .scaled() para o label: três cópias do frame inteiro a
+#   30 fps na thread da GUI
+# - aqui o frame BGR é reduzido uma única vez (cv2.resize com dst) para o
+#   tamanho do label, num buffer pré-alocado; o QImage embrulha esse buffer
+#   direto em Format_BGR888 (sem conversão de cor) e só o QPixmap copia
+# - prepare() pode rodar fora da GUI (thread de captura); os buffers vêm de
+#   uma lista de livres e só voltam para ela em to_pixmap(), depois que o
+#   QPixmap copiou os pixels: um frame novo nunca sobrescreve um buffer que
+#   ainda está na fila da GUI
+# - sem buffer livre (GUI atrasada) prepare() devolve None e o frame é
+#   descartado, em vez de acumular frames velhos na fila de sinais
+# - PreviewStats mede fps desenhado, CPU do processo e custo da renderização
+
+DEFAULT_BUFFERS = 3
+STATS_INTERVAL = 1.0  # segundos entre atualizações do contador
+
+
+class PreviewStats:
+    """fps, CPU do processo (% de um núcleo) e ms por frame na thread que desenha."""
+    def __init__(self, interval: float = STATS_INTERVAL):
+        self.interval = interval
+        self.fps = 0.0
+        self.cpu = 0.0
+        self.render_ms = 0.0
+        self._frames = 0
+        self._render = 0.0
+        self._wall = time.monotonic()
+        self._cpu = time.process_time()
+
+    def add(self, render_seconds: float) -> bool:
+        """Conta um frame desenhado. Retorna True quando os números foram atualizados."""
+        self._frames += 1
+        self._render += render_seconds
+        now = time.monotonic()
+        elapsed = now - self._wall
+        if elapsed < self.interval:
+            return False
+        cpu = time.process_time()
+        self.fps = self._frames / elapsed
+        self.cpu = 100.0 * (cpu - self._cpu) / elapsed
+        self.render_ms = 1000.0 * self._render / self._frames
+        self._frames, self._render, self._wall, self._cpu = 0, 0.0, now, cpu
+        return True
+
+    def text(self) -> str:
+        return f"{self.fps:.1f} fps | CPU {self.cpu:.0f}% | preview {self.render_ms:.2f} ms/frame"
+
+
+class PreviewRenderer:
+    """
+    Converte frames BGR em QPixmap do tamanho do label com uma única redução.
+
+    Uso na thread da GUI:
+        renderer = PreviewRenderer(label.width(), label.height())
+        label.setPixmap(renderer.render(frame))
+    Com a redução fora da GUI: buf = renderer.prepare(frame) na thread de
+    captura (None = GUI atrasada, descarte o frame) e renderer.to_pixmap(buf)
+    no slot da GUI, que devolve o buffer à lista de livres.
+    """
+    def __init__(self, width: int, height: int, buffers: int = DEFAULT_BUFFERS):
+        self.width = width
+        self.height = height
+        self.stats = PreviewStats()
+        self.dropped = 0  # frames descartados por falta de buffer livre
+        self._count = max(1, buffers)
+        self._free = []
+        self._shape = None
+        self._lock = threading.Lock()
+        self._prepare_cost = 0.0  # tempo de CPU do último prepare() (pode ser de outra thread)
+
+    def target_size(self, frame_w: int, frame_h: int):
+        """(w, h) que cabe no label mantendo a proporção (KeepAspectRatio)."""
+        scale = min(self.width / frame_w, self.height / frame_h)
+        return max(1, int(frame_w * scale)), max(1, int(frame_h * scale))
+
+    def prepare(self, frame: np.ndarray):
+        """Reduz o frame BGR para um buffer livre e devolve o buffer (None se não houver)."""
+        start = time.thread_time()
+        h, w = frame.shape[:2]
+        tw, th = self.target_size(w, h)
+        with self._lock:
+            if self._shape != (th, tw):
+                # buffers antigos ainda na fila são descartados em release()
+                self._free = [np.empty((th, tw, 3), dtype=np.uint8) for _ in range(self._count)]
+                self._shape = (th, tw)
+            if not self._free:
+                self.dropped += 1
+                return None
+            buf = self._free.pop()
+        if (th, tw) == (h, w):
+            buf[...] = frame
+        else:
+            interpolation = cv2.INTER_AREA if tw < w else cv2.INTER_LINEAR
+            cv2.resize(frame, (tw, th), dst=buf, interpolation=interpolation)
+        self._prepare_cost = time.thread_time() - start
+        return buf
+
+    def release(self, buf: np.ndarray):
+        """Devolve um buffer de prepare() à lista de livres."""
+        with self._lock:
+            if buf.shape[:2] == self._shape and len(self._free) < self._count:
+                self._free.append(buf)
+
+    def to_pixmap(self, buf: np.ndarray) -> QPixmap:
+        """QImage sobre o próprio buffer (BGR888, sem cópia) -> QPixmap, que copia os
+        pixels; depois disso o buffer volta à lista de livres."""
+        start = time.thread_time()
+        h, w = buf.shape[:2]
+        image = QImage(buf.data, w, h, buf.strides[0], QImage.Format.Format_BGR888)
+        pixmap = QPixmap.fromImage(image)
+        del image
+        self.release(buf)
+        cost = time.thread_time() - start + self._prepare_cost
+        self.stats.add(cost)
+        return pixmap
+
+    def render(self, frame: np.ndarray) -> QPixmap:
+        return self.to_pixmap(self.prepare(frame))
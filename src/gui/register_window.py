@@ -1,9 +1,10 @@
 from PyQt6.QtWidgets import ( QWidget, QLabel, QPushButton, QVBoxLayout, QLineEdit, QComboBox, QFileDialog, QFrame )
 from PyQt6.QtCore import Qt, pyqtSignal
-from PyQt6.QtGui import QImage, QPixmap, QGuiApplication
+from PyQt6.QtGui import QGuiApplication
 
 import os
-import cv2
+
+from src.gui.preview import PreviewRenderer
 
 class RegisterWindow(QWidget):
     def __init__(self, db, matcher):
@@ -166,6 +167,8 @@ class RegisterWindow(QWidget):
 
 class CameraCaptureWindow(QWidget):
     capture_finished = pyqtSignal(str)
+    # buffer já reduzido ao tamanho do preview; emitido pelas threads de vídeo/captura
+    frame_ready = pyqtSignal(object)
 
     def __init__(self, session, user_dir):
         super().__init__()
@@ -174,6 +177,7 @@ class CameraCaptureWindow(QWidget):
         self.session.display_callback = self.show_frame
         self.session.status_callback = self.atualizar_status
         self.init_ui()
+        self.frame_ready.connect(self.paint_frame)
 
     def init_ui(self):
         self.setWindowTitle("Captura da Câmera")
@@ -188,6 +192,11 @@ class CameraCaptureWindow(QWidget):
         self.video_label = QLabel()
         self.video_label.setFixedSize(640, 480)
         self.video_label.setStyleSheet("background-color: black; border: 2px solid #555;")
+        self.preview = PreviewRenderer(self.video_label.width(), self.video_label.height())
+
+        self.preview_stats_label = QLabel("")
+        self.preview_stats_label.setAlignment(Qt.AlignmentFlag.AlignRight)
+        self.preview_stats_label.setStyleSheet("font-size: 11px; color: #888;")
 
         self.status_label = QLabel("🟢 Câmera pronta")
         self.status_label.setAlignment(Qt.AlignmentFlag.AlignCenter)
@@ -201,6 +210,7 @@ class CameraCaptureWindow(QWidget):
 
         card_layout = QVBoxLayout()
         card_layout.addWidget(self.video_label, alignment=Qt.AlignmentFlag.AlignCenter)
+        card_layout.addWidget(self.preview_stats_label)
         card_layout.addWidget(self.status_label)
         card_layout.addWidget(self.substatus_label)
         card_layout.addWidget(self.capture_btn, alignment=Qt.AlignmentFlag.AlignCenter)
@@ -221,11 +231,12 @@ class CameraCaptureWindow(QWidget):
         from threading import Thread
 
         def loop_video():
+            # read() da FrameSource bloqueia até o próximo frame: o ritmo é o da câmera.
+            # Durante a captura quem desenha é a sessão (frames com overlay).
             while self.session.cap and self.session.cap.isOpened():
                 ret, frame = self.session.cap.read()
-                if ret:
+                if ret and not self.session.is_capturing:
                     self.show_frame(frame)
-                cv2.waitKey(30)
 
         Thread(target=loop_video, daemon=True).start()
 
@@ -247,11 +258,16 @@ class CameraCaptureWindow(QWidget):
         Thread(target=run_capture, daemon=True).start()
 
     def show_frame(self, frame):
-        rgb_image = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-        h, w, ch = rgb_image.shape
-        bytes_per_line = ch * w
-        qimg = QImage(rgb_image.data, w, h, bytes_per_line, QImage.Format.Format_RGB888)
-        self.video_label.setPixmap(QPixmap.fromImage(qimg))
+        # chamado pelas threads de vídeo/captura: a redução acontece aqui, fora da GUI,
+        # e o widget só é tocado no slot paint_frame (thread da GUI)
+        buf = self.preview.prepare(frame)
+        if buf is not None:  # None: a GUI ainda não desenhou os anteriores
+            self.frame_ready.emit(buf)
+
+    def paint_frame(self, buf):
+        self.video_label.setPixmap(self.preview.to_pixmap(buf))
+        if self.preview.stats.fps:
+            self.preview_stats_label.setText(self.preview.stats.text())
 
     def atualizar_status(self, mensagem: str):
         self.status_label.setText(mensagem)
\ No newline at end of file
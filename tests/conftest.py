@@ -0,0 +1,59 @@
+import numpy as np
+import pytest
+
+from src.biometrics.gallery import Gallery
+from src.biometrics.quantization import quantize_gallery
+
+# Dados sintéticos compartilhados pelos testes: cada usuário é um centro
+# aleatório e as amostras são o centro com ruído; as queries são amostras
+# genuínas com ruído e vetores aleatórios (impostores).
+
+
+def _features(rng, dim, samples, noise):
+    center = rng.standard_normal(dim)
+    return (center + noise * rng.standard_normal((samples, dim))).astype(np.float32)
+
+
+def _make_users(count=40, dim=32, samples=3, noise=0.15, seed=0):
+    rng = np.random.default_rng(seed)
+    return [{'id': uid, 'name': f'u{uid}', 'access_level': 1, 'features': _features(rng, dim, samples, noise)}
+            for uid in range(1, count + 1)]
+
+
+def _make_queries(users, step=3, noise=0.05, seed=1):
+    # para cada 'step'-ésimo usuário: uma amostra genuína com ruído e uma aleatória
+    rng = np.random.default_rng(seed)
+    dim = users[0]['features'].shape[1]
+    queries = []
+    for user in users[::step]:
+        queries.append(user['features'][0] + noise * rng.standard_normal(dim))
+        queries.append(rng.standard_normal(dim))
+    return [q.astype(np.float32) for q in queries]
+
+
+def _make_features(seed, samples=4, dim=32, noise=0.1):
+    return _features(np.random.default_rng(seed), dim, samples, noise)
+
+
+@pytest.fixture
+def make_users():
+    """make_users(count, dim, samples, noise, seed) -> [{'id','name','access_level','features'}, ...]"""
+    return _make_users
+
+
+@pytest.fixture
+def make_queries():
+    """make_queries(users, step, noise, seed) -> [query float32, ...]"""
+    return _make_queries
+
+
+@pytest.fixture
+def make_features():
+    """make_features(seed, samples, dim, noise) -> amostras (samples x dim) de um usuário."""
+    return _make_features
+
+
+@pytest.fixture(params=['float32', 'float16', 'int8'])
+def gallery(request):
+    """Gallery dos usuários padrão de make_users em cada formato (quantization.py)."""
+    return quantize_gallery(Gallery.from_users(_make_users()), request.param)
@@ -0,0 +1,69 @@
+import numpy as np
+import pytest
+
+from src.biometrics import matcher
+from src.biometrics.gallery import Gallery
+
+# decide_match_batch (produto matriz-matriz) contra decide_match query a query.
+
+DIM = 256
+
+
+@pytest.fixture
+def data(make_users):
+    return make_users(120, DIM, samples=4, noise=0.3)
+
+
+def _queries(data, seed=1):
+    rng = np.random.default_rng(seed)
+    queries = []
+    for i, user in enumerate(data[:60]):
+        # ruído crescente: scores espalhados em volta dos limiares
+        noise = 0.05 + 0.02 * (i % 20)
+        queries.append(user['features'][i % 4] + noise * rng.standard_normal(DIM))
+    queries += [rng.standard_normal(DIM) for _ in range(10)]
+    return np.asarray(queries, dtype=np.float32)
+
+
+def _assert_same(batch, single):
+    assert len(batch) == len(single)
+    for b, s in zip(batch, single):
+        assert b[0] == s[0]
+        assert b[1]['id'] == s[1]['id']
+        assert abs(b[2] - s[2]) < matcher.BATCH_TOLERANCE
+        assert abs(b[3] - s[3]) < matcher.BATCH_TOLERANCE
+
+
+def test_batch_decisions_match_single_queries(data):
+    gallery = Gallery.from_users(data)
+    queries = _queries(data)
+    batch = matcher.decide_match_batch(queries, gallery, batch_size=16)
+    single = [matcher.decide_match(q, gallery) for q in queries]
+    _assert_same(batch, single)
+    assert 0 < sum(r[0] for r in single) < len(single)
+
+
+def test_batch_decisions_match_on_thresholds(data):
+    # limiares iguais aos scores exatos: a menor diferença do GEMM mudaria a decisão
+    gallery = Gallery.from_users(data)
+    queries = _queries(data)
+    for q in queries[:20]:
+        _, user, best, mean, _, scored = matcher.decide_match(q, gallery)
+        gap = best - scored[1][1]
+        for rules in ({'best_threshold': best, 'mean_threshold': 0.0, 'margin': 0.0},
+                      {'best_threshold': 0.0, 'mean_threshold': mean, 'margin': 0.0},
+                      {'best_threshold': 0.0, 'mean_threshold': 0.0, 'margin': gap}):
+            batch = matcher.decide_match_batch(queries[:20], gallery, **rules)
+            single = [matcher.decide_match(x, gallery, **rules) for x in queries[:20]]
+            _assert_same(batch, single)
+            assert [r[4] for r in batch] == [r[4] for r in single]
+
+
+def test_score_users_batch_within_tolerance(data):
+    gallery = Gallery.from_users(data)
+    queries = _queries(data)
+    for batch, q in zip(matcher.score_users_batch(queries, gallery), queries):
+        single = {u['id']: (b, m) for u, b, m in matcher.score_users(q, gallery)}
+        for user, b, m in batch:
+            assert abs(b - single[user['id']][0]) < matcher.BATCH_TOLERANCE
+            assert abs(m - single[user['id']][1]) < matcher.BATCH_TOLERANCE
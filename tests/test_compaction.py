@@ -0,0 +1,76 @@
+import numpy as np
+import pytest
+
+from src.biometrics import matcher
+from src.biometrics.compaction import compact_templates, compaction_report, select_templates
+from src.biometrics.gallery import split_probes
+from src.database.database_manager import DatabaseManager
+
+# Compactação de templates no cadastro (opcional) e o relatório que decide
+# se ela pode ser ligada num banco.
+
+DIM = 128
+
+
+IMAGES = 6
+AUGMENTATIONS = 6
+
+
+@pytest.fixture
+def users(make_users):
+    def build(count=20, seed=0, probe=False, noise=0.25):
+        # como no cadastro: cada amostra de make_users é uma imagem, repetida em
+        # augmentations quase iguais; com probe=True a última imagem vira a
+        # captura nova que split_probes usa como consulta
+        users = make_users(count, DIM, samples=IMAGES + probe, noise=noise, seed=seed)
+        rng = np.random.default_rng(seed + 1)
+        for user in users:
+            images = user['features']
+            feats = np.repeat(images[:IMAGES], AUGMENTATIONS, axis=0)
+            feats += 0.02 * rng.standard_normal(feats.shape).astype(np.float32)
+            user['features'] = np.vstack([feats, images[IMAGES:]])
+        return users
+    return build
+
+
+def test_select_templates_keeps_min_samples(users):
+    feats = users(1)[0]['features']
+    assert len(select_templates(feats, max_templates=1)) == matcher.DEFAULT_MIN_SAMPLES
+    assert list(select_templates(feats[:2])) == [0, 1]
+    kept, qualities = compact_templates(feats.tolist(), qualities=list(range(len(feats))))
+    assert isinstance(kept, list) and len(kept) == len(qualities) < len(feats)
+
+
+def test_report_shows_no_rise_in_false_rejections(users):
+    report = compaction_report(users(probe=True), max_templates=8)
+    assert report['templates_after'] < report['templates_before']
+    assert report['false_rejects_after'] <= report['false_rejects_before']
+    assert report['below_min_samples'] == 0
+
+
+def test_report_counts_false_rejections(users):
+    # capturas com mais variação: parte das probes genuínas já é negada sem compactar
+    data = users(probe=True, noise=0.35)
+    enrolled, probes = split_probes(data)
+    expected = 0
+    for user_id, query in probes:
+        granted, user = matcher.decide_match(query, enrolled)[:2]
+        expected += int(not (granted and user['id'] == user_id))
+    report = compaction_report(data, max_templates=8)
+    assert 0 < report['false_rejects_before'] == expected
+    assert report['false_rejects_after'] >= 0
+
+
+def test_registration_compacts_only_when_enabled(users):
+    feats = users(1)[0]['features']
+    for compaction, expected in ((False, len(feats)), (True, None)):
+        db = DatabaseManager(':memory:', compaction=compaction)
+        try:
+            user_id = db.register_user('a', 1, feats)
+            stored = db.get_user_meta(user_id)['template_count']
+            if expected is None:
+                assert matcher.DEFAULT_MIN_SAMPLES <= stored < len(feats)
+            else:
+                assert stored == expected
+        finally:
+            db.close_connection()
@@ -0,0 +1,123 @@
+import threading
+
+import pytest
+
+from src.database.database_manager import DatabaseManager
+
+# Cadastro, remoção e get_gallery() concorrentes no mesmo DatabaseManager.
+# A galeria em cache tem que terminar igual ao banco: sem usuários duplicados
+# (top1 == top2 negaria o usuário pela margem) e sem usuários fantasmas.
+
+DIM = 64
+
+
+def _cache_ids(db):
+    return [u['id'] for u in db.get_gallery().users]
+
+
+def _db_ids(db):
+    return [u['id'] for u in db.list_users()]
+
+
+def _run_together(*targets):
+    start = threading.Barrier(len(targets))
+
+    def wrap(fn):
+        def run():
+            start.wait()
+            fn()
+        return run
+
+    threads = [threading.Thread(target=wrap(fn)) for fn in targets]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+
+def test_register_during_first_get_gallery_keeps_single_entry(make_features):
+    for trial in range(50):
+        db = DatabaseManager(':memory:')
+        try:
+            db.register_user('a', 1, make_features(trial, 3, DIM))
+            _run_together(lambda: db.register_user('b', 1, make_features(trial + 1000, 3, DIM)), db.get_gallery)
+            ids = _cache_ids(db)
+            assert len(ids) == len(set(ids)), ids
+            assert sorted(ids) == _db_ids(db)
+        finally:
+            db.close_connection()
+
+
+def test_add_user_is_idempotent(make_features):
+    db = DatabaseManager(':memory:')
+    try:
+        user_id = db.register_user('a', 1, make_features(1, 3, DIM))
+        db.get_gallery()
+        db.gallery_cache.add_user({'id': user_id, 'name': 'a', 'access_level': 1}, make_features(1, 3, DIM))
+        assert _cache_ids(db) == [user_id]
+        assert db.get_gallery().matrix.shape[0] == 3
+    finally:
+        db.close_connection()
+
+
+def test_concurrent_register_delete_and_get_gallery_match_database(tmp_path, make_features):
+    for path in (':memory:', str(tmp_path / 'stress.db')):
+        db = DatabaseManager(path)
+        try:
+            seed_ids = [db.register_user(f'seed{i}', 1, make_features(i, 3, DIM)) for i in range(6)]
+
+            def registers():
+                for i in range(10):
+                    db.register_user(f'new{i}', 1, make_features(100 + i, 3, DIM))
+
+            def deletes():
+                for user_id in seed_ids[::2]:
+                    db.delete_user(user_id)
+
+            def readers():
+                for _ in range(10):
+                    db.gallery_cache.invalidate()
+                    ids = _cache_ids(db)
+                    assert len(ids) == len(set(ids)), ids
+
+            _run_together(registers, deletes, readers)
+            ids = _cache_ids(db)
+            assert len(ids) == len(set(ids))
+            assert sorted(ids) == _db_ids(db)
+            assert len(ids) == 6 - 3 + 10
+        finally:
+            db.close_connection()
+
+
+@pytest.mark.parametrize('memory', [True, False])
+def test_reads_do_not_see_uncommitted_rows(tmp_path, memory, make_features):
+    # em ':memory:' a leitura espera o escritor; em arquivo (WAL) lê o snapshot anterior
+    db = DatabaseManager(':memory:' if memory else str(tmp_path / 'db.sqlite'))
+    inserted, release = threading.Event(), threading.Event()
+
+    def writer():
+        with db._transaction() as cursor:
+            cursor.execute("INSERT INTO users (name, access_level) VALUES ('x', 1)")
+            inserted.set()
+            release.wait(5)
+            raise RuntimeError('rollback')
+
+    t = threading.Thread(target=lambda: _ignore(writer))
+    try:
+        db.register_user('a', 1, make_features(1, 3, DIM))
+        t.start()
+        assert inserted.wait(5)
+        threading.Timer(0.2, release.set).start()
+        assert [u['name'] for u in db.list_users()] == ['a']
+        assert [u['name'] for u in db.get_all_users_with_features()] == ['a']
+    finally:
+        release.set()
+        t.join()
+        db.close_connection()
+
+
+def _ignore(fn):
+    try:
+        fn()
+    except RuntimeError:
+        pass
@@ -1,9 +1,18 @@
 import os
+
+import pytest
+
 from src.database.database_manager import DatabaseManager
-import json
 
 
-# Inicializa o gerenciador do banco de dados (arquivo criado na raiz do projeto)
-DB_PATH = 'biometric_database.db'
-db_manager = DatabaseManager(DB_PATH)
+# Banco criado num diretório temporário (nunca na raiz do projeto)
+@pytest.fixture
+def db_manager(tmp_path):
+    db = DatabaseManager(str(tmp_path / 'biometric_database.db'))
+    yield db
+    db.close_connection()
+
 
+def test_creates_database_file(db_manager, tmp_path):
+    assert os.path.exists(tmp_path / 'biometric_database.db')
+    assert db_manager.list_users() == []
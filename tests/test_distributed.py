@@ -0,0 +1,114 @@
+import socket
+import time
+
+import numpy as np
+import pytest
+
+from src.biometrics import matcher
+from src.biometrics.distributed import Coordinator, ShardServer
+from src.biometrics.projection import PCAProjection
+from src.database.database_manager import DatabaseManager
+
+# Galeria dividida em shards locais (threads, 127.0.0.1, porta 0) contra a
+# decisão de decide_match sobre a galeria inteira.
+
+@pytest.fixture
+def shards(make_users):
+    users = make_users(30, samples=4)
+    servers = [ShardServer(users, i, 3).start() for i in range(3)]
+    try:
+        yield users, servers
+    finally:
+        for server in servers:
+            server.stop()
+
+
+@pytest.fixture
+def stalled():
+    # aceita a conexão (backlog) mas nunca responde
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.bind(('127.0.0.1', 0))
+    sock.listen(8)
+    try:
+        yield sock.getsockname()
+    finally:
+        sock.close()
+
+
+def _same_decision(got, expected):
+    assert got[0] == expected[0]
+    assert got[1]['id'] == expected[1]['id']
+    assert got[2] == pytest.approx(expected[2], abs=1e-5)
+    assert got[3] == pytest.approx(expected[3], abs=1e-5)
+
+
+def test_shards_partition_the_gallery(shards):
+    users, servers = shards
+    ids = sorted(u['id'] for s in servers for u in s.gallery.users)
+    assert ids == [u['id'] for u in users]
+
+
+def test_merged_decision_matches_full_gallery(shards, make_queries):
+    users, servers = shards
+    coordinator = Coordinator([s.address for s in servers])
+    try:
+        granted = 0
+        queries = make_queries(users)
+        for query in queries:
+            expected = matcher.decide_match(query, users)
+            _same_decision(coordinator.decide_match(query), expected)
+            granted += expected[0]
+        assert 0 < granted < len(queries)
+    finally:
+        coordinator.close()
+
+
+def test_stalled_shard_is_denied_within_timeout(shards, stalled, make_queries):
+    users, servers = shards
+    coordinator = Coordinator([s.address for s in servers] + [stalled], timeout=0.3)
+    try:
+        query = make_queries(users)[0]
+        start = time.monotonic()
+        result = coordinator.decide_match(query)
+        elapsed = time.monotonic() - start
+    finally:
+        coordinator.close()
+    assert result[0] is False
+    assert result[4].startswith('Shards sem resposta')
+    assert elapsed < 0.3 + 0.5
+
+
+def test_allow_partial_decides_with_answering_shards(shards, stalled, make_queries):
+    users, servers = shards
+    coordinator = Coordinator([s.address for s in servers[:2]] + [stalled], timeout=0.3, allow_partial=True)
+    try:
+        answered = [u for s in servers[:2] for u in s.gallery.users]
+        reachable = [u for u in users if u['id'] in {a['id'] for a in answered}]
+        # cada consulta espera o timeout do shard parado: poucas queries bastam
+        for query in make_queries(users)[:4]:
+            _same_decision(coordinator.decide_match(query), matcher.decide_match(query, reachable))
+    finally:
+        coordinator.close()
+
+
+@pytest.mark.parametrize('dtype', ['float32', 'int8'])
+def test_shards_from_database_use_projection_and_dtype(tmp_path, dtype, make_users, make_queries):
+    path = str(tmp_path / 'db.sqlite')
+    db = DatabaseManager(path, gallery_dtype=dtype)
+    users = make_users(30, samples=4)
+    for user in users:
+        db.register_user(user['name'], 1, user['features'])
+    db.set_projection(PCAProjection.fit(np.vstack([u['features'] for u in users]), dims=16))
+    gallery = db.get_gallery()
+    db.close_connection()
+
+    servers = [ShardServer.from_database(path, i, 3, gallery_dtype=dtype).start() for i in range(3)]
+    coordinator = Coordinator([s.address for s in servers])
+    try:
+        assert all(s.gallery.dim == 16 and type(s.gallery) is type(gallery) for s in servers)
+        for query in make_queries(users):
+            _same_decision(coordinator.decide_match(query), matcher.decide_match(query, gallery))
+    finally:
+        coordinator.close()
+        for server in servers:
+            server.stop()
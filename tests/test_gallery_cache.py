@@ -0,0 +1,80 @@
+import numpy as np
+import pytest
+
+from src.biometrics.gallery import Gallery
+from src.biometrics.projection import PCAProjection
+from src.database.database_manager import DatabaseManager
+
+# Cache da galeria: cadastros e remoções entram de forma incremental (sem reler
+# o banco) e stats() conta exatamente os acessos feitos.
+
+DIM = 16
+
+
+def test_register_and_delete_update_cache_without_reload(make_features):
+    db = DatabaseManager(':memory:', change_check_interval=None)
+    loads = []
+    loader = db.gallery_cache._loader
+    db.gallery_cache._loader = lambda: loads.append(1) or loader()
+    try:
+        first = db.register_user('a', 1, make_features(1, 3, DIM))
+        assert db.gallery_cache_stats()['misses'] == 0  # cache frio: nada a atualizar
+
+        db.get_gallery()
+        second = db.register_user('b', 1, make_features(2, 3, DIM))
+        third = db.register_user('c', 1, make_features(3, 2, DIM))
+        assert db.delete_user(first)
+        assert not db.delete_user(first)
+        gallery = db.get_gallery()
+        db.get_gallery()
+
+        assert len(loads) == 1
+        assert [u['id'] for u in gallery.users] == [second, third]
+        fresh = Gallery.from_users(db.get_all_users_with_features())
+        assert np.array_equal(gallery.matrix, fresh.matrix)
+        assert np.array_equal(gallery.offsets, fresh.offsets)
+
+        stats = db.gallery_cache_stats()
+        assert stats['misses'] == 1 and stats['rebuilds'] == 1
+        assert stats['hits'] == 2
+        assert stats['adds'] == 2 and stats['removes'] == 1
+        assert stats['users'] == 2
+        assert stats['bytes'] == gallery.matrix.nbytes
+    finally:
+        db.close_connection()
+
+
+def test_invalidate_reloads_once(make_features):
+    db = DatabaseManager(':memory:', change_check_interval=None)
+    try:
+        db.register_user('a', 1, make_features(1, 3, DIM))
+        db.get_gallery()
+        db.gallery_cache.invalidate()
+        db.get_gallery()
+        db.get_gallery()
+        stats = db.gallery_cache_stats()
+        assert (stats['misses'], stats['rebuilds'], stats['hits']) == (2, 2, 1)
+        assert stats['stamp_checks'] == 1  # só a leitura do __init__
+    finally:
+        db.close_connection()
+
+
+def test_projection_with_other_dimension_is_refused(make_features):
+    db = DatabaseManager(':memory:', change_check_interval=None)
+    try:
+        db.register_user('a', 1, make_features(1, 3, DIM))
+        db.register_user('b', 1, make_features(2, 3, DIM))
+        wrong = PCAProjection.fit(make_features(3, 8, DIM)[:, :DIM // 2], dims=4)
+        with pytest.raises(ValueError):
+            db.set_projection(wrong)
+        assert db.projection is None and db.get_gallery().dim == DIM
+
+        # projeção trocada direto no cache: get() falha em vez de misturar espaços
+        db.gallery_cache.set_projection(wrong)
+        with pytest.raises(ValueError):
+            db.gallery_cache.get()
+
+        db.set_projection(PCAProjection.fit(make_features(4, 8, DIM), dims=4))
+        assert db.get_gallery().dim == 4
+    finally:
+        db.close_connection()
@@ -0,0 +1,167 @@
+import sqlite3
+
+import pytest
+
+from src.biometrics.ivf_index import IVFIndex
+from src.database.database_manager import DatabaseManager
+
+# Galeria em cache e índice IVF salvo ao lado do banco (<db>.ivf.npz) quando
+# o arquivo é alterado por outra instância/processo ou migrado.
+
+@pytest.fixture
+def path(tmp_path, make_features):
+    path = str(tmp_path / 'db.sqlite')
+    db = DatabaseManager(path)
+    for i in range(12):
+        db.register_user(f'u{i}', 1, make_features(i))
+    db.build_index(nlist=4, nprobe=4)
+    db.close_connection()
+    return path
+
+
+def _indexed_ids(db):
+    return sorted({int(i) for lst in db.ivf_index.lists for i in lst})
+
+
+def test_other_instance_changes_reach_cache_and_index(path, make_features):
+    a = DatabaseManager(path, change_check_interval=0)
+    b = DatabaseManager(path)
+    try:
+        assert len(a.get_gallery()) == 12
+        new_id = b.register_user('novo', 1, make_features(99))
+        assert b.delete_user(1)
+        ids = [u['id'] for u in a.get_gallery().users]
+        assert new_id in ids and 1 not in ids
+        assert _indexed_ids(a) == sorted(ids)
+        assert a.ivf_index.stamp == a._stamp
+
+        # a volta: escrita de a depois da alteração externa recarrega tudo antes
+        b.delete_user(2)
+        a.register_user('outro', 1, make_features(100))
+        assert sorted(u['id'] for u in a.get_gallery().users) == [u['id'] for u in a.list_users()]
+        assert 2 not in _indexed_ids(a)
+    finally:
+        a.close_connection()
+        b.close_connection()
+
+
+def test_stale_sidecar_is_rebuilt_on_open(path):
+    conn = sqlite3.connect(path)
+    conn.execute('PRAGMA foreign_keys = ON')
+    conn.execute('DELETE FROM users WHERE id = 3')
+    conn.commit()
+    conn.close()
+
+    db = DatabaseManager(path)
+    try:
+        assert 3 not in _indexed_ids(db)
+        assert IVFIndex.load(db.index_path).stamp == db._stamp
+    finally:
+        db.close_connection()
+
+
+def test_sidecar_without_stamp_or_other_user_version_is_rebuilt(path):
+    db = DatabaseManager(path)
+    stamp = db._stamp
+    db.close_connection()
+
+    index = IVFIndex.load(path + '.ivf.npz')
+    index.stamp = None
+    index.save(path + '.ivf.npz')
+    db = DatabaseManager(path)
+    try:
+        assert db.ivf_index.stamp == stamp
+    finally:
+        db.close_connection()
+
+    conn = sqlite3.connect(path)
+    conn.execute('PRAGMA user_version = 99')
+    conn.close()
+    db = DatabaseManager(path)
+    try:
+        assert db._stamp != stamp
+        assert db.ivf_index.stamp == db._stamp
+    finally:
+        db.close_connection()
+
+
+def test_own_writes_update_incrementally(path, make_features):
+    db = DatabaseManager(path)
+    try:
+        db.get_gallery()
+        rebuilds = db.gallery_cache.rebuilds
+        user_id = db.register_user('novo', 1, make_features(50))
+        db.delete_user(4)
+        gallery = db.get_gallery()
+        assert db.gallery_cache.rebuilds == rebuilds
+        assert user_id in [u['id'] for u in gallery.users]
+        assert IVFIndex.load(db.index_path).stamp == db._stamp
+    finally:
+        db.close_connection()
+
+
+def test_hash_sidecar_follows_other_instance_and_stale_files(path, make_features):
+    db = DatabaseManager(path)
+    db.build_hash_index(bits=64)
+    db.close_connection()
+
+    a = DatabaseManager(path, change_check_interval=0)
+    b = DatabaseManager(path)
+    try:
+        new_id = b.register_user('novo', 1, make_features(77))
+        b.delete_user(5)
+        a.get_gallery()
+        ids = set(a.hash_index.ids.tolist())
+        assert new_id in ids and 5 not in ids
+        assert a.hash_index.stamp == a._stamp
+    finally:
+        a.close_connection()
+        b.close_connection()
+
+    conn = sqlite3.connect(path)
+    conn.execute('PRAGMA foreign_keys = ON')
+    conn.execute('DELETE FROM users WHERE id = 6')
+    conn.commit()
+    conn.close()
+    db = DatabaseManager(path)
+    try:
+        assert 6 not in set(db.hash_index.ids.tolist())
+        assert db.hash_index.bits == 64
+    finally:
+        db.close_connection()
+
+
+def test_change_check_is_throttled_and_counted(path, monkeypatch, make_features):
+    clock = [1000.0]
+    monkeypatch.setattr('src.database.database_manager.time.monotonic', lambda: clock[0])
+    a = DatabaseManager(path, change_check_interval=1.0)
+    b = DatabaseManager(path)
+    try:
+        a.get_gallery()
+        checks = a.gallery_cache_stats()['stamp_checks']
+        new_id = b.register_user('novo', 1, make_features(88))
+        for _ in range(20):
+            ids = [u['id'] for u in a.get_gallery().users]
+        # dentro do intervalo: nenhuma consulta ao banco, a galeria ainda é a antiga
+        assert new_id not in ids
+        assert a.gallery_cache_stats()['stamp_checks'] == checks
+        clock[0] += 1.5
+        assert new_id in [u['id'] for u in a.get_gallery().users]
+        stats = a.gallery_cache_stats()
+        assert stats['stamp_checks'] == checks + 2  # fora e dentro do lock de escrita
+        assert stats['resyncs'] == 1
+    finally:
+        a.close_connection()
+        b.close_connection()
+
+
+def test_change_check_can_be_disabled(path, make_features):
+    db = DatabaseManager(path, change_check_interval=None)
+    try:
+        checks = db.gallery_cache_stats()['stamp_checks']
+        for _ in range(5):
+            db.get_gallery()
+            db.verify_user(1, make_features(1)[0])
+        assert db.gallery_cache_stats()['stamp_checks'] == checks
+    finally:
+        db.close_connection()
@@ -0,0 +1,66 @@
+import numpy as np
+
+from src.biometrics import matcher
+from src.biometrics.binary_hash import BinaryHashIndex
+from src.biometrics.gallery import Gallery
+from src.biometrics.ivf_index import IVFIndex
+
+# decide_match_indexed: o índice só escolhe a shortlist, mas a margem do
+# top-1 é medida contra o segundo colocado da galeria inteira.
+
+DIM = 64
+
+
+class _FixedShortlist:
+    def __init__(self, ids):
+        self.ids = np.asarray(ids, dtype=np.int64)
+
+    def shortlist(self, query, nprobe=None):
+        return self.ids
+
+
+def _twins_gallery(seed=0):
+    rng = np.random.default_rng(seed)
+    center = rng.standard_normal(DIM)
+    users = []
+    for uid, offset in ((1, 0.0), (2, 0.02), (3, 3.0)):
+        base = center + offset * rng.standard_normal(DIM)
+        feats = base + 0.01 * rng.standard_normal((4, DIM))
+        users.append({'id': uid, 'name': f'u{uid}', 'access_level': 1, 'features': feats.astype(np.float32)})
+    return Gallery.from_users(users), center.astype(np.float32)
+
+
+def test_runner_up_outside_shortlist_blocks_margin():
+    gallery, query = _twins_gallery()
+    full = matcher.decide_match(query, gallery)
+    assert full[0] is False and 'Margem' in full[4]
+
+    # shortlist sem o gêmeo: antes concedia pela margem contra o usuário 3
+    top_id = full[1]['id']
+    result = matcher.decide_match_indexed(query, gallery, _FixedShortlist([top_id, 3]))
+    assert result[0] is False
+    assert 'Margem' in result[4]
+    assert [entry[0]['id'] for entry in result[5][:2]] == [top_id, 3 - top_id]
+    assert result[2] == full[2]
+
+
+def test_runner_up_matches_full_rank():
+    gallery, query = _twins_gallery()
+    order, best, mean_top = gallery.rank(query)
+    position, runner_best, runner_mean = gallery.runner_up(query, int(order[0]))
+    assert position == int(order[1])
+    assert abs(runner_best - best[order[1]]) < 1e-6
+    assert abs(runner_mean - mean_top[order[1]]) < 1e-6
+
+
+def test_indexed_grants_are_full_gallery_grants(make_users):
+    gallery = Gallery.from_users(make_users(200, DIM, samples=4, noise=0.2, seed=1))
+    rng = np.random.default_rng(2)
+    queries = [gallery.matrix[i] + 0.1 * rng.standard_normal(DIM).astype(np.float32)
+               for i in range(0, gallery.matrix.shape[0], 7)]
+    for index, nprobe in ((IVFIndex.train(gallery, nlist=16), 1), (BinaryHashIndex.from_gallery(gallery), 8)):
+        for q in queries:
+            indexed = matcher.decide_match_indexed(q, gallery, index, nprobe)
+            if indexed[0]:
+                full = matcher.decide_match(q, gallery)
+                assert full[0] and full[1]['id'] == indexed[1]['id']
@@ -0,0 +1,102 @@
+import math
+
+import numpy as np
+import pytest
+
+from src.biometrics import matcher
+
+# score_users/find_best_match/decide_match (Gallery, float32 vetorizado)
+# contra a pontuação antiga, usuário a usuário em Python puro.
+
+DIM = 24
+
+
+def _ref_similarity(a, b, metric):
+    if metric == 'euclidean':
+        return 1.0 - math.sqrt(sum((x - y) ** 2 for x, y in zip(a, b))) / (math.sqrt(len(a)) * 2)
+    na = math.sqrt(sum(x * x for x in a))
+    nb = math.sqrt(sum(y * y for y in b))
+    if na == 0 or nb == 0:
+        return 0.0
+    return sum(x * y for x, y in zip(a, b)) / (na * nb)
+
+
+def _ref_score_users(query, users, top_k=3, metric='cosine'):
+    # implementação anterior à Gallery
+    results = []
+    for u in users:
+        feats = matcher.normalize_features(u.get('features') or [])
+        scores = sorted((_ref_similarity(query, f, metric) for f in feats), reverse=True)
+        if not scores:
+            results.append((u, 0.0, 0.0))
+            continue
+        k = min(top_k, len(scores))
+        results.append((u, scores[0], sum(scores[:k]) / k))
+    results.sort(key=lambda x: x[1], reverse=True)
+    return results
+
+
+@pytest.fixture
+def users(make_users):
+    # features em listas, de 1 a 5 amostras por usuário
+    users = make_users(8, DIM, samples=5, noise=0.1)
+    for u in users:
+        u['features'] = u['features'][:1 + u['id'] % 5].tolist()
+    users[2]['features'].append([0.0] * DIM)  # amostra nula: similaridade 0
+    return users
+
+
+def _queries(users, seed=1):
+    rng = np.random.default_rng(seed)
+    queries = [np.asarray(u['features'][0]) + 0.03 * rng.standard_normal(DIM) for u in users[::2] if u['features']]
+    queries += [rng.standard_normal(DIM) for _ in range(3)]
+    return [q.astype(np.float32).tolist() for q in queries]
+
+
+def _assert_same_scores(got, expected):
+    assert [u['id'] for u, _, _ in got] == [u['id'] for u, _, _ in expected]
+    assert np.allclose([b for _, b, _ in got], [b for _, b, _ in expected], atol=1e-5)
+    assert np.allclose([m for _, _, m in got], [m for _, _, m in expected], atol=1e-5)
+
+
+@pytest.mark.parametrize('metric', ['cosine', 'euclidean'])
+def test_score_users_matches_reference(users, metric):
+    users.append({'id': 99, 'name': 'vazio', 'access_level': 1, 'features': []})
+    for query in _queries(users):
+        _assert_same_scores(matcher.score_users(query, users, metric=metric),
+                            _ref_score_users(query, users, metric=metric))
+
+
+def test_flat_vector_user_scores_as_one_sample(users):
+    flat = {'id': 50, 'name': 'flat', 'access_level': 1, 'features': users[0]['features'][0]}
+    users.append(flat)
+    query = _queries(users)[0]
+    _assert_same_scores(matcher.score_users(query, users), _ref_score_users(query, users))
+    assert matcher.find_best_match(users[0]['features'][0], [flat])['score'] == pytest.approx(1.0, abs=1e-6)
+    # um vetor único é uma amostra (antes contava len(vetor) em num_samples)
+    granted, user, _, _, reason, _ = matcher.decide_match(users[0]['features'][0], [flat])
+    assert not granted and user is flat
+    assert reason.startswith('Usuário candidato tem apenas 1 amostra')
+
+
+def test_find_best_match_matches_reference(users):
+    for query in _queries(users):
+        expected = _ref_score_users(query, users)[0]
+        got = matcher.find_best_match(query, users)
+        assert got['user'] is expected[0]
+        assert got['score'] == pytest.approx(expected[1], abs=1e-5)
+    assert matcher.find_best_match(_queries(users)[0], []) is None
+
+
+def test_decide_match_matches_reference(users):
+    users.append({'id': 99, 'name': 'vazio', 'access_level': 1, 'features': []})
+    granted = 0
+    for query in _queries(users):
+        got = matcher.decide_match(query, users)
+        ref = _ref_score_users(query, users)
+        # mesma decisão de decide_from_scores sobre os scores de referência
+        expected = matcher.decide_from_scores(ref, len(ref[0][0]['features']))
+        assert got[:2] == expected[:2] and got[4] == expected[4]
+        granted += got[0]
+    assert 0 < granted
+    assert matcher.decide_match(_queries(users)[0], [])[4] == 'Nenhum candidato encontrado.'
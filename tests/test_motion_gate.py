@@ -0,0 +1,68 @@
+import numpy as np
+import pytest
+
+pytest.importorskip('cv2')
+
+from src.biometrics.motion_gate import MotionGate  # noqa: E402
+
+# MotionGate com relógio e teste de rosto controlados: usuário parado na frente
+# da câmera continua sendo autenticado, em ritmo baixo.
+
+STILL = np.full((120, 160, 3), 100, dtype=np.uint8)
+MOVED = np.full((120, 160, 3), 180, dtype=np.uint8)
+
+
+class _Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def _gate(face=True):
+    clock = _Clock()
+    gate = MotionGate(presence_hold=2.0, still_retry_interval=1.0, clock=clock)
+    gate.face = face
+    gate.face_likely = lambda frame: gate.face
+    return gate, clock
+
+
+def _attempts(gate, clock, frame, seconds, fps=10):
+    # frames a 'fps' durante 'seconds'; devolve os instantes com tentativa
+    times = []
+    for _ in range(int(seconds * fps)):
+        clock.now += 1.0 / fps
+        if gate.should_attempt(frame):
+            times.append(clock.now)
+    return times
+
+
+def test_still_user_with_face_keeps_being_attempted():
+    gate, clock = _gate()
+    assert gate.should_attempt(STILL)  # primeiro frame conta como movimento
+    _attempts(gate, clock, STILL, 2.5)
+    # cena parada há mais de presence_hold: ainda tenta, uma vez por segundo
+    still = _attempts(gate, clock, STILL, 5.0)
+    assert 4 <= len(still) <= 6
+    assert all(b - a >= 1.0 - 1e-9 for a, b in zip(still, still[1:]))
+    assert gate.counters['still_retries'] == len(still)
+
+
+def test_still_scene_without_face_stops_attempting():
+    gate, clock = _gate()
+    gate.should_attempt(STILL)
+    _attempts(gate, clock, STILL, 2.5)
+    gate.face = False  # o usuário saiu sem movimento suficiente
+    _attempts(gate, clock, STILL, 1.5)
+    gate.face = True
+    # sem rosto no último teste e sem movimento: não volta a tentar sozinho
+    assert _attempts(gate, clock, STILL, 5.0) == []
+    # movimento reativa a cena
+    assert gate.should_attempt(MOVED)
+
+
+def test_busy_worker_skips_attempts():
+    gate, clock = _gate()
+    assert not gate.should_attempt(STILL, ready=False)
+    assert gate.counters['face_checks'] == 0
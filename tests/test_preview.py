@@ -0,0 +1,39 @@
+import numpy as np
+import pytest
+
+pytest.importorskip('PyQt6')
+
+from src.gui.preview import PreviewRenderer  # noqa: E402
+
+# Buffers do preview: um buffer na fila da GUI nunca é reaproveitado antes
+# de to_pixmap()/release().
+
+
+def _frame(value):
+    return np.full((480, 640, 3), value, dtype=np.uint8)
+
+
+def test_prepare_does_not_reuse_buffers_in_flight():
+    renderer = PreviewRenderer(320, 240, buffers=2)
+    first = renderer.prepare(_frame(10))
+    second = renderer.prepare(_frame(20))
+    assert first is not second
+    assert renderer.prepare(_frame(30)) is None
+    assert renderer.dropped == 1
+    assert first.shape == (240, 320, 3) and (first == 10).all() and (second == 20).all()
+
+    renderer.release(first)
+    third = renderer.prepare(_frame(40))
+    assert third is first
+    assert (second == 20).all()
+
+
+def test_release_ignores_buffers_of_an_old_size():
+    renderer = PreviewRenderer(320, 240, buffers=1)
+    old = renderer.prepare(_frame(1))
+    renderer.width, renderer.height = 160, 120
+    new = renderer.prepare(_frame(2))
+    renderer.release(old)
+    assert renderer.prepare(_frame(3)) is None
+    renderer.release(new)
+    assert renderer.prepare(_frame(4)) is new
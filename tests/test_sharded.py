@@ -0,0 +1,53 @@
+import numpy as np
+import pytest
+
+from src.biometrics import matcher
+from src.biometrics.gallery import Gallery
+from src.biometrics.sharded import ShardedMatcher
+
+# ShardedMatcher (memória compartilhada + pool) contra score_users/decide_match
+# sobre a galeria inteira: mesma decisão, scores a menos de BATCH_TOLERANCE.
+
+
+def _same_decision(got, expected):
+    assert got[0] == expected[0]
+    assert got[1]['id'] == expected[1]['id']
+    assert got[2] == pytest.approx(expected[2], abs=matcher.BATCH_TOLERANCE)
+    assert got[3] == pytest.approx(expected[3], abs=matcher.BATCH_TOLERANCE)
+
+
+def test_sharded_matches_single_process(gallery, make_users, make_queries):
+    queries = make_queries(make_users())
+    with ShardedMatcher(gallery, workers=2, shards=3) as sm:
+        granted = 0
+        for query in queries:
+            expected = matcher.decide_match(query, gallery)
+            _same_decision(sm.decide_match(query, limit=2), expected)
+            granted += expected[0]
+
+            got = sm.score_users(query)
+            ref = matcher.score_users(query, gallery)
+            assert [u['id'] for u, _, _ in got] == [u['id'] for u, _, _ in ref]
+            assert np.allclose([b for _, b, _ in got], [b for _, b, _ in ref], atol=matcher.BATCH_TOLERANCE)
+        assert 0 < granted < len(queries)
+
+
+def test_decision_at_threshold_follows_decide_match(make_users, make_queries):
+    users = make_users()
+    gallery = Gallery.from_users(users)
+    query = make_queries(users)[0]
+    _, _, best, _, _, _ = matcher.decide_match(query, gallery)
+    # limiar exatamente no score: a soma dos shards não pode virar a decisão
+    with ShardedMatcher(gallery, workers=2, shards=3) as sm:
+        for threshold in (best, np.nextafter(best, 2.0)):
+            kwargs = {'best_threshold': float(threshold), 'mean_threshold': 0.0}
+            _same_decision(sm.decide_match(query, limit=2, **kwargs), matcher.decide_match(query, gallery, **kwargs))
+
+
+def test_rejects_unknown_gallery_type(make_users):
+    class Other(Gallery):
+        pass
+
+    base = Gallery.from_users(make_users())
+    with pytest.raises(ValueError):
+        ShardedMatcher(Other(base.users, base.matrix, base.offsets), workers=1)
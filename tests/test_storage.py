@@ -0,0 +1,117 @@
+import json
+import sqlite3
+
+import numpy as np
+import pytest
+
+from src.database import template_codec
+from src.database.database_manager import SCHEMA_VERSION, DatabaseManager
+
+# Formato binário dos templates, migração de bancos antigos (JSON, v0) e
+# remoção em cascata da tabela de templates.
+
+
+def test_codec_round_trip_float32(make_features):
+    feats = make_features(1, 3, 16)
+    blob = template_codec.encode_templates(feats)
+    assert template_codec.is_encoded(blob)
+    decoded = template_codec.decode_templates(blob)
+    assert decoded.dtype == np.float32
+    assert np.array_equal(decoded, feats)
+
+
+def test_codec_round_trip_float16_and_lists(make_features):
+    feats = make_features(2, 3, 16)
+    decoded = template_codec.decode_templates(template_codec.encode_templates(feats.tolist(), 'float16'))
+    assert decoded.dtype == np.float32
+    assert np.allclose(decoded, feats, rtol=1e-3, atol=1e-3)
+    single = template_codec.decode_templates(template_codec.encode_templates(feats[0]))
+    assert single.shape == (1, feats.shape[1])
+    assert template_codec.decode_templates(template_codec.encode_templates([])).shape == (0, 0)
+
+
+def test_codec_decode_stack(make_features):
+    blocks = [make_features(3, 1, 16), make_features(4, 2, 16)]
+    stacked = template_codec.decode_stack([template_codec.encode_templates(b) for b in blocks])
+    assert np.array_equal(stacked, np.vstack(blocks))
+    mixed = [template_codec.encode_templates(blocks[0]), template_codec.encode_templates(blocks[1], 'float16')]
+    assert np.allclose(template_codec.decode_stack(mixed), np.vstack(blocks), atol=1e-3)
+
+
+def test_codec_rejects_invalid_blobs(make_features):
+    assert not template_codec.is_encoded('[[0.1, 0.2]]')
+    with pytest.raises(ValueError):
+        template_codec.decode_templates(b'BTPL')
+    with pytest.raises(ValueError):
+        template_codec.decode_templates(b'XXXX' + bytes(12))
+    with pytest.raises(ValueError):
+        template_codec.encode_templates(make_features(5, 3, 16), 'int8')
+
+
+def _create_v0_database(path, users):
+    # esquema original: features em JSON numa coluna TEXT de 'users'
+    conn = sqlite3.connect(path)
+    conn.execute('''
+        CREATE TABLE users (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL,
+            access_level INTEGER NOT NULL,
+            biometric_features TEXT NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    for name, level, feats in users:
+        conn.execute('INSERT INTO users (name, access_level, biometric_features) VALUES (?, ?, ?)',
+                     (name, level, json.dumps(feats.tolist())))
+    conn.commit()
+    return conn
+
+
+def test_migration_from_json_keeps_ids_and_autoincrement(tmp_path, make_features):
+    path = str(tmp_path / 'v0.db')
+    feats = [make_features(i, 3, 16) for i in range(4)]
+    conn = _create_v0_database(path, [(f'u{i}', i, f) for i, f in enumerate(feats)])
+    # remove o último: o AUTOINCREMENT não pode devolver o id 4 a outro usuário
+    conn.execute('DELETE FROM users WHERE id IN (2, 4)')
+    conn.commit()
+    conn.close()
+
+    db = DatabaseManager(path)
+    try:
+        assert db.conn.execute('PRAGMA user_version').fetchone()[0] == SCHEMA_VERSION
+        assert 'biometric_features' not in db._user_columns()
+        users = db.get_all_users_with_features()
+        assert [(u['id'], u['name'], u['access_level']) for u in users] == [(1, 'u0', 0), (3, 'u2', 2)]
+        assert np.allclose(users[0]['features'], feats[0])
+        assert np.allclose(users[1]['features'], feats[2])
+        assert db.register_user('novo', 1, make_features(9, 3, 16)) == 5
+    finally:
+        db.close_connection()
+
+    # reabrir não migra de novo
+    db = DatabaseManager(path)
+    try:
+        assert [u['id'] for u in db.list_users()] == [1, 3, 5]
+        assert [u['template_count'] for u in db.list_users()] == [3, 3, 3]
+    finally:
+        db.close_connection()
+
+
+def test_delete_user_cascades_to_templates(tmp_path, make_features):
+    db = DatabaseManager(str(tmp_path / 'db.sqlite'))
+    try:
+        keep = db.register_user('a', 1, make_features(1, 3, 16))
+        gone = db.register_user('b', 1, make_features(2, 3, 16))
+        db.add_templates(gone, make_features(3, 2, 16))
+
+        def count(user_id):
+            return db.conn.execute('SELECT COUNT(*) FROM templates WHERE user_id = ?', (user_id,)).fetchone()[0]
+
+        assert count(gone) == 5
+        assert db.delete_user(gone)
+        assert count(gone) == 0
+        assert count(keep) == 3
+        assert db.get_templates([gone]) == {}
+        assert not db.delete_user(gone)
+    finally:
+        db.close_connection()
@@ -0,0 +1,66 @@
+import pytest
+
+from src.biometrics import matcher
+from src.biometrics.temporal_fusion import ACCEPT, PENDING, REJECT, DEFAULT_RELAX, StreamingDecider
+
+# Fusão temporal dos scores de login (StreamingDecider).
+
+A, B, C = ({'id': i, 'name': n} for i, n in ((1, 'a'), (2, 'b'), (3, 'c')))
+
+
+def _scored(*entries):
+    return sorted(entries, key=lambda e: -e[1])
+
+
+def test_default_thresholds_are_not_relaxed():
+    assert DEFAULT_RELAX == 0
+    decider = StreamingDecider()
+    assert decider.best_threshold - decider.relax == matcher.DEFAULT_BEST_THRESHOLD
+
+
+def test_single_frame_window_reproduces_decide_from_scores():
+    decider = StreamingDecider(window=1, min_frames=1, min_votes=1, reject_best=-1)
+    frames = [
+        _scored((A, 0.95, 0.93), (B, 0.85, 0.84)),
+        _scored((A, 0.95, 0.93), (B, 0.93, 0.90)),
+        _scored((A, 0.90, 0.89), (B, 0.70, 0.69)),
+    ]
+    for scored in frames:
+        got = decider.update(scored, 5)
+        expected = matcher.decide_from_scores(scored, 5)
+        assert got[:5] == expected[:5]
+
+
+def test_missing_candidate_is_not_filled_with_frame_floor():
+    decider = StreamingDecider(window=3, min_frames=3, reject_best=-1)
+    decider.update(_scored((A, 0.96, 0.94), (B, 0.90, 0.88), (C, 0.50, 0.49)), 5)
+    # B não aparece neste frame; antes entrava com o menor guardado (0.50)
+    decider.update(_scored((A, 0.96, 0.94), (C, 0.50, 0.49)), 5)
+    fused = {user['id']: (best, mean) for user, best, mean in decider.fused_scores()}
+    assert fused[2] == pytest.approx((0.90, 0.88))
+    assert fused[1] == pytest.approx((0.96, 0.94))
+    assert decider.fused_scores()[1][0]['id'] == 2
+
+
+def test_runner_up_seen_once_still_blocks_margin():
+    decider = StreamingDecider(window=3, min_frames=2, min_votes=2)
+    decider.update(_scored((A, 0.95, 0.93), (B, 0.94, 0.92)), 5)
+    result = decider.update(_scored((A, 0.95, 0.93), (C, 0.60, 0.59)), 5)
+    assert result[0] is False
+    assert 'Margem' in result[4]
+    assert decider.state == PENDING
+
+
+def test_accepts_after_min_votes_and_rejects_far_candidates():
+    decider = StreamingDecider(window=5, min_frames=2, min_votes=2)
+    scored = _scored((A, 0.95, 0.93), (B, 0.80, 0.79))
+    assert decider.update(scored, 5, 0.0)[0] is False
+    result = decider.update(scored, 5, 0.1)
+    assert result[0] is True and result[1]['id'] == 1
+    assert decider.state == ACCEPT
+
+    decider.reset()
+    result = decider.update(_scored((A, 0.70, 0.69), (B, 0.60, 0.59)), 5, 0.0)
+    result = decider.update(_scored((A, 0.70, 0.69), (B, 0.60, 0.59)), 5, 0.1)
+    assert result[0] is False
+    assert decider.state == REJECT
@@ -0,0 +1,66 @@
+import threading
+
+import pytest
+
+from src.database.database_manager import DatabaseManager
+
+# Verificação 1:1 (verify_user): só o usuário declarado com o cache frio,
+# cohort calculado fora do lock do cache e descartado se a galeria mudou.
+
+@pytest.fixture
+def db(make_features):
+    db = DatabaseManager(':memory:', change_check_interval=None)
+    db.ids = [db.register_user(f'u{i}', 1, make_features(i)) for i in range(8)]
+    yield db
+    db.close_connection()
+
+
+def _count_loads(db):
+    loads = []
+    loader = db.gallery_cache._loader
+    db.gallery_cache._loader = lambda: loads.append(1) or loader()
+    return loads
+
+
+def test_claimed_with_cold_cache_reads_only_that_user(db, make_features):
+    ids = db.ids
+    loads = _count_loads(db)
+    claimed = db.gallery_cache.claimed(ids[2])
+    assert [u['id'] for u in claimed.users] == [ids[2]]
+    assert claimed.matrix.shape[0] == 4
+    assert len(db.gallery_cache.claimed(999).users) == 0
+    granted, user, _, _, reason, _ = db.verify_user(999, make_features(2)[0])
+    assert not granted and user is None and reason == 'Usuário declarado não encontrado.'
+    assert loads == [] and not db.gallery_cache.loaded
+
+
+def test_verify_user_accepts_genuine_and_denies_wrong_claim(db, make_features):
+    ids = db.ids
+    query = make_features(3)[0]
+    assert db.verify_user(ids[3], query)[0]
+    granted, _, _, _, reason, _ = db.verify_user(ids[4], query)
+    assert not granted and reason
+
+
+def test_cohort_is_computed_outside_the_lock_and_not_stored_when_stale(db, make_features):
+    ids = db.ids
+    cache = db.gallery_cache
+    gallery = cache.get()
+    rank = gallery.rank
+    others = []
+
+    def rank_during_change(*args, **kwargs):
+        # outra thread consegue usar o cache enquanto o cohort é calculado
+        t = threading.Thread(target=lambda: others.append(db.register_user('novo', 1, make_features(50))))
+        t.start()
+        t.join(5)
+        return rank(*args, **kwargs)
+
+    gallery.rank = rank_during_change
+    cohort = cache.cohort(ids[0], 3)
+    assert others and others[0] is not None
+    assert len(cohort) == 3 and ids[0] not in [u['id'] for u in cohort.users]
+    assert cache._cohorts == {}  # a galeria mudou durante o cálculo
+
+    again = cache.cohort(ids[0], 3)
+    assert cache.cohort(ids[0], 3) is again